@@ -0,0 +1,71 @@
+"""
+The `build_context` benchmark compares the per-check build context cost of the check image
+as the materials tree grows: the old context tars the whole project directory,
+the `DockerUtils` in-memory context holds only the Dockerfile, the task input and the submission.
+The Docker daemon reads the whole context before the build, so the context size is sent on every check.
+Run it from the repository root: `python -m benchmarks.build_context`.
+"""
+from os import makedirs, urandom
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from docker.utils import tar
+from utilities.docker_scripts import DockerUtils
+
+MATERIALS_SIZES = (1, 10, 100)
+REPEATS = 5
+CODE = b'print(sum(map(int, input().split())))'
+DOCKERFILE = '''
+    FROM python:3.9-alpine
+    COPY task_1.txt /
+    COPY main.py /main.py
+    CMD python -u /main.py
+    '''
+
+
+def write_materials(root: str, size_mb: int) -> None:
+    """
+    `write_materials` function creates a materials directory of about `size_mb` megabytes.
+    """
+    topic = join(root, 'materials', 'bench', 'input')
+    makedirs(topic)
+    for task_id in range(1, size_mb + 1):
+        with open(join(topic, f'task_{task_id}.txt'), 'wb') as f:
+            f.write(urandom(1024 * 1024))
+
+
+def directory_context(root: str) -> int:
+    with tar(root, dockerfile=('Dockerfile', DOCKERFILE)) as context:
+        return len(context.read())
+
+
+def memory_context(task_context: bytes) -> int:
+    context = DockerUtils._build_context(DOCKERFILE, task_context, DockerUtils._tar_member('main.py', CODE))
+    return len(context.getvalue())
+
+
+def measure(build, *args):
+    """
+    `measure` function returns the mean context creation time in milliseconds and the context size in kilobytes.
+    """
+    start = perf_counter()
+    for _ in range(REPEATS):
+        size = build(*args)
+    return (perf_counter() - start) / REPEATS * 1000, size / 1024
+
+
+def main() -> None:
+    task_context = DockerUtils._tar_member('task_1.txt', b'1 2\n')
+    print(f"{'materials':>10} {'directory':>10} {'size':>10} {'memory':>10} {'size':>10}")
+    for size_mb in MATERIALS_SIZES:
+        with TemporaryDirectory() as root:
+            write_materials(root, size_mb)
+            directory, directory_size = measure(directory_context, root)
+            memory, memory_size = measure(memory_context, task_context)
+        print(
+            f"{size_mb:>8}MB {directory:>8.1f}ms {directory_size:>8.0f}KB {memory:>8.3f}ms {memory_size:>8.0f}KB"
+        )
+
+
+if __name__ == '__main__':
+    main()
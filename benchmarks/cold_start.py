@@ -0,0 +1,43 @@
+"""
+The `cold_start` benchmark measures the app import time of a new worker process,
+the autoscaled workers should come up within the target.
+It fails if the median import time is above the target or the import loads the Docker clients.
+Run it from the repository root: `python -m benchmarks.cold_start [target seconds]`.
+"""
+import sys
+from statistics import median
+from subprocess import run
+
+RUNS = 5
+TARGET = 2.0
+CODE = '''
+from time import perf_counter
+started = perf_counter()
+import main
+import sys
+print(perf_counter() - started, ' '.join(name for name in ('docker', 'python_on_whales') if name in sys.modules))
+'''
+
+
+def measure() -> tuple:
+    """
+    `measure` function returns the import time of the app in a new interpreter and the Docker clients loaded.
+    """
+    result = run([sys.executable, '-W', 'ignore', '-c', CODE], capture_output=True, check=True)
+    seconds, *loaded = result.stdout.decode().split()
+    return float(seconds), loaded
+
+
+def main(target: float) -> None:
+    measurements = [measure() for _ in range(RUNS)]
+    seconds = median(seconds for seconds, _ in measurements)
+    loaded = sorted({name for _, names in measurements for name in names})
+    print(f"import main: median {seconds * 1000:.0f}ms of {RUNS} runs, target {target * 1000:.0f}ms")
+    if loaded:
+        print(f"Docker clients loaded on import: {', '.join(loaded)}")
+    if seconds > target or loaded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else TARGET)
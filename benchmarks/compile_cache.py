@@ -0,0 +1,37 @@
+"""
+The `compile_cache` benchmark compares the check time of a C submission with the local subprocess sandbox
+when every check compiles the submission and when the compiled artifact is reused by the artifact cache.
+It needs a local `gcc`. Run it from the repository root: `python -m benchmarks.compile_cache`.
+"""
+from asyncio import run
+from time import perf_counter
+from utilities.runtime_scripts import ArtifactCache, runtime_registry
+from utilities.sandbox_scripts import SubprocessBackend
+
+CASES = 3
+CHECKS = 10
+CODE = b'#include <stdio.h>\nint main(void) { int a, b; scanf("%d %d", &a, &b); printf("%d\\n", a + b); }\n'
+
+
+async def measure(artifacts_size: int) -> float:
+    """
+    `measure` function returns the mean check time in milliseconds, every check runs `CASES` test cases.
+    """
+    sandbox = SubprocessBackend(timeout=5, artifacts=ArtifactCache(artifacts_size))
+    runtime = runtime_registry.get('c')
+    started = perf_counter()
+    for _ in range(CHECKS):
+        async with sandbox.session(CODE, 'bench', 1, runtime) as session:
+            for case in range(CASES):
+                await session.run(f'{case} {case}\n'.encode('utf-8'))
+    return (perf_counter() - started) / CHECKS * 1000
+
+
+def main() -> None:
+    # The empty cache keeps no artifacts, every check compiles again
+    print(f"compiled every check: {run(measure(0)):.1f}ms")
+    print(f"compiled once:        {run(measure(64 * 1024 * 1024)):.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+The `login_storm` benchmark verifies many passwords at once, as at the start of an exam,
+and measures the event loop lag seen by the rest of the API meanwhile
+with the bcrypt rounds run on the event loop and in the `AuthUtils` hashing pool.
+Run it from the repository root: `python -m benchmarks.login_storm`.
+"""
+from asyncio import gather, get_event_loop, run, sleep
+from time import perf_counter
+from utilities.auth_scripts import AuthUtils
+
+LOGINS = (10, 50)
+TICK = 0.01
+
+
+async def verify_blocking(password: str, hashed_password: str) -> bool:
+    return AuthUtils.pwd_context.verify(password, hashed_password)
+
+
+async def measure(verify, logins: int, hashed_password: str):
+    """
+    `measure` function returns the storm duration and the longest event loop lag in milliseconds.
+    """
+    loop = get_event_loop()
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            start = loop.time()
+            await sleep(TICK)
+            lag = max(lag, loop.time() - start - TICK)
+
+    ticking = loop.create_task(ticker())
+    start = perf_counter()
+    await gather(*(verify('password', hashed_password) for _ in range(logins)))
+    duration = perf_counter() - start
+    done = True
+    await ticking
+    return duration * 1000, lag * 1000
+
+
+async def main() -> None:
+    hashed_password = await AuthUtils.get_password_hash('password')
+    print(f"{'logins':>7} {'blocking':>10} {'lag':>10} {'pool':>10} {'lag':>10}")
+    for logins in LOGINS:
+        blocking, blocking_lag = await measure(verify_blocking, logins, hashed_password)
+        pooled, pooled_lag = await measure(AuthUtils._verify_password, logins, hashed_password)
+        print(f"{logins:>7} {blocking:>8.0f}ms {blocking_lag:>8.0f}ms {pooled:>8.0f}ms {pooled_lag:>8.0f}ms")
+
+
+if __name__ == '__main__':
+    run(main())
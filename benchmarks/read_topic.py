@@ -0,0 +1,78 @@
+"""
+The `read_topic` benchmark compares the topic syllabus loading latency
+of the serial file reads with the concurrent `FileUtils.open_topic_files`.
+Run it from the repository root: `python -m benchmarks.read_topic`.
+"""
+from asyncio import run
+from json import dumps
+from os import chdir, getcwd, makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from utilities.file_scripts import FileUtils, MaterialsCache
+
+TOPIC_SIZES = (10, 50, 200)
+REPEATS = 5
+
+
+def write_topic(root: str, tasks_count: int) -> None:
+    """
+    `write_topic` function creates a materials directory with one topic of `tasks_count` tasks.
+    """
+    topic = join(root, 'materials', 'bench')
+    for directory in ('description', 'input', 'output'):
+        makedirs(join(topic, directory))
+    with open(join(root, 'materials', 'topics.json'), 'w') as f:
+        f.write(dumps([{'name': 'Bench', 'path': 'bench', 'count': tasks_count}]))
+    for task_id in range(1, tasks_count + 1):
+        with open(join(topic, 'description', f'task_{task_id}.json'), 'w') as f:
+            f.write(dumps({'id': task_id, 'topic_id': 0, 'title': 'Task', 'description': ['Bench']}))
+        for directory in ('input', 'output'):
+            with open(join(topic, directory, f'task_{task_id}.txt'), 'w') as f:
+                f.write('\n'.join(str(value) for value in range(100)) + '\n')
+
+
+async def read_serial(tasks_count: int) -> None:
+    for task_id in range(1, tasks_count + 1):
+        await FileUtils.open_file('task_info', 0, task_id)
+        await FileUtils.open_file_values('task_input', 0, task_id)
+        await FileUtils.open_file_values('task_output', 0, task_id)
+
+
+async def read_concurrent(tasks_count: int, values: bool = True) -> None:
+    await FileUtils.open_topic_files(0, tasks_count, values=values)
+
+
+async def measure(read, tasks_count: int, cache_size: int, **kwargs) -> float:
+    """
+    `measure` function returns the best latency of `REPEATS` reads in milliseconds.
+    """
+    best = float('inf')
+    for _ in range(REPEATS):
+        FileUtils.materials_cache = MaterialsCache(cache_size)
+        start = perf_counter()
+        await read(tasks_count, **kwargs)
+        best = min(best, perf_counter() - start)
+    return best * 1000
+
+
+async def main() -> None:
+    cwd = getcwd()
+    print(f"{'tasks':>6} {'serial':>10} {'concurrent':>12} {'descriptions':>14}")
+    try:
+        for tasks_count in TOPIC_SIZES:
+            with TemporaryDirectory() as root:
+                write_topic(root, tasks_count)
+                chdir(root)
+                # A cold cache, as it is after every task change
+                serial = await measure(read_serial, tasks_count, 0)
+                concurrent = await measure(read_concurrent, tasks_count, 0)
+                descriptions = await measure(read_concurrent, tasks_count, 0, values=False)
+                chdir(cwd)
+            print(f"{tasks_count:>6} {serial:>8.1f}ms {concurrent:>10.1f}ms {descriptions:>12.1f}ms")
+    finally:
+        chdir(cwd)
+
+
+if __name__ == '__main__':
+    run(main())
@@ -1,4 +1,5 @@
-from sqlalchemy import MetaData, Table, Column, Integer, String, Boolean
+from sqlalchemy import MetaData, Table, Column, Integer, String, Boolean, Float, LargeBinary, Text, \
+    ForeignKey, ForeignKeyConstraint
 
 metadata = MetaData()
 
@@ -11,3 +12,65 @@ users = Table(
     Column("is_active", Boolean, default=True),
     Column("is_root", Boolean, default=False),
 )
+
+check_jobs = Table(
+    "check_jobs",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("topic_id", Integer),
+    Column("task_id", Integer),
+    Column("code", LargeBinary),
+    Column("owner", String, index=True),
+    Column("fail_fast", Boolean, default=False),
+    Column("status", String, index=True),
+    Column("worker", String),
+    Column("result", Text),
+    Column("error", String),
+    Column("created", Float, index=True),
+    # The time the job was claimed by a worker
+    Column("started", Float),
+)
+
+check_results = Table(
+    "check_results",
+    metadata,
+    Column("digest", String, primary_key=True),
+    Column("result", Text),
+    Column("created", Float, index=True),
+)
+
+topics = Table(
+    "topics",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("name", String),
+    Column("path", String, unique=True),
+    # The next task ID, it is never reused after the task is deleted
+    Column("next_task_id", Integer, default=1),
+)
+
+tasks = Table(
+    "tasks",
+    metadata,
+    Column("topic_id", Integer, ForeignKey("topics.id"), primary_key=True, autoincrement=False),
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("title", String),
+    Column("description", Text),
+    Column("comparator", Text),
+    # The task solutions language, None for Python
+    Column("language", String),
+    Column("code", LargeBinary),
+    # Incremented on every change, the data built from the task is outdated when it changes
+    Column("version", Integer, default=1),
+)
+
+test_cases = Table(
+    "test_cases",
+    metadata,
+    Column("topic_id", Integer, primary_key=True, autoincrement=False),
+    Column("task_id", Integer, primary_key=True, autoincrement=False),
+    Column("number", Integer, primary_key=True, autoincrement=False),
+    Column("input", Text),
+    Column("output", Text),
+    ForeignKeyConstraint(["topic_id", "task_id"], ["tasks.topic_id", "tasks.id"]),
+)
@@ -1,19 +1,27 @@
 from os.path import dirname, abspath
+from asyncio import ensure_future
 from datetime import timedelta
-from fastapi import FastAPI, Depends, HTTPException, status
+from time import perf_counter
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
+from fastapi.responses import JSONResponse
 
 from routers.tasks import router_tasks
-from routers.checks import router_checks, limiter
+from routers.checks import router_checks, check_queue
 from routers.topics import router_topic
 from routers.auth import router_users
-from database.config import database
+from routers.metrics import router_metrics
+from routers.health import router_health
+from database.config import database, create_schema
 from schemas.auth import Token
-from utilities.docker_scripts import DockerUtils
 from utilities.app_metadata import tags_metadata, app_metadata_description
 from utilities.auth_scripts import AuthUtils
+from utilities.check_scripts import CheckUtils
+from utilities.file_scripts import FileUtils
+from utilities.limit_scripts import RateLimited, UploadSizeLimit, rate_limiter
+from utilities.repository_scripts import task_repository
+from utilities.metrics_scripts import checks_total, http_request_seconds
+from utilities.settings import Settings
 
 # FastAPI app instance
 app = FastAPI(title='Autograding-API',
@@ -31,27 +39,77 @@ app = FastAPI(title='Autograding-API',
 
 # Save main app directory
 APP_ROOT = dirname(abspath(__file__))
-# Fix Docker dockerfile problems on the app startup
-DockerUtils.fix_docker_bug()
 
 # Connecting routers to the app
 app.include_router(router_tasks)
 app.include_router(router_checks)
 app.include_router(router_topic)
 app.include_router(router_users)
+app.include_router(router_metrics)
+app.include_router(router_health)
+# Request latency is measured by the router, the path prefixes are mapped to the router names
+ROUTER_PREFIXES = (
+    ('/api/tasks', 'tasks'), ('/api/topics', 'topics'), ('/api/checks', 'checks'), ('/auth', 'auth'),
+    ('/health', 'health'),
+)
+
+
+# Reject the oversized submissions while they are uploaded
+app.add_middleware(UploadSizeLimit, max_size=Settings.SUBMISSION_MAX_SIZE, prefix='/api/checks')
+
+
 # Connecting rate limiter to the app
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@app.exception_handler(RateLimited)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimited):
+    if exc.scope == 'check':
+        checks_total.inc(status='RATE_LIMITED')
+    return JSONResponse(
+        {"error": str(exc)}, status_code=429, headers={"Retry-After": str(max(round(exc.retry_after), 1))}
+    )
+
+
+@app.middleware("http")
+async def measure_request_latency(request: Request, call_next):
+    router = next((name for prefix, name in ROUTER_PREFIXES if request.url.path.startswith(prefix)), 'other')
+    started = perf_counter()
+    response = await call_next(request)
+    http_request_seconds.observe(
+        perf_counter() - started, router=router, method=request.method, code=str(response.status_code)
+    )
+    return response
 
 
 @app.on_event("startup")
 async def startup():
     await database.connect()
+    await create_schema()
+    await task_repository.start()
+    # Prepare the sandbox, e.g. warm the container pool or prebuild the task images.
+    # The app serves the tasks and topics without the sandbox, the checks fail until it is available
+    try:
+        await CheckUtils.backend.start()
+    except (RuntimeError, OSError) as e:
+        app.state.sandbox_error = f'{type(e).__name__}: {e}'
+        print("Failed to start the sandbox.", e)
+    # Fail the jobs left running by a killed worker and start draining the check job queue
+    await check_queue.backend.start()
+    check_queue.start()
+    # Remove the submission files orphaned by the killed workers
+    app.state.workspace_reaper = ensure_future(FileUtils.run_workspace_reaper())
+    app.state.started = True
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    app.state.started = False
+    # The startup may have failed before the reaper was started
+    workspace_reaper = getattr(app.state, 'workspace_reaper', None)
+    if workspace_reaper is not None:
+        workspace_reaper.cancel()
+    await check_queue.stop()
     await database.disconnect()
+    await CheckUtils.backend.close()
+    await rate_limiter.store.close()
 
 
 @app.post("/auth/token", response_model=Token, summary="Grab the Bearer token")
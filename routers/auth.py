@@ -34,9 +34,11 @@ async def create_user(user: UserCreate):
     query = "SELECT * FROM users WHERE email = :email"
     if await database.fetch_one(query=query, values={"email": user.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
-    fake_hashed = AuthUtils.get_password_hash(password=user.password)
+    fake_hashed = await AuthUtils.get_password_hash(password=user.password)
     query = users.insert().values(
         email=user.email, hashed_password=fake_hashed, is_root=user.is_root, is_active=True
     )
     last_record_id = await database.execute(query)
+    # A user with the same email could be removed and created again
+    AuthUtils.invalidate_user(user.email)
     return {**user.dict(), "id": last_record_id}
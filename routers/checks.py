@@ -1,14 +1,15 @@
-from fastapi import File, UploadFile, APIRouter, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse, Response
-from fastapi.requests import Request
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from schemas.errors import NotFoundTask, NotFoundTopic, RateLimitExceeded, DockerUnavailable
-from schemas.checks import CheckResult
+from fastapi import File, UploadFile, APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from schemas.errors import NotFoundTask, NotFoundTopic, NotFoundJob, RateLimitExceeded, \
+    DockerUnavailable, SubmissionTooLarge, InvalidTask, CheckQueueFull as CheckQueueFullError
+from schemas.checks import CheckResult, CheckJob
 from schemas.auth import User
-from utilities.docker_scripts import DockerUtils
-from utilities.file_scripts import FileUtils
+from utilities.check_scripts import CheckUtils
+from utilities.repository_scripts import task_repository
+from utilities.queue_scripts import CheckQueue, CheckQueueFull, Job, MemoryJobQueue, DatabaseJobQueue
 from utilities.auth_scripts import get_current_active_user
+from utilities.limit_scripts import limit_checks, limit_reads, limit_sandbox
+from utilities.settings import Settings
 
 router_checks = APIRouter(
     redirect_slashes=False,
@@ -16,51 +17,153 @@ router_checks = APIRouter(
     tags=["checks"],
 )
 
-limiter = Limiter(key_func=get_remote_address)
+
+def describe_check_error(error: Exception) -> str:
+    """
+    `describe_check_error` function returns the API error message for a check pipeline exception.
+    """
+    if isinstance(error, IndexError):
+        return NotFoundTopic().error
+    elif isinstance(error, FileNotFoundError):
+        return NotFoundTask().error
+    elif isinstance(error, ValueError):
+        return InvalidTask().error
+    return DockerUnavailable().error
+
+
+async def run_check_job(job: Job) -> CheckResult:
+    return await CheckUtils.check_user_answer(job.topic_id, job.task_id, job.code, job.fail_fast)
+
+
+if Settings.CHECK_QUEUE_BACKEND == 'database':
+    _queue_backend = DatabaseJobQueue(
+        max_depth=Settings.CHECK_QUEUE_MAX_DEPTH, poll_interval=Settings.CHECK_QUEUE_POLL_INTERVAL,
+        max_jobs=Settings.CHECK_JOB_MAX_JOBS, stale_after=Settings.CHECK_JOB_STALE_AFTER
+    )
+else:
+    _queue_backend = MemoryJobQueue(max_depth=Settings.CHECK_QUEUE_MAX_DEPTH, max_jobs=Settings.CHECK_JOB_MAX_JOBS)
+
+check_queue = CheckQueue(
+    _queue_backend, run_check_job, workers=Settings.CHECK_QUEUE_WORKERS,
+    poll_interval=Settings.CHECK_QUEUE_POLL_INTERVAL, describe_error=describe_check_error
+)
+
+
+async def get_own_job(job_id: str, current_user: User, wait: float = 0) -> Job:
+    """
+    `get_own_job` function returns the current user's job, waiting up to `wait` seconds for it.
+    """
+    job = await check_queue.wait(job_id, min(wait, Settings.CHECK_JOB_MAX_WAIT))
+    if job is None or job.owner != current_user.email:
+        raise HTTPException(status_code=404, detail=NotFoundJob().error)
+    return job
 
 
 @router_checks.post(
     "/{topic_id}/{task_id}", status_code=200, summary="Check user's answer",
-    response_model=CheckResult, responses={
-        404: {"model": NotFoundTask}, 429: {"model": RateLimitExceeded},
-        503: {"model": DockerUnavailable}
+    response_model=CheckResult, response_model_exclude_none=True, responses={
+        404: {"model": NotFoundTask}, 413: {"model": SubmissionTooLarge}, 422: {"model": InvalidTask},
+        429: {"model": RateLimitExceeded}, 503: {"model": DockerUnavailable}
     }
 )
-@limiter.limit("2/minute")
 async def check_user_answer(
-        request: Request, response: Response, topic_id: int, task_id: int,
-        background_tasks: BackgroundTasks, current_user: User = Depends(get_current_active_user),
-        file: UploadFile = File(...)
+        topic_id: int, task_id: int, current_user: User = Depends(limit_checks),
+        file: UploadFile = File(...), fail_fast: bool = Settings.GRADING_FAIL_FAST
 ) -> CheckResult or JSONResponse:
-    # Get topic name
-    topic_index = await FileUtils.open_file("topic_index")
+    """
+    The `check user's answer` endpoint.\n
+    Every task input value with its output value is a separate test case,
+    `fail_fast` skips the cases not started before the first failure.\n
+    The check is rejected with the 503 error if the sandbox is at its capacity.
+    """
+    # The queued checks run in the same sandbox, they are counted as well
+    limit_sandbox(CheckUtils.sandbox_running)
     try:
-        topic_name = topic_index[topic_id].get('path')
-    except IndexError or AttributeError:
+        return await CheckUtils.check_user_answer(topic_id, task_id, await file.read(), fail_fast)
+    except IndexError:
         raise HTTPException(status_code=404, detail=NotFoundTopic().error)
-    # Get expected output
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=NotFoundTask().error)
+    except ValueError:
+        # The stored task has an unknown comparator or language, or invalid output patterns
+        raise HTTPException(status_code=422, detail=InvalidTask().error)
+    except RuntimeError:
+        raise HTTPException(status_code=503, detail=DockerUnavailable().error)
+
+
+@router_checks.post(
+    "/jobs/{topic_id}/{task_id}", status_code=202, summary="Submit user's answer to the check queue",
+    response_model=CheckJob, response_model_exclude_none=True, responses={
+        404: {"model": NotFoundTask}, 413: {"model": SubmissionTooLarge},
+        429: {"model": RateLimitExceeded}, 503: {"model": CheckQueueFullError}
+    }
+)
+async def submit_check_job(
+        topic_id: int, task_id: int, current_user: User = Depends(limit_checks),
+        file: UploadFile = File(...), fail_fast: bool = Settings.GRADING_FAIL_FAST
+) -> CheckJob or JSONResponse:
+    """
+    The `submit check job` endpoint returns the job ID immediately,
+    the check result is available from the `read check job` endpoint.
+    """
     try:
-        expected_answer = await FileUtils.open_file("task_output", topic_id, task_id)
+        await task_repository.get_task_version(topic_id, task_id)
+    except IndexError:
+        raise HTTPException(status_code=404, detail=NotFoundTopic().error)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=NotFoundTask().error)
-    else:
-        expected_answer = expected_answer.decode('utf-8').replace('\n', '').strip()
-    # Save user input
-    temp_name = await FileUtils.get_user_answer_temp(code=await file.read())
-    background_tasks.add_task(
-        DockerUtils.image_remove, topic_name, task_id, 'process'
-    )
-    background_tasks.add_task(FileUtils.remove_user_answer_file, temp_name)
-    # Run user input into the Docker container
-    user_answer, id_random = await DockerUtils.docker_check_user_answer(
-        topic_name, task_id, temp_name
-    )
-    # Check container's stdout
-    if not user_answer:
-        raise HTTPException(status_code=404, detail=DockerUnavailable().error)
-    elif user_answer.strip().replace('\n', '') == expected_answer:
-        return CheckResult(status='OK', answer=expected_answer,
-                           your_result=user_answer)
-    else:
-        return CheckResult(status='WRONG', answer=expected_answer,
-                           your_result=user_answer)
+    job = Job(topic_id, task_id, await file.read(), owner=current_user.email, fail_fast=fail_fast)
+    try:
+        await check_queue.submit(job)
+    except CheckQueueFull:
+        raise HTTPException(
+            status_code=503, detail=CheckQueueFullError().error,
+            headers={"Retry-After": str(int(Settings.CHECK_JOB_MAX_WAIT))}
+        )
+    return job.to_schema()
+
+
+@router_checks.get(
+    "/jobs/{job_id}", status_code=200, summary="Read check job",
+    response_model=CheckJob, response_model_exclude_none=True,
+    responses={404: {"model": NotFoundJob}, 429: {"model": RateLimitExceeded}},
+    dependencies=[Depends(limit_reads)]
+)
+async def read_check_job(
+        job_id: str, wait: float = 0, current_user: User = Depends(get_current_active_user)
+) -> CheckJob or JSONResponse:
+    """
+    The `read check job` endpoint returns the job status and the check result.\n
+    Set `wait` to long-poll up to that many seconds for the job to finish.
+    """
+    return (await get_own_job(job_id, current_user, wait)).to_schema()
+
+
+@router_checks.get(
+    "/jobs/{job_id}/events", status_code=200, summary="Stream check job events",
+    responses={404: {"model": NotFoundJob}, 429: {"model": RateLimitExceeded}},
+    dependencies=[Depends(limit_reads)]
+)
+async def stream_check_job(
+        job_id: str, current_user: User = Depends(get_current_active_user)
+) -> StreamingResponse or JSONResponse:
+    """
+    The `stream check job` endpoint sends the job status changes as server-sent events,
+    the last event contains the check result.
+    """
+    job = await get_own_job(job_id, current_user)
+
+    async def events():
+        status = None
+        current = job
+        while True:
+            if current.status != status:
+                status = current.status
+                yield f"event: {status}\ndata: {current.to_schema().json(exclude_none=True)}\n\n"
+            if current.finished:
+                break
+            current = await check_queue.wait(job_id, Settings.CHECK_QUEUE_POLL_INTERVAL)
+            if current is None:
+                break
+
+    return StreamingResponse(events(), media_type="text/event-stream")
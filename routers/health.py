@@ -0,0 +1,43 @@
+from asyncio import wait_for
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from database.config import database
+from schemas.errors import NotReady
+from utilities.settings import Settings
+
+router_health = APIRouter(
+    redirect_slashes=False,
+    prefix="/health",
+    tags=["health"],
+)
+
+
+@router_health.get("/live", status_code=200, summary="Check the app process is alive")
+async def read_liveness():
+    """
+    The `liveness` endpoint answers while the app event loop runs, it touches no dependencies.
+    """
+    return {"status": "ok"}
+
+
+@router_health.get(
+    "/ready", status_code=200, summary="Check the app is ready to serve requests",
+    responses={503: {"model": NotReady}}
+)
+async def read_readiness(request: Request) -> dict or JSONResponse:
+    """
+    The `readiness` endpoint answers after the app startup while the database is reachable.\n
+    The sandbox state is reported as well, but a sandbox failure only fails the checks,
+    the tasks and topics are still served.
+    """
+    state = request.app.state
+    checks = {'startup': 'ok' if getattr(state, 'started', False) else 'pending'}
+    try:
+        await wait_for(database.fetch_val("SELECT 1"), Settings.HEALTH_TIMEOUT)
+        checks['database'] = 'ok'
+    except Exception as e:
+        checks['database'] = f'{type(e).__name__}: {e}'
+    checks['sandbox'] = getattr(state, 'sandbox_error', None) or 'ok'
+    if checks['startup'] == 'ok' and checks['database'] == 'ok':
+        return {"status": "ok", "checks": checks}
+    return JSONResponse({"error": NotReady().error, "checks": checks}, status_code=503)
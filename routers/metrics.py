@@ -0,0 +1,65 @@
+from typing import Dict, List, Tuple
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from utilities.auth_scripts import AuthUtils
+from utilities.check_scripts import CheckUtils
+from utilities.docker_scripts import DockerUtils
+from utilities.file_scripts import FileUtils
+from utilities.metrics_scripts import registry
+from utilities.runtime_scripts import artifact_cache
+
+router_metrics = APIRouter(
+    redirect_slashes=False,
+    tags=["metrics"],
+)
+
+
+def counters(stats: Dict[str, float], label: str = 'counter') -> List[Tuple[Dict[str, str], float]]:
+    """
+    `counters` function converts the `stats()` dict of a component into the callback gauge samples.
+    """
+    return [({label: name}, value) for name, value in stats.items()]
+
+
+# The component counters are read on every scrape
+registry.callback(
+    'autograding_materials_cache', 'Task materials cache counters.',
+    lambda: counters(FileUtils.materials_cache.stats())
+)
+registry.callback(
+    'autograding_auth_cache', 'Validated tokens cache counters.',
+    lambda: counters(AuthUtils.token_cache.stats())
+)
+registry.callback(
+    'autograding_result_cache', 'Check results cache counters.',
+    lambda: counters(CheckUtils.result_cache.stats()) if CheckUtils.result_cache is not None else []
+)
+registry.callback(
+    'autograding_single_flight', 'Concurrent identical checks coalescing counters.',
+    lambda: counters(CheckUtils.in_flight.stats())
+)
+registry.callback(
+    'autograding_sandbox_running', 'Checks using the sandbox right now, the checks are shed at its capacity.',
+    lambda: [({}, CheckUtils.sandbox_running)]
+)
+registry.callback(
+    'autograding_sandbox_resources', 'Sandbox images, containers and pool counters left right now.',
+    lambda: counters(CheckUtils.backend.stats(), 'resource')
+)
+registry.callback(
+    'autograding_docker_reaper', 'Check images and containers waiting for the removal and reclaimed.',
+    lambda: counters(DockerUtils.reaper.stats())
+)
+registry.callback(
+    'autograding_artifact_cache', 'Compiled user input cache counters.',
+    lambda: counters(artifact_cache.stats())
+)
+registry.callback(
+    'autograding_case_runs', 'Resource usage of the test case runs.',
+    lambda: counters(CheckUtils.run_stats.stats())
+)
+
+
+@router_metrics.get("/metrics", response_class=PlainTextResponse, summary="Read the app metrics")
+async def read_metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
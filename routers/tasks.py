@@ -1,11 +1,17 @@
-from fastapi import status, File, UploadFile, APIRouter, HTTPException, Depends, BackgroundTasks
+from re import error as PatternError
+from typing import List, Optional
+from fastapi import status, File, UploadFile, APIRouter, HTTPException, Depends
 from fastapi.responses import JSONResponse, Response
 from fastapi.encoders import jsonable_encoder
 from schemas.tasks import Task, TaskUpdate, TaskCreate
-from schemas.errors import NotFoundTopic, NotFoundTask, EmptyRequest
+from schemas.errors import NotFoundTopic, NotFoundTask, EmptyRequest, UnknownComparator, UnknownLanguage, \
+    RateLimitExceeded
 from schemas.auth import User
-from utilities.file_scripts import FileUtils
+from utilities.comparator_scripts import ComparatorUtils
+from utilities.repository_scripts import task_repository
+from utilities.runtime_scripts import runtime_registry
 from utilities.auth_scripts import get_current_active_user
+from utilities.limit_scripts import limit_reads
 
 router_tasks = APIRouter(
     redirect_slashes=False,
@@ -14,17 +20,39 @@ router_tasks = APIRouter(
 )
 
 
+def validate_comparator(comparator, outputs: Optional[List[str]] = None) -> None:
+    """
+    `validate_comparator` function checks the task comparator before the task is saved,
+    the outputs are prepared as the checks prepare them, so the regex patterns are compiled.
+    """
+    try:
+        prepared = ComparatorUtils.create(comparator)
+        if outputs:
+            prepared.prepare('\n'.join(outputs).encode('utf-8'))
+    except (ValueError, PatternError):
+        raise HTTPException(status_code=422, detail=UnknownComparator().error)
+
+
+def validate_language(language) -> None:
+    """
+    `validate_language` function checks the task language before the task is saved.
+    """
+    try:
+        runtime_registry.get(language)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=UnknownLanguage().error)
+
+
 @router_tasks.get(
     "/{topic_id}/{task_id}", status_code=200, summary="Read task by ID",
-    response_model=Task, responses={404: {"model": NotFoundTask}},
+    response_model=Task, responses={404: {"model": NotFoundTask}, 429: {"model": RateLimitExceeded}},
+    dependencies=[Depends(limit_reads)]
 )
 async def read_task(topic_id: int, task_id: int) -> Task or JSONResponse:
     """The `read task` CRUD endpoint."""
     try:
         # Get task info, inputs and outputs.
-        description = await FileUtils.open_file('task_info', topic_id, task_id)
-        inputs = await FileUtils.open_file_values('task_input', topic_id, task_id)
-        outputs = await FileUtils.open_file_values('task_output', topic_id, task_id)
+        description, inputs, outputs = await task_repository.get_task(topic_id, task_id)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=NotFoundTask().error)
     except IndexError:
@@ -35,53 +63,39 @@ async def read_task(topic_id: int, task_id: int) -> Task or JSONResponse:
 
 @router_tasks.post(
     "/{topic_id}", status_code=201, summary="Create new task",
-    response_model=Task, responses={404: {"model": NotFoundTopic}}
+    response_model=Task, responses={404: {"model": NotFoundTopic}, 422: {"model": UnknownComparator}}
 )
 async def create_task(
-        topic_id: int, task: TaskCreate or UploadFile, background_tasks: BackgroundTasks,
+        topic_id: int, task: TaskCreate or UploadFile,
         code: UploadFile = File(...), current_user: User = Depends(get_current_active_user)
 ) -> Task or JSONResponse:
     """The `create task` CRUD endpoint."""
-    # If this is a test mode, the actual data will be protected from changes.
-    try:
-        topics_json = await FileUtils.open_file('topic_index', topic_id=topic_id)
-    except IndexError:
-        raise HTTPException(status_code=404, detail=NotFoundTopic().error)
     if isinstance(task, UploadFile):
         task = TaskCreate(**jsonable_encoder(task))
-    # Get ID
-    task_id = topics_json[topic_id].get("count") + 1
-    # Create new task
-    task = Task(
-        id=task_id, topic_id=topic_id, **task.dict()
-    )
+    validate_comparator(task.comparator, task.output)
+    validate_language(task.language)
     # New task's info dictionary
-    task_description = {key: value for key, value in task
-                        if key in ("id", "topic_id", "title", "description")}
-    saving_config = {
-        "topic_id": topic_id, "task_id": task.id
-    }
-    # Save task info
-    background_tasks.add_task(FileUtils.save_file, 'task_info', content=task_description, **saving_config)
-    # Save task's input values
-    background_tasks.add_task(FileUtils.save_file_values, "task_input", content=task.input, **saving_config)
-    # Save task code's output values
-    background_tasks.add_task(FileUtils.save_file_values, "task_output", content=task.output, **saving_config)
-    # Save task's code
-    background_tasks.add_task(FileUtils.save_file, "task_code", content=await code.read(), **saving_config)
-    # Update the topic tasks count
-    topics_json[topic_id]["count"] = task_id
-    background_tasks.add_task(FileUtils.save_file, 'topic_index', content=topics_json)
-    return task
+    task_description = {"title": task.title, "description": task.description}
+    for key in ("comparator", "language"):
+        if getattr(task, key) is not None:
+            task_description[key] = getattr(task, key)
+    try:
+        # The repository allocates the task ID
+        task_id = await task_repository.create_task(
+            topic_id, task_description, task.input, task.output, await code.read()
+        )
+    except IndexError:
+        raise HTTPException(status_code=404, detail=NotFoundTopic().error)
+    return Task(id=task_id, topic_id=topic_id, **task.dict())
 
 
 @router_tasks.patch(
     "/{topic_id}/{task_id}", status_code=200, summary="Update task by ID",
     response_model=TaskUpdate, response_model_exclude_none=True,
-    responses={404: {"model": NotFoundTask}}
+    responses={404: {"model": NotFoundTask}, 422: {"model": UnknownComparator}}
 )
 async def update_task(
-        topic_id: int, task_id: int, task: TaskUpdate, background: BackgroundTasks,
+        topic_id: int, task_id: int, task: TaskUpdate,
         code: UploadFile = File(None), current_user: User = Depends(get_current_active_user)
 ) -> Task or JSONResponse:
     """The `update task` CRUD endpoint.\n
@@ -92,47 +106,40 @@ async def update_task(
     if not any(task.dict().values()):
         raise HTTPException(status_code=422, detail=EmptyRequest().error)
 
-    saving_config = {"topic_id": topic_id, "task_id": task_id}
-    code = await code.read()
+    code = await code.read() if code else None
     task = TaskUpdate(**jsonable_encoder(task))
     task.id = task_id
     task.topic_id = topic_id
-
-    # Update task's description
-    if any([task.title, task.description]):
+    validate_language(task.language)
+    comparator, outputs = task.comparator, task.output or None
+    if (comparator is None) != (outputs is None):
+        # The sent comparator is checked with the saved outputs and the sent outputs with the saved comparator
         try:
-            # Get task info
-            task_info = await FileUtils.open_file("task_info", **saving_config)
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail=NotFoundTask().error)
+            description, _, saved_outputs = await task_repository.get_task(topic_id, task_id, values=outputs is None)
         except IndexError:
             raise HTTPException(status_code=404, detail=NotFoundTopic().error)
-        else:
-            # Update task's description
-            task_info["title"] = task.title if task.title else task_info["title"]
-            task_info["description"] = task.description if task.description else task_info["description"]
-            background.add_task(FileUtils.save_file, "task_info", content=task_info, **saving_config)
-    # Update task's input values
-    if task.input:
-        try:
-            background.add_task(FileUtils.save_file_values, "task_input", content=task.input, **saving_config)
         except FileNotFoundError:
             raise HTTPException(status_code=404, detail=NotFoundTask().error)
-    # Update task answer's output values
-    if task.output:
-        try:
-            background.add_task(FileUtils.save_file_values, "task_output", content=task.output, **saving_config)
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail=NotFoundTask().error)
-    # Update task's code file
-    if code:
-        try:
-            background.add_task(FileUtils.save_file, "task_code", content=code, **saving_config)
-        except IndexError:
-            raise HTTPException(status_code=404, detail=NotFoundTopic().error)
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail=NotFoundTask().error)
-    return Task(task_id=task.id, **task.dict())
+        if comparator is None:
+            comparator = description.get('comparator')
+        else:
+            outputs = [value.decode('utf-8') for value in saved_outputs]
+    validate_comparator(comparator, outputs)
+
+    # Only the sent description fields are replaced
+    task_info = {
+        key: getattr(task, key) for key in ("title", "description", "comparator", "language") if getattr(task, key)
+    }
+    try:
+        await task_repository.update_task(
+            topic_id, task_id, info=task_info, inputs=task.input or None,
+            outputs=task.output or None, code=code or None
+        )
+    except IndexError:
+        raise HTTPException(status_code=404, detail=NotFoundTopic().error)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=NotFoundTask().error)
+    return task
 
 
 @router_tasks.delete(
@@ -140,21 +147,13 @@ async def update_task(
     responses={404: {"model": NotFoundTask}}
 )
 async def delete_task(
-        task_id: int, topic_id: int, background: BackgroundTasks,
-        current_user: User = Depends(get_current_active_user)
+        task_id: int, topic_id: int, current_user: User = Depends(get_current_active_user)
 ) -> Response or JSONResponse:
     """The `delete task` CRUD endpoint."""
-    files = ("task_info", "task_input", "task_output", "task_code")
-    for title in files:
-        try:
-            await FileUtils.remove_file(title, topic_id=topic_id, task_id=task_id)
-        except IndexError:
-            raise HTTPException(status_code=404, detail=NotFoundTopic().error)
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail=NotFoundTask().error)
-    # Open topic info
-    topics = await FileUtils.open_file('topic_index')
-    # Update the topic tasks count
-    topics[topic_id]["count"] -= 1
-    background.add_task(FileUtils.save_file, "topic_index", content=topics, topic_id=topic_id, task_id=task_id)
+    try:
+        await task_repository.delete_task(topic_id, task_id)
+    except IndexError:
+        raise HTTPException(status_code=404, detail=NotFoundTopic().error)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=NotFoundTask().error)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from json import dumps
+from typing import Optional, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from schemas.topics import Topic
-from schemas.tasks import Task
-from schemas.errors import NotFoundTopic
-from utilities.file_scripts import FileUtils
+from schemas.tasks import Task, TaskInfo
+from schemas.errors import NotFoundTopic, UnknownTaskFields, RateLimitExceeded
+from utilities.limit_scripts import limit_reads
+from utilities.repository_scripts import task_repository
 
 router_topic = APIRouter(
     redirect_slashes=False,
@@ -11,30 +14,83 @@ router_topic = APIRouter(
     tags=["topics"],
 )
 
+TASK_FIELDS = tuple(Task.__fields__)
+VALUE_FIELDS = ('input', 'output')
+
+
+def parse_task_fields(fields: Optional[str], descriptions_only: bool) -> Optional[List[str]]:
+    """
+    `parse_task_fields` function returns the selected task fields,
+    None means the full task.
+    """
+    if fields is None:
+        return list(TaskInfo.__fields__) if descriptions_only else None
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    if not selected or any(field not in TASK_FIELDS for field in selected):
+        raise HTTPException(status_code=422, detail=UnknownTaskFields().error)
+    return [field for field in selected if not descriptions_only or field not in VALUE_FIELDS]
+
+
+def build_task(
+        description: dict, inputs: List[bytes] or None, outputs: List[bytes] or None,
+        fields: Optional[List[str]]
+) -> Task or TaskInfo or dict:
+    """
+    `build_task` function returns the task with the selected fields.
+    """
+    if inputs is None:
+        task = TaskInfo(**description)
+    else:
+        task = Task(**description, input=list(inputs), output=list(outputs))
+    if fields is None or fields == list(type(task).__fields__):
+        return task
+    return task.dict(include=set(fields))
+
 
 @router_topic.get(
     "/{topic_id}", status_code=200, summary="Read topic syllabus",
-    responses={404: {"model": NotFoundTopic}}
+    response_model=Topic, response_model_exclude_none=True,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}},
+        404: {"model": NotFoundTopic}, 422: {"model": UnknownTaskFields}, 429: {"model": RateLimitExceeded}
+    },
+    dependencies=[Depends(limit_reads)]
 )
-async def read_topic(topic_id: int) -> Topic or JSONResponse:
+async def read_topic(
+        topic_id: int, descriptions_only: bool = False,
+        offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+        fields: Optional[str] = None, stream: bool = False
+) -> Topic or StreamingResponse or JSONResponse:
     """
-    The `list of tasks` endpoint.
+    The `list of tasks` endpoint.\n
+    Set `descriptions_only` to skip the task input and output values,
+    or select the task fields with `fields`, e.g. `fields=title,description`.\n
+    Use `offset` and `limit` to read a page of tasks, `next_offset` points to the next page.\n
+    Set `stream` to get the tasks as NDJSON, one task per line, while they are read.
     """
     try:
-        topics_json = await FileUtils.open_file('topic_index', topic_id=topic_id)
+        # Get topic by ID
+        topic = await task_repository.get_topic(topic_id)
     except IndexError:
         raise HTTPException(status_code=404, detail=NotFoundTopic().error)
-    # Get topic by ID
-    topic = topics_json[topic_id]
-    # Create new topic info object
-    topic = Topic(
-        topic_id=topic_id, topic_name=topic.get("name"),
-        tasks_count=topic.get("count"), tasks=[]
+    task_fields = parse_task_fields(fields, descriptions_only)
+    values = task_fields is None or any(field in VALUE_FIELDS for field in task_fields)
+    tasks_count = topic.get("count")
+    # Select the page of tasks
+    last_id = tasks_count if limit is None else min(tasks_count, offset + limit)
+    tasks_files = task_repository.iter_tasks(topic_id, offset, limit, values=values)
+
+    if stream:
+        async def lines():
+            async for task_files in tasks_files:
+                task = build_task(*task_files, task_fields)
+                yield dumps(task if isinstance(task, dict) else task.dict(), ensure_ascii=False) + '\n'
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    # Create new topic info object with the topic's tasks
+    return Topic(
+        topic_id=topic_id, topic_name=topic.get("name"), tasks_count=tasks_count,
+        tasks=[build_task(*task_files, task_fields) async for task_files in tasks_files],
+        next_offset=last_id if last_id < tasks_count else None
     )
-    # Get info about topic's tasks
-    for task_id in range(1, topic.tasks_count + 1):
-        description = await FileUtils.open_file('task_info', topic_id, task_id)
-        inputs = await FileUtils.open_file_values('task_input', topic_id, task_id)
-        outputs = await FileUtils.open_file_values('task_output', topic_id, task_id)
-        topic.tasks.append(Task(**description, input=list(inputs), output=list(outputs)))
-    return topic
@@ -1,20 +1,106 @@
 from pydantic import BaseModel
+from typing import Optional, List
+
+
+class RunMetrics(BaseModel):
+    """
+    `RunMetrics` is a pydantic model defining the schema
+    for displaying the resources used by user input:
+    wall-clock and CPU seconds, peak memory and output size in bytes.
+    The values the sandbox does not report are omitted.
+    """
+    wall_time: float
+    cpu_user: Optional[float] = None
+    cpu_system: Optional[float] = None
+    peak_rss: Optional[int] = None
+    output_bytes: int
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "wall_time": 0.042,
+                "cpu_user": 0.03,
+                "cpu_system": 0.01,
+                "peak_rss": 9437184,
+                "output_bytes": 20,
+            }
+        }
+
+
+class CaseResult(BaseModel):
+    """
+    `CaseResult` is a pydantic model defining the schema
+    for displaying the result of a single test case.
+    """
+    case: int
+    status: str
+    answer: str
+    your_result: str
+    time: float
+    metrics: Optional[RunMetrics] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "case": 1,
+                "status": "OK, WRONG, ERROR, TIMEOUT, OUTPUT_LIMIT_EXCEEDED or SKIPPED",
+                "answer": "Expected case output.",
+                "your_result": "Actual case output.",
+                "time": 0.042,
+            }
+        }
 
 
 class CheckResult(BaseModel):
     """
     `CheckResult` is a pydantic model defining the schema
     for displaying a Docker check result.
+    `metrics` sums up the resources used by every test case, the peak memory is the largest one.
     """
     answer: str
     your_result: str
     status: str
+    passed: Optional[int] = None
+    total: Optional[int] = None
+    cases: Optional[List[CaseResult]] = None
+    metrics: Optional[RunMetrics] = None
 
     class Config:
         schema_extra = {
             "example": {
                 "answer": "Expected code output.",
                 "your_result": "Actual code output.",
-                "status": "OK or WRONG",
+                "status": "OK, WRONG, TIMEOUT, OUTPUT_LIMIT_EXCEEDED or COMPILATION_ERROR",
+                "passed": 1,
+                "total": 1,
+                "cases": [{
+                    "case": 1, "status": "OK", "answer": "Expected code output.",
+                    "your_result": "Actual code output.", "time": 0.042
+                }],
+            }
+        }
+
+
+class CheckJob(BaseModel):
+    """
+    `CheckJob` is a pydantic model defining the schema
+    for displaying a queued check status and its result.
+    """
+    job_id: str
+    status: str
+    topic_id: int
+    task_id: int
+    result: Optional[CheckResult] = None
+    error: Optional[str] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "job_id": "8f14e45fceea167a5a36dedd4bea2543",
+                "status": "queued, running, done or failed",
+                "topic_id": 0,
+                "task_id": 1,
+                "result": None,
+                "error": None,
             }
         }
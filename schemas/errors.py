@@ -16,10 +16,50 @@ class RateLimitExceeded(BaseModel):
     error: str = "Rate limit exceeded: 2 per 1 minute"
 
 
+class SandboxBusy(BaseModel):
+    error: str = "Too many checks are running, please try again later."
+
+
+class SubmissionTooLarge(BaseModel):
+    error: str = "The uploaded file is too large"
+
+
+class NotReady(BaseModel):
+    error: str = "The app is not ready to serve requests"
+
+
 class DockerUnavailable(BaseModel):
     error: str = "Docker problems, please try again later."
 
 
+class UnknownTaskFields(BaseModel):
+    error: str = "Unknown task fields requested"
+
+
+class UnknownComparator(BaseModel):
+    error: str = "Unknown output comparator, its options or invalid output patterns"
+
+
+class InvalidTask(BaseModel):
+    error: str = "The task comparator or language is invalid, the task needs to be fixed"
+
+
+class UnknownLanguage(BaseModel):
+    error: str = "Unknown task language"
+
+
+class NotFoundJob(BaseModel):
+    error: str = "Check job not found by ID"
+
+
+class CheckQueueFull(BaseModel):
+    error: str = "Too many checks in the queue, please try again later."
+
+
+class AuthBusy(BaseModel):
+    error: str = "Too many logins at once, please try again later."
+
+
 class EmptyRequest(BaseModel):
     error: str = "The request was empty"
 
@@ -1,17 +1,39 @@
 from json import loads
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Union
 
 
-class Task(BaseModel):
+class TaskInfo(BaseModel):
     """
-    `Task` is a pydantic model defining the schema
-    for getting a full task info via GET requests.
+    `TaskInfo` is a pydantic model defining the schema
+    for getting a task description without its input and output values.
+    `comparator` is the output comparator name or a dict with its name and options,
+    `language` is the language of the task solutions, Python by default.
     """
     id: int
     topic_id: int
     title: str
     description: List[str]
+    comparator: Optional[Union[str, Dict[str, Any]]] = None
+    language: Optional[str] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "id": 0,
+                "topic_id": 0,
+                "title": "string",
+                "description": ["Task's essence.",
+                                "Separated by a newline."],
+            }
+        }
+
+
+class Task(TaskInfo):
+    """
+    `Task` is a pydantic model defining the schema
+    for getting a full task info via GET requests.
+    """
     input: List[str]
     output: List[str]
 
@@ -33,11 +55,15 @@ class TaskCreate(BaseModel):
     """
     `TaskCreate` is a pydantic model defining the schema
     to create a new task via POST requests.
+    `comparator` is the output comparator name or a dict with its name and options,
+    `language` is the language of the task solutions, Python by default.
     """
     title: str
     description: List[str]
     input: List[str]
     output: List[str]
+    comparator: Optional[Union[str, Dict[str, Any]]] = None
+    language: Optional[str] = None
 
     @classmethod
     def __get_validators__(cls):
@@ -57,6 +83,8 @@ class TaskCreate(BaseModel):
                                 "Separated by a newline."],
                 "input": ["First input", "2"],
                 "output": ["First output", "2"],
+                "comparator": "default, exact, whitespace, lines, float or regex",
+                "language": "python, c, cpp, java or go",
             }
         }
 
@@ -70,6 +98,8 @@ class TaskUpdate(BaseModel):
     description: Optional[List[str]] = None
     input: Optional[List[str]] = None
     output: Optional[List[str]] = None
+    comparator: Optional[Union[str, Dict[str, Any]]] = None
+    language: Optional[str] = None
 
     @classmethod
     def __get_validators__(cls):
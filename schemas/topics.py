@@ -1,14 +1,18 @@
 from pydantic import BaseModel
-from typing import List
-from schemas.tasks import Task
+from typing import Any, Dict, List, Optional, Union
+from schemas.tasks import Task, TaskInfo
 
 
 class Topic(BaseModel):
     """
     `Topic` is a pydantic model defining the schema
     for getting a full topic info (including task list) via GET requests.
+    The tasks are `TaskInfo` if only the descriptions were requested,
+    and contain only the requested fields if the fields were selected.
+    `next_offset` is the offset of the next page, if there is one.
     """
     topic_id: int
     topic_name: str
     tasks_count: int
-    tasks: List[Task]
+    tasks: List[Union[Task, TaskInfo, Dict[str, Any]]]
+    next_offset: Optional[int] = None
@@ -0,0 +1,167 @@
+from asyncio import gather, sleep
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from time import sleep as blocking_sleep, time
+from pytest import mark
+from schemas.auth import UserInDB
+from schemas.checks import CheckResult
+from utilities.auth_scripts import AuthUtils, TokenCache
+from utilities.cache_scripts import ResultCache, MemoryResultStore, DatabaseResultStore, SingleFlight
+from utilities.settings import Settings
+from tests.test_docker import max_loop_lag
+from tests.test_repository import connect
+
+
+def check_result(status: str = 'OK') -> CheckResult:
+    return CheckResult(answer='1', your_result='1', status=status, passed=1, total=1)
+
+
+class TestResultCacheAsync:
+    @mark.asyncio
+    async def test_memory_store_bounds(self):
+        store = MemoryResultStore(max_entries=2, ttl=3600)
+        for key in ('a', 'b', 'c'):
+            await store.set(key, check_result())
+
+        assert await store.get('a') is None
+        assert (await store.get('c')).status == 'OK'
+
+        expired = MemoryResultStore(ttl=-1)
+        await expired.set('a', check_result())
+        assert await expired.get('a') is None
+
+    @mark.asyncio
+    async def test_tiers(self):
+        fast, slow = MemoryResultStore(), MemoryResultStore()
+        slow.name = 'slow'
+        cache = ResultCache([fast, slow])
+        key = ResultCache.key(b'print(input())', 'task')
+        await slow.set(key, check_result())
+
+        assert await cache.get(ResultCache.key(b'print(input())', 'changed task')) is None
+        assert (await cache.get(key)).status == 'OK'
+        assert (await cache.get(key)).status == 'OK'
+        assert cache.stats() == {'hits_memory': 1, 'hits_slow': 1, 'misses': 1}
+
+    @mark.asyncio
+    async def test_database_store(self, tmp_path):
+        db = await connect(tmp_path)
+        store = DatabaseResultStore(max_entries=2, ttl=3600, db=db)
+        store.sweep_every = 5
+
+        # The concurrent writes of the same result do not collide
+        await gather(*(store.set('a', check_result(status)) for status in ('OK', 'WA', 'OK')))
+        assert (await store.get('a')).status in ('OK', 'WA')
+        for key in ('b', 'c'):
+            await sleep(0.01)
+            await store.set(key, check_result())
+
+        # The oldest result above the bound is deleted by the sweep every 5 writes
+        assert await store.get('a') is None
+        assert await db.fetch_val("SELECT COUNT(*) FROM check_results") == 2
+        await db.disconnect()
+
+    @mark.asyncio
+    async def test_failed_write_skipped(self):
+        class BrokenStore(MemoryResultStore):
+            name = 'broken'
+
+            async def set(self, key: str, result: CheckResult) -> None:
+                raise RuntimeError("The database is gone")
+
+        memory = MemoryResultStore()
+        cache = ResultCache([BrokenStore(), memory])
+
+        await cache.set('key', check_result())
+
+        assert (await memory.get('key')).status == 'OK'
+
+
+class TestSingleFlightAsync:
+    @mark.asyncio
+    async def test_concurrent_checks_coalesced(self):
+        flight = SingleFlight()
+        runs = 0
+
+        async def check():
+            nonlocal runs
+            runs += 1
+            await sleep(0.05)
+            return check_result()
+
+        results = await gather(*(flight.run('key', check) for _ in range(5)))
+
+        assert runs == 1
+        assert all(result.status == 'OK' for result in results)
+        assert flight.stats() == {'executions': 1, 'saved': 4, 'in_flight': 0}
+
+    @mark.asyncio
+    async def test_error_shared(self):
+        flight = SingleFlight()
+
+        async def check():
+            await sleep(0.01)
+            raise RuntimeError("Sandbox failed")
+
+        results = await gather(*(flight.run('key', check) for _ in range(2)), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flight.stats()['in_flight'] == 0
+
+
+class TestTokenCacheAsync:
+    @mark.asyncio
+    async def test_token_user_cached(self, monkeypatch):
+        lookups = []
+
+        async def get_user(email):
+            lookups.append(email)
+            return UserInDB(id=1, email=email, hashed_password='hash')
+
+        monkeypatch.setattr(AuthUtils, 'token_cache', TokenCache(max_entries=8, ttl=60))
+        monkeypatch.setattr(AuthUtils, '_get_user', get_user)
+        token = await AuthUtils.create_access_token({'sub': 'user@example.com'}, timedelta(minutes=5))
+
+        for _ in range(3):
+            assert (await AuthUtils.get_current_user(token)).email == 'user@example.com'
+        assert lookups == ['user@example.com']
+
+        # The modified user is read again
+        AuthUtils.invalidate_user('user@example.com')
+        await AuthUtils.get_current_user(token)
+        assert lookups == ['user@example.com'] * 2
+        assert AuthUtils.token_cache.stats() == {
+            'hits': 2, 'misses': 2, 'evictions': 0, 'invalidations': 1, 'size': 1
+        }
+
+    def test_capped_at_token_expiry(self):
+        cache = TokenCache(max_entries=8, ttl=60)
+        cache.set('token', UserInDB(id=1, email='user@example.com', hashed_password='hash'), time() - 1)
+
+        assert cache.get('token') is None
+
+
+class FakeCryptContext:
+    def verify(self, password, hashed_password):
+        blocking_sleep(0.1)
+        return password == hashed_password
+
+
+class TestPasswordHashingAsync:
+    @mark.asyncio
+    async def test_login_storm(self, monkeypatch):
+        monkeypatch.setattr(AuthUtils, 'pwd_context', FakeCryptContext())
+        monkeypatch.setattr(AuthUtils, 'hash_executor', ThreadPoolExecutor(max_workers=2))
+        monkeypatch.setattr(Settings, 'AUTH_HASH_THREADS', 2)
+        monkeypatch.setattr(Settings, 'AUTH_HASH_QUEUE', 2)
+
+        lag, results = await max_loop_lag(gather(
+            *(AuthUtils._verify_password('password', 'password') for _ in range(6)),
+            return_exceptions=True
+        ))
+
+        # The calls above the pool size and the queue limit are rejected
+        assert results[:4] == [True] * 4
+        assert [error.status_code for error in results[4:]] == [503, 503]
+        assert AuthUtils.hash_pending == 0
+        assert lag < 0.05
@@ -14,19 +14,23 @@ class TestCheckAsync(TestAuthMixin):
                 f"api/checks/0/1", files={'file': b"print(input())"}, headers=self.headers
             )
             answer_true_status = answer_true.status_code
-            answer_true = tuple(answer_true.json().values())
+            answer_true = answer_true.json()
 
         async with AsyncClient(app=app, base_url="http://test") as ac:
             answer_false = await ac.post(
                 f"api/checks/0/1", files={'file': b'print("Fail!")'}, headers=self.headers
             )
             answer_false_status = answer_false.status_code
-            answer_false = tuple(answer_false.json().values())
+            answer_false = answer_false.json()
 
         assert all([answer_true_status == 200, answer_false_status == 200])
 
-        assert answer_true == ('Hello, World!', 'Hello, World!', 'OK')
-        assert answer_false == ('Hello, World!', 'Fail!', 'WRONG')
+        assert (answer_true['answer'], answer_true['your_result'], answer_true['status']) == \
+               ('Hello, World!', 'Hello, World!', 'OK')
+        assert (answer_false['answer'], answer_false['your_result'], answer_false['status']) == \
+               ('Hello, World!', 'Fail!', 'WRONG')
+        assert answer_true['passed'] == answer_true['total'] == 1
+        assert answer_false['passed'] == 0
 
 
 class TestCheckErrorsAsync(TestAuthMixin):
@@ -0,0 +1,227 @@
+from asyncio import gather, get_event_loop, sleep
+from io import BytesIO
+from tarfile import open as open_tar
+from time import sleep as blocking_sleep
+from pytest import mark
+from utilities import docker_scripts
+from utilities.docker_scripts import ArtifactReaper, DockerUtils
+from utilities.repository_scripts import DatabaseTaskRepository
+from tests.test_repository import connect
+
+
+class FakeContainer:
+    id = 'container'
+
+    def wait(self, timeout=None):
+        blocking_sleep(0.2)
+        return {'StatusCode': 0}
+
+    def logs(self, stdout=True, stderr=False, stream=False):
+        return iter([b'Hel', b'lo'] if stdout else [])
+
+    def remove(self, force=False):
+        blocking_sleep(0.05)
+
+
+class FakeImages:
+    contexts = []
+
+    def build(self, **image_config):
+        blocking_sleep(0.2)
+        self.contexts.append(image_config['fileobj'].getvalue())
+        return [image_config['tag'], []]
+
+    def remove(self, tag, force=False):
+        blocking_sleep(0.05)
+
+
+class FakeContainers:
+    def run(self, image, **container_config):
+        blocking_sleep(0.05)
+        return FakeContainer()
+
+
+class FakeClient:
+    images = FakeImages()
+    containers = FakeContainers()
+
+
+async def max_loop_lag(task, interval: float = 0.01) -> float:
+    """
+    Runs the task and returns the longest event loop delay seen by a ticker meanwhile.
+    """
+    loop = get_event_loop()
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            start = loop.time()
+            await sleep(interval)
+            lag = max(lag, loop.time() - start - interval)
+
+    ticking = loop.create_task(ticker())
+    try:
+        result = await task
+    finally:
+        done = True
+        await ticking
+    return lag, result
+
+
+class TestDockerUtilsAsync:
+    @mark.asyncio
+    async def test_docker_calls_do_not_block_loop(self, monkeypatch):
+        async def get_task_context(topic_name, task_id):
+            return 1, DockerUtils._tar_member('task_1.txt', b'1\n')
+
+        monkeypatch.setattr(DockerUtils, '_client', FakeClient())
+        monkeypatch.setattr(DockerUtils, 'get_task_context', get_task_context)
+        monkeypatch.setattr(DockerUtils, 'reaper', ArtifactReaper())
+
+        lag, results = await max_loop_lag(gather(
+            *(DockerUtils._image_build('test', 1, b'print(input())', i) for i in range(4)),
+            *(DockerUtils._container_run_sdk('image', f'check_{i}', b'Hello') for i in range(4)),
+        ))
+
+        assert results[:4] == [f'test_1_{i}' for i in range(4)]
+        assert [result[:3] for result in results[4:8]] == [(b'Hello', b'', 0)] * 4
+        assert lag < 0.1
+        # The stopped containers are handed over to the reaper
+        assert DockerUtils.reaper.pending['container'] == {'container'}
+
+    @mark.asyncio
+    async def test_build_context(self, tmp_path, monkeypatch):
+        db = await connect(tmp_path)
+        repository = DatabaseTaskRepository(db)
+        topic_id = await repository.create_topic('Test', 'test')
+        await repository.create_task(topic_id, {'title': 'Echo', 'description': []}, ['1', '2'], ['1', '2'], b'')
+        reads = []
+
+        async def get_task(*args, **kwargs):
+            reads.append(args)
+            return await DatabaseTaskRepository.get_task(repository, *args, **kwargs)
+
+        monkeypatch.setattr(repository, 'get_task', get_task)
+        monkeypatch.setattr(docker_scripts, 'task_repository', repository)
+        monkeypatch.setattr(DockerUtils, '_client', FakeClient())
+        monkeypatch.setattr(DockerUtils, 'task_contexts', {})
+        monkeypatch.setattr(DockerUtils, '_topic_ids', {})
+        monkeypatch.setattr(FakeImages, 'contexts', [])
+
+        for id_random in range(2):
+            await DockerUtils._image_build('test', 1, b'print(input())', id_random)
+        # The task input is read once per task version
+        assert len(reads) == 1
+        await repository.update_task(topic_id, 1, inputs=['3'])
+        await DockerUtils._image_build('test', 1, b'print(input())', 2)
+
+        with open_tar(fileobj=BytesIO(FakeImages.contexts[-1])) as context:
+            assert context.getnames() == ['Dockerfile', 'task_1.txt', 'main.py']
+            assert context.extractfile('task_1.txt').read() == b'3\n'
+            assert context.extractfile('main.py').read() == b'print(input())'
+        await db.disconnect()
+
+    @mark.asyncio
+    async def test_prebuild_skips_deleted_ids(self, tmp_path, monkeypatch):
+        db = await connect(tmp_path)
+        repository = DatabaseTaskRepository(db)
+        topic_id = await repository.create_topic('Test', 'test')
+        for number in range(3):
+            await repository.create_task(topic_id, {'title': f'Task {number}', 'description': []}, [], [], b'')
+        await repository.delete_task(topic_id, 1)
+        built = []
+
+        async def get_runner_image(topic_name, task_id):
+            built.append(task_id)
+
+        monkeypatch.setattr(docker_scripts, 'task_repository', repository)
+        monkeypatch.setattr(DockerUtils, 'get_runner_image', get_runner_image)
+
+        await DockerUtils.prebuild_runner_images(await repository.get_topics())
+
+        assert built == [2, 3]
+        await db.disconnect()
+
+    @mark.asyncio
+    async def test_prebuild_skips_deleted_topic(self, tmp_path, monkeypatch):
+        db = await connect(tmp_path)
+        repository = DatabaseTaskRepository(db)
+        for name in ('Deleted', 'Test'):
+            topic_id = await repository.create_topic(name, name.lower())
+            await repository.create_task(topic_id, {'title': 'Task', 'description': []}, [], [], b'')
+        iter_tasks = repository.iter_tasks
+        built = []
+
+        async def get_runner_image(topic_name, task_id):
+            built.append((topic_name, task_id))
+
+        def deleted_iter_tasks(topic_id, *args, **kwargs):
+            if topic_id == 0:
+                raise FileNotFoundError('The task was deleted')
+            return iter_tasks(topic_id, *args, **kwargs)
+
+        monkeypatch.setattr(docker_scripts, 'task_repository', repository)
+        monkeypatch.setattr(repository, 'iter_tasks', deleted_iter_tasks)
+        monkeypatch.setattr(DockerUtils, 'get_runner_image', get_runner_image)
+
+        await DockerUtils.prebuild_runner_images(await repository.get_topics())
+
+        assert built == [('test', 1)]
+        await db.disconnect()
+
+
+class FakeReaper(ArtifactReaper):
+    def __init__(self, *args, missing=(), broken=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+        self.missing = missing
+        self.broken = broken
+
+    async def _docker(self, *args):
+        self.calls.append(args)
+        if self.broken:
+            return 1, '', 'Cannot connect to the Docker daemon'
+        if args[:2] == ('container', 'prune'):
+            return 0, 'Deleted Containers:\nc1\nc2\n\nTotal reclaimed space: 0B\n', ''
+        if args[:2] == ('image', 'prune'):
+            return 0, 'Deleted Images:\nuntagged: test_1_x\ndeleted: sha256:1\n\nTotal reclaimed space: 5MB\n', ''
+        missing = [f'Error: No such {args[0]}: {i}' for i in args[3:] if i in self.missing]
+        return (1 if missing else 0), '', '\n'.join(missing)
+
+
+class TestArtifactReaperAsync:
+    @mark.asyncio
+    async def test_batched_removal(self):
+        reaper = FakeReaper(batch_size=2, max_pending=4, missing=('image_2',))
+        await reaper.release('image', 'image_1')
+        await reaper.release('container', 'container_1')
+        await reaper.release('image', 'image_2')
+        assert reaper.calls == []
+
+        # The pending limit removes every artifact at once, the containers go first
+        await reaper.release('image', 'image_3')
+        assert [call[:3] for call in reaper.calls] == [
+            ('container', 'rm', '--force'), ('image', 'rm', '--force'), ('image', 'rm', '--force')
+        ]
+        assert [len(call[3:]) for call in reaper.calls] == [1, 2, 1]
+        assert {i for call in reaper.calls[1:] for i in call[3:]} == {'image_1', 'image_2', 'image_3'}
+        assert reaper.stats() == {
+            'pending_containers': 0, 'pending_images': 0,
+            'reclaimed_containers': 1, 'reclaimed_images': 3, 'pruned': 0, 'failures': 0
+        }
+        assert await reaper.prune() == 3
+        assert reaper.calls[-1][:2] == ('image', 'prune') and 'until=600s' in reaper.calls[-1]
+
+    @mark.asyncio
+    async def test_failed_removal_retried(self):
+        reaper = FakeReaper(broken=True)
+        reaper.discard('image', 'image_1')
+
+        assert await reaper.collect() == {'container': 0, 'image': 0}
+        assert reaper.pending['image'] == {'image_1'}
+        reaper.broken = False
+        await reaper.close()
+        assert reaper.stats()['reclaimed_images'] == 1
+        assert reaper.stats()['failures'] == 1
@@ -0,0 +1,99 @@
+from json import dumps
+from os import utime, stat
+from pathlib import Path
+from pytest import mark
+from utilities.file_scripts import FileUtils, MaterialsCache
+from utilities.settings import Settings
+
+
+def write_materials(root, topics):
+    (root / 'materials' / 'test' / 'input').mkdir(parents=True)
+    (root / 'materials' / 'topics.json').write_text(dumps(topics))
+    (root / 'materials' / 'test' / 'input' / 'task_1.txt').write_text('1\n2\n')
+
+
+class TestMaterialsCacheAsync:
+    @mark.asyncio
+    async def test_topic_index_parsed_once(self, tmp_path, monkeypatch):
+        write_materials(tmp_path, [{'path': 'test'}])
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(FileUtils, 'materials_cache', MaterialsCache(8))
+
+        for _ in range(3):
+            assert await FileUtils.open_file_values('task_input', 0, 1) == [b'1', b'2', b'']
+        topic_index = await FileUtils.open_file('topic_index')
+        # The cached content is not shared with the callers
+        topic_index.append({'path': 'other'})
+
+        assert await FileUtils.open_file('topic_index') == [{'path': 'test'}]
+        assert FileUtils.materials_cache.stats()['misses'] == 2
+        assert FileUtils.materials_cache.stats()['hits'] == 6
+
+    @mark.asyncio
+    async def test_invalidation(self, tmp_path, monkeypatch):
+        write_materials(tmp_path, [{'path': 'test'}])
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(FileUtils, 'materials_cache', MaterialsCache(8))
+        input_path = tmp_path / 'materials' / 'test' / 'input' / 'task_1.txt'
+
+        await FileUtils.open_file_values('task_input', 0, 1)
+        await FileUtils.save_file_values('task_input', ['3'], 0, 1)
+        assert await FileUtils.open_file_values('task_input', 0, 1) == [b'3', b'']
+
+        # Out-of-band edit is caught by the modification time
+        input_path.write_text('4\n')
+        mtime = stat(input_path).st_mtime_ns + 10 ** 9
+        utime(input_path, ns=(mtime, mtime))
+        assert await FileUtils.open_file_values('task_input', 0, 1) == [b'4', b'']
+        assert FileUtils.materials_cache.stats()['invalidations'] == 1
+
+    @mark.asyncio
+    async def test_eviction(self, tmp_path):
+        cache = MaterialsCache(max_entries=1)
+        paths = [tmp_path / 'first.txt', tmp_path / 'second.txt']
+        for path in paths:
+            path.write_text(path.name)
+
+        async def loader(path):
+            return path
+
+        for path in paths + paths[:1]:
+            await cache.load(str(path), loader)
+
+        assert cache.stats() == {'hits': 0, 'misses': 3, 'evictions': 2, 'invalidations': 0, 'size': 1}
+
+    @mark.asyncio
+    async def test_open_topic_files(self, tmp_path, monkeypatch):
+        write_materials(tmp_path, [{'path': 'test'}])
+        for directory in ('description', 'output'):
+            (tmp_path / 'materials' / 'test' / directory).mkdir()
+        for task_id in (1, 2, 3):
+            (tmp_path / 'materials' / 'test' / 'description' / f'task_{task_id}.json').write_text(
+                dumps({'id': task_id})
+            )
+        (tmp_path / 'materials' / 'test' / 'output' / 'task_1.txt').write_text('2\n3\n')
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(FileUtils, 'materials_cache', MaterialsCache(8))
+
+        tasks = await FileUtils.open_topic_files(0, 3, values=False, concurrency=2)
+        assert tasks == [({'id': task_id}, None, None) for task_id in (1, 2, 3)]
+        assert await FileUtils.open_task_files(0, 1) == ({'id': 1}, [b'1', b'2', b''], [b'2', b'3', b''])
+
+
+class TestSandboxWorkspaceAsync:
+    @mark.asyncio
+    async def test_reap_orphaned_files(self, tmp_path, monkeypatch):
+        workspace = tmp_path / 'temp'
+        monkeypatch.setattr(Settings, 'SANDBOX_WORKSPACE', str(workspace))
+        orphaned = await FileUtils.get_user_answer_temp(b'print(1)')
+        running = await FileUtils.get_user_answer_temp(b'print(2)')
+        (workspace / 'check_workdir').mkdir()
+        (workspace / 'check_workdir' / 'main.py').write_bytes(b'print(3)')
+        (workspace / 'notes.txt').write_text('Not a submission')
+        for path in (orphaned, str(workspace / 'check_workdir'), str(workspace / 'notes.txt')):
+            utime(path, (0, 0))
+
+        assert await FileUtils.reap_user_answer_files(max_age=60) == 2
+        assert sorted(path.name for path in workspace.iterdir()) == sorted([Path(running).name, 'notes.txt'])
+        await FileUtils.remove_user_answer_file(running)
+        assert await FileUtils.reap_user_answer_files(str(tmp_path / 'missing'), 60) == 0
@@ -0,0 +1,132 @@
+from asyncio import sleep
+from fastapi import HTTPException
+from pytest import mark, raises
+from routers.tasks import validate_comparator
+from utilities.comparator_scripts import ComparatorUtils
+from utilities.grading_scripts import GradingUtils
+from schemas.checks import RunMetrics
+from utilities.sandbox_scripts import ExecResult
+
+default = ComparatorUtils.create()
+
+
+async def echo(stdin: bytes):
+    await sleep(0.01)
+    return ExecResult(stdin, b'', 0)
+
+
+def prepared(inputs: list, outputs: list) -> list:
+    return GradingUtils.prepare_cases(GradingUtils.build_cases(inputs, outputs), default)
+
+
+class TestGradingAsync:
+    def test_build_cases(self):
+        paired = GradingUtils.build_cases([b'1', b'2', b''], [b'1', b'2', b''])
+        single = GradingUtils.build_cases([b'', b''], [b'OK', b'OK', b'OK', b''])
+
+        assert paired == [(b'1\n', b'1'), (b'2\n', b'2')]
+        assert single == [(b'\n', b'OK\nOK\nOK')]
+
+    @mark.asyncio
+    async def test_grade_cases(self):
+        cases = prepared([b'1', b'2', b'3'], [b'1', b'2', b'4'])
+        result = GradingUtils.check_result(await GradingUtils.grade(echo, cases, default, concurrency=2))
+
+        assert result.status == 'WRONG'
+        assert (result.passed, result.total) == (2, 3)
+        assert [case.status for case in result.cases] == ['OK', 'OK', 'WRONG']
+        assert all(case.time > 0 for case in result.cases)
+
+    @mark.asyncio
+    async def test_grade_concurrency(self):
+        running, peak = 0, 0
+
+        async def run(stdin: bytes):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await sleep(0.01)
+            running -= 1
+            return ExecResult(stdin, b'', 0)
+
+        cases = prepared([b'x'] * 10, [b'x'] * 10)
+        result = GradingUtils.check_result(await GradingUtils.grade(run, cases, default, concurrency=3))
+
+        assert result.status == 'OK'
+        assert peak == 3
+
+    @mark.asyncio
+    async def test_grade_fail_fast(self):
+        cases = prepared([b'1', b'2', b'3', b'4'], [b'0', b'2', b'3', b'4'])
+        results = await GradingUtils.grade(echo, cases, default, concurrency=1, fail_fast=True)
+
+        assert [case.status for case in results] == ['WRONG', 'SKIPPED', 'SKIPPED', 'SKIPPED']
+
+    @mark.asyncio
+    async def test_grade_limits(self):
+        async def run(stdin: bytes):
+            limit = {b'1\n': None, b'2\n': 'TIMEOUT', b'3\n': 'OUTPUT_LIMIT_EXCEEDED'}[stdin]
+            return ExecResult(stdin, b'', -9 if limit else 0, limit)
+
+        cases = prepared([b'1', b'2', b'3'], [b'1', b'2', b'3'])
+        result = GradingUtils.check_result(await GradingUtils.grade(run, cases, default))
+
+        assert [case.status for case in result.cases] == ['OK', 'TIMEOUT', 'OUTPUT_LIMIT_EXCEEDED']
+        assert result.status == 'TIMEOUT'
+
+    def test_total_metrics(self):
+        metrics = GradingUtils.total_metrics([
+            RunMetrics(wall_time=1.0, cpu_user=0.5, cpu_system=0.1, peak_rss=10, output_bytes=3),
+            RunMetrics(wall_time=2.0, cpu_user=0.5, cpu_system=0.1, peak_rss=30, output_bytes=4),
+        ])
+        partial = GradingUtils.total_metrics([RunMetrics(wall_time=1.0, output_bytes=1)] * 2)
+
+        assert (metrics.wall_time, metrics.cpu_user, metrics.peak_rss, metrics.output_bytes) == (3.0, 1.0, 30, 7)
+        assert (partial.wall_time, partial.cpu_user, partial.peak_rss) == (2.0, None, None)
+
+
+class TestComparators:
+    def check(self, spec, expected: bytes, output: bytes) -> bool:
+        comparator = ComparatorUtils.create(spec)
+        return comparator.compare(comparator.prepare(expected), output)
+
+    def test_default(self):
+        assert self.check(None, b'1\n2', b'  1\n2\n')
+        assert self.check('default', b'12', b'1\n2\n')
+        assert not self.check('default', b'1 2', b'1\n2\n')
+
+    def test_exact(self):
+        assert self.check('exact', b'1 2', b'1 2\r\n')
+        assert not self.check('exact', b'1 2', b' 1 2\n')
+
+    def test_whitespace(self):
+        assert self.check('whitespace', b'1 2\n3', b'1\n2   3\n')
+        assert not self.check('whitespace', b'1 2', b'1 2 3')
+
+    def test_lines(self):
+        assert self.check('lines', b'a b\nc', b'a b  \r\nc\n\n')
+        assert not self.check('lines', b'a b\nc', b'a b\nc\nd')
+        assert not self.check('lines', b'a\nb', b'a\n')
+
+    def test_float(self):
+        assert self.check({'name': 'float', 'abs_tol': 0.01}, b'x 3.14', b'x 3.141')
+        assert not self.check('float', b'x 3.14', b'x 3.141')
+        assert not self.check('float', b'x 1', b'y 1')
+
+    def test_regex(self):
+        assert self.check({'name': 'regex', 'ignore_case': True}, b'hello, \\w+!\n\\d+', b'Hello, World!\n42\n')
+        assert not self.check('regex', b'\\d+', b'42x')
+
+    def test_unknown(self):
+        with raises(ValueError):
+            ComparatorUtils.create('fuzzy')
+        with raises(ValueError):
+            ComparatorUtils.create({'name': 'exact', 'abs_tol': 1})
+
+    def test_saved_task_validated(self):
+        validate_comparator('regex', ['\\d+', 'a|b'])
+        # The regex comparator outputs are compiled before the task is saved
+        for spec, outputs in (('regex', ['\\d+', '(']), ('fuzzy', None)):
+            with raises(HTTPException) as error:
+                validate_comparator(spec, outputs)
+            assert error.value.status_code == 422
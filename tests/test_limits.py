@@ -0,0 +1,109 @@
+from asyncio import ensure_future, gather, sleep
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from pytest import mark, raises
+from utilities.check_scripts import CheckUtils
+from utilities.comparator_scripts import ComparatorUtils
+from utilities.grading_scripts import ExpectedAnswer, GradingUtils
+from utilities.limit_scripts import Limit, MemoryBucketStore, RateLimited, RateLimiter, SQLiteBucketStore, \
+    UploadSizeLimit, limit_sandbox, refill
+from utilities.runtime_scripts import runtime_registry
+from utilities.sandbox_scripts import SubprocessBackend
+from utilities.settings import Settings
+
+
+class TestRateLimiterAsync:
+    def test_refill(self):
+        limit = Limit.parse('2/minute')
+
+        tokens, retry_after = refill(None, limit, 100)
+        assert (tokens, retry_after) == (1, 0)
+        tokens, retry_after = refill((tokens, 100), limit, 100)
+        assert (tokens, retry_after) == (0, 0)
+        # A token is added every 30 seconds
+        assert refill((0, 100), limit, 115) == (0.5, 15)
+        assert refill((0, 100), limit, 130)[1] == 0
+        with raises(ValueError):
+            Limit.parse('2 per minute')
+
+    @mark.asyncio
+    async def test_users_and_scopes(self):
+        limiter = RateLimiter(MemoryBucketStore(), {
+            'check': Limit.parse('2/minute'), 'read': Limit.parse('1/second')
+        })
+        for _ in range(2):
+            await limiter.hit('check', 'user:1')
+        with raises(RateLimited) as error:
+            await limiter.hit('check', 'user:1')
+
+        assert str(error.value) == 'Rate limit exceeded: 2 per 1 minute'
+        assert 0 < error.value.retry_after <= 30
+        # Other users and the reads have their own buckets
+        await limiter.hit('check', 'user:2')
+        await limiter.hit('read', 'user:1')
+
+    @mark.asyncio
+    async def test_sqlite_store_shared(self, tmp_path):
+        path = str(tmp_path / 'limits.db')
+        limit = Limit.parse('3/minute')
+        # Two stores stand for two app workers
+        first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+
+        waits = await gather(*(store.take('check:user:1', limit) for store in (first, second) * 2))
+        await first.close()
+        await second.close()
+
+        assert sorted(wait > 0 for wait in waits) == [False, False, False, True]
+
+
+class TestSandboxCapacityAsync:
+    @mark.asyncio
+    async def test_sandbox_runs_counted(self, monkeypatch):
+        monkeypatch.setattr(CheckUtils, 'backend', SubprocessBackend(timeout=5))
+        monkeypatch.setattr(CheckUtils, 'result_cache', None)
+        monkeypatch.setattr(Settings, 'SANDBOX_CAPACITY', 2)
+        comparator = ComparatorUtils.create()
+        cases = GradingUtils.prepare_cases(GradingUtils.build_cases([b'1'], [b'1']), comparator)
+        expected = ExpectedAnswer(comparator, cases, None, 'task', runtime_registry.get())
+        code = b'import time; time.sleep(0.3); print(input())'
+
+        # The checks of the route and of the queue workers share the sandbox capacity
+        running = ensure_future(gather(*(
+            CheckUtils._run_check(f'key_{number}', 'test', 1, code, expected, False) for number in range(2)
+        )))
+        await sleep(0.1)
+        assert CheckUtils.sandbox_running == 2
+        with raises(HTTPException) as error:
+            limit_sandbox(CheckUtils.sandbox_running)
+        assert error.value.status_code == 503
+
+        assert [result.status for result in await running] == ['OK', 'OK']
+        assert CheckUtils.sandbox_running == 0
+
+
+class TestUploadSizeLimit:
+    def test_upload_rejected_while_received(self):
+        app = FastAPI()
+        app.add_middleware(UploadSizeLimit, max_size=1024, prefix='/api/checks')
+
+        @app.post('/api/checks/{topic_id}/{task_id}')
+        async def check(topic_id: int, task_id: int, file: UploadFile = File(...)):
+            return {'size': len(await file.read())}
+
+        client = TestClient(app)
+        assert client.post('/api/checks/0/1', files={'file': b'print(1)'}).json() == {'size': 8}
+        # The declared body size is rejected before the body is read
+        response = client.post('/api/checks/0/1', files={'file': b'x' * 2048})
+        assert (response.status_code, response.json()) == (413, {'detail': 'The uploaded file is too large'})
+
+        # The chunked body has no declared size, it is counted while received
+        def chunks():
+            yield b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="main.py"\r\n\r\n'
+            for _ in range(16):
+                yield b'x' * 256
+
+        response = client.post(
+            '/api/checks/0/1', content=chunks(),
+            headers={'Content-Type': 'multipart/form-data; boundary=boundary'}
+        )
+        assert response.status_code == 413
@@ -0,0 +1,29 @@
+from utilities.metrics_scripts import MetricsRegistry
+
+
+class TestMetricsRegistry:
+    def test_render(self):
+        registry = MetricsRegistry()
+        checks = registry.counter('checks_total', 'Checks.', ('status',))
+        in_flight = registry.gauge('checks_in_flight', 'Running checks.')
+        stage = registry.histogram('stage_seconds', 'Stages.', ('stage',), buckets=(0.1, 1))
+        registry.callback('cache', 'Cache counters.', lambda: [({'counter': 'hits'}, 3)])
+
+        checks.inc(status='OK')
+        checks.inc(status='OK')
+        checks.inc(status='WRONG')
+        in_flight.inc()
+        stage.observe(0.05, stage='run')
+        stage.observe(0.5, stage='run')
+        with stage.time(stage='compare'):
+            pass
+
+        lines = registry.render().splitlines()
+        assert '# TYPE checks_total counter' in lines
+        assert 'checks_total{status="OK"} 2' in lines
+        assert 'checks_total{status="WRONG"} 1' in lines
+        assert 'checks_in_flight 1' in lines
+        assert 'stage_seconds_bucket{stage="run",le="0.1"} 1' in lines
+        assert 'stage_seconds_bucket{stage="run",le="+Inf"} 2' in lines
+        assert 'stage_seconds_count{stage="compare"} 1' in lines
+        assert 'cache{counter="hits"} 3' in lines
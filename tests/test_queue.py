@@ -0,0 +1,107 @@
+from asyncio import sleep
+from time import time
+from databases import Database
+from pytest import mark, raises
+from database.config import create_schema
+from schemas.checks import CheckResult
+from utilities.queue_scripts import CheckQueue, CheckQueueFull, Job, MemoryJobQueue, DatabaseJobQueue
+
+
+async def check(job: Job) -> CheckResult:
+    await sleep(0.01)
+    if not job.code:
+        raise FileNotFoundError("Task not found")
+    answer = job.code.decode('utf-8')
+    return CheckResult(answer=answer, your_result=answer, status='OK')
+
+
+class TestCheckQueueAsync:
+    @mark.asyncio
+    async def test_queue_submit_and_wait(self):
+        queue = CheckQueue(MemoryJobQueue(), check, workers=2)
+        queue.start()
+        job = await queue.submit(Job(0, 1, b'Hello', owner='user@example.com'))
+        failed = await queue.submit(Job(0, 1, b'', owner='user@example.com'))
+
+        assert job.status == 'queued'
+        job = await queue.wait(job.id, timeout=1)
+        failed = await queue.wait(failed.id, timeout=1)
+        await queue.stop()
+
+        assert job.status == 'done'
+        assert job.result.your_result == 'Hello'
+        assert failed.status == 'failed'
+        assert failed.error == 'Task not found'
+
+    @mark.asyncio
+    async def test_queue_backend_error(self):
+        backend = MemoryJobQueue()
+        save = backend.save
+        failures = [RuntimeError("The database is gone")]
+
+        async def flaky_save(job: Job) -> None:
+            if failures:
+                raise failures.pop()
+            await save(job)
+
+        backend.save = flaky_save
+        queue = CheckQueue(backend, check, workers=1, poll_interval=0.01)
+        queue.start()
+        lost = await queue.submit(Job(0, 1, b'Lost', owner='user@example.com'))
+        job = await queue.submit(Job(0, 1, b'Hello', owner='user@example.com'))
+
+        job = await queue.wait(job.id, timeout=1)
+        # The worker survives the failed save and processes the next job
+        assert job.status == 'done'
+        assert (await queue.backend.load(lost.id)).status != 'done'
+        await queue.stop()
+        assert not queue._tasks
+
+    @mark.asyncio
+    async def test_queue_wait_timeout(self):
+        queue = CheckQueue(MemoryJobQueue(), check, workers=1)
+        job = await queue.submit(Job(0, 1, b'Hello', owner='user@example.com'))
+
+        job = await queue.wait(job.id, timeout=0.05)
+
+        assert job.status == 'queued'
+        assert await queue.wait('unknown', timeout=0.05) is None
+
+    @mark.asyncio
+    async def test_queue_depth_limit(self):
+        queue = CheckQueue(MemoryJobQueue(max_depth=1), check)
+        await queue.submit(Job(0, 1, b'Hello', owner='user@example.com'))
+
+        with raises(CheckQueueFull):
+            await queue.submit(Job(0, 1, b'Hello', owner='user@example.com'))
+        assert await queue.backend.depth() == 1
+
+    @mark.asyncio
+    async def test_database_queue_retention(self, tmp_path):
+        db = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        await db.connect()
+        await create_schema(db)
+        backend = DatabaseJobQueue(poll_interval=0.01, max_jobs=2, stale_after=60, db=db)
+        # The jobs are waited for until their workers save them and sweep the table, not polled
+        queue = CheckQueue(backend, check, workers=1, poll_interval=1)
+        # A job left running by a killed app worker
+        stale = Job(0, 1, b'Hello', owner='user@example.com', created=time() - 120)
+        await backend.put(stale)
+        await db.execute(
+            "UPDATE check_jobs SET status = 'running', started = :started WHERE id = :id",
+            values={"started": time() - 120, "id": stale.id}
+        )
+
+        await backend.start()
+        stale = await backend.load(stale.id)
+        queue.start()
+        jobs = [await queue.submit(Job(0, 1, b'Hello', owner='user@example.com')) for _ in range(3)]
+        jobs = [await queue.wait(job.id, timeout=1) for job in jobs]
+        await queue.stop()
+
+        assert (stale.status, stale.code) == ('failed', None)
+        assert [(job.status, job.code) for job in jobs] == [('done', None)] * 3
+        # Only the latest finished jobs are kept
+        assert await backend.load(jobs[0].id) is None
+        assert await db.fetch_val("SELECT COUNT(*) FROM check_jobs") == 2
+        await db.disconnect()
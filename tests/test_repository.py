@@ -0,0 +1,136 @@
+from asyncio import gather
+from databases import Database
+from pytest import mark, raises
+from database.config import create_schema
+from utilities.file_scripts import FileUtils, MaterialsCache
+from utilities.repository_scripts import DatabaseTaskRepository, FileTaskRepository, copy_tasks
+from tests.test_files import write_materials
+
+
+async def connect(tmp_path) -> Database:
+    db = Database(f"sqlite:///{tmp_path / 'test.db'}")
+    await db.connect()
+    await create_schema(db)
+    return db
+
+
+class TestFileTaskRepositoryAsync:
+    @mark.asyncio
+    async def test_deleted_task_id_not_reused(self, tmp_path, monkeypatch):
+        write_materials(tmp_path, [])
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(FileUtils, 'materials_cache', MaterialsCache(8))
+        repository = FileTaskRepository()
+        topic_id = await repository.create_topic('Test', 'test')
+        for number in range(3):
+            await repository.create_task(
+                topic_id, {'title': f'Task {number + 1}', 'description': []}, ['1'], ['1'], b'code'
+            )
+
+        await repository.delete_task(topic_id, 2)
+        assert await repository.create_task(topic_id, {'title': 'New', 'description': []}, [], [], b'') == 4
+
+        assert (await repository.get_task(topic_id, 3, values=False))[0]['title'] == 'Task 3'
+        assert (await repository.get_topic(topic_id))['count'] == 3
+        tasks = [task async for task in repository.iter_tasks(topic_id, values=False)]
+        assert [description['id'] for description, _, _ in tasks] == [1, 3, 4]
+        page = [task async for task in repository.iter_tasks(topic_id, offset=1, limit=1, values=False)]
+        assert [description['id'] for description, _, _ in page] == [3]
+
+
+class TestDatabaseTaskRepositoryAsync:
+    @mark.asyncio
+    async def test_task_crud(self, tmp_path):
+        db = await connect(tmp_path)
+        repository = DatabaseTaskRepository(db, batch_size=2)
+        topic_id = await repository.create_topic('Test', 'test')
+
+        task_ids = await gather(*(
+            repository.create_task(
+                topic_id, {'title': f'Task {number}', 'description': ['Echo']}, ['1', '2'], ['1', '2'], b'code'
+            ) for number in range(5)
+        ))
+        # The concurrent creates never collide
+        assert sorted(task_ids) == [1, 2, 3, 4, 5]
+        assert (await repository.get_topic(topic_id))['count'] == 5
+
+        version = await repository.get_task_version(topic_id, 1)
+        await repository.update_task(
+            topic_id, 1, info={'comparator': 'lines', 'language': 'c'}, outputs=['1', '3']
+        )
+        description, inputs, outputs = await repository.get_task(topic_id, 1)
+        assert (description['comparator'], description['language']) == ('lines', 'c')
+        assert (inputs, outputs) == ([b'1', b'2'], [b'1', b'3'])
+        assert await repository.get_task_version(topic_id, 1) != version
+
+        await repository.delete_task(topic_id, 2)
+        page = [task async for task in repository.iter_tasks(topic_id, offset=1, limit=3, values=False)]
+        assert [description['id'] for description, _, _ in page] == [3, 4, 5]
+        # A deleted task ID is not reused
+        assert await repository.create_task(topic_id, {'title': 'New', 'description': []}, [], [], b'') == 6
+
+        with raises(FileNotFoundError):
+            await repository.get_task(topic_id, 2)
+        with raises(IndexError):
+            await repository.get_task(topic_id + 1, 1)
+        await db.disconnect()
+
+    @mark.asyncio
+    async def test_materials_import(self, tmp_path, monkeypatch):
+        write_materials(tmp_path, [{'id': 0, 'name': 'Test', 'path': 'test', 'count': 1}])
+        for directory in ('description', 'output', 'code'):
+            (tmp_path / 'materials' / 'test' / directory).mkdir()
+        (tmp_path / 'materials' / 'test' / 'description' / 'task_1.json').write_text(
+            '{"id": 1, "topic_id": 0, "title": "Sum", "description": ["Add"], "comparator": "float"}'
+        )
+        (tmp_path / 'materials' / 'test' / 'output' / 'task_1.txt').write_text('3\n')
+        (tmp_path / 'materials' / 'test' / 'code' / 'task_1.txt').write_text('print(3)')
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(FileUtils, 'materials_cache', MaterialsCache(8))
+        db = await connect(tmp_path)
+        repository = DatabaseTaskRepository(db)
+
+        await repository.start()
+
+        assert await repository.get_topics() == [{'id': 0, 'name': 'Test', 'path': 'test', 'count': 1}]
+        assert await repository.get_task(0, 1) == (
+            {'id': 1, 'topic_id': 0, 'title': 'Sum', 'description': ['Add'], 'comparator': 'float'},
+            [b'1', b'2'], [b'3']
+        )
+        assert await repository.get_task_code(0, 1) == b'print(3)'
+
+        # The export writes the same materials layout
+        export = tmp_path / 'export'
+        export.mkdir()
+        monkeypatch.chdir(export)
+        assert await copy_tasks(repository, FileTaskRepository()) == 1
+        assert (export / 'materials' / 'test' / 'input' / 'task_1.txt').read_text() == '1\n2\n'
+        assert (export / 'materials' / 'test' / 'code' / 'task_1.txt').read_text() == 'print(3)'
+        await db.disconnect()
+
+    @mark.asyncio
+    async def test_materials_imported_once(self, tmp_path, monkeypatch):
+        write_materials(tmp_path, [{'id': 0, 'name': 'Test', 'path': 'test', 'count': 0}])
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(FileUtils, 'materials_cache', MaterialsCache(8))
+        # Every app worker has its own connection to the empty database
+        workers = [await connect(tmp_path) for _ in range(3)]
+
+        await gather(*(DatabaseTaskRepository(db).start() for db in workers))
+
+        assert len(await DatabaseTaskRepository(workers[0]).get_topics()) == 1
+        for db in workers:
+            await db.disconnect()
+
+    @mark.asyncio
+    async def test_added_columns_migrated(self, tmp_path):
+        db = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        await db.connect()
+        # The tasks table created before the language column
+        await db.execute("CREATE TABLE tasks (topic_id INTEGER, id INTEGER, title VARCHAR, PRIMARY KEY (topic_id, id))")
+
+        await create_schema(db)
+        await create_schema(db)
+
+        assert await db.fetch_all("SELECT language FROM tasks") == []
+        await db.disconnect()
@@ -0,0 +1,116 @@
+import sys
+from asyncio import gather, sleep
+from shutil import which
+from pytest import mark, raises
+from utilities.runtime_scripts import ArtifactCache, CompileResult, Runtime, RuntimeRegistry, runtime_registry
+from utilities.sandbox_scripts import ContainerSandboxBackend, ExecResult, FakeContainerBackend, SubprocessBackend
+
+# Python stands in for a compiler: the source is compiled to the bytecode file run afterwards
+BYTECODE = Runtime(
+    'bytecode', 'python:3.9-alpine', 'main.py', ('python', '-I', 'main.pyc'),
+    ('python', '-I', '-c', 'import py_compile; py_compile.compile("main.py", "main.pyc", doraise=True)'),
+    'main.pyc', toolchain=sys.version
+)
+C_SOURCE = b'#include <stdio.h>\nint main(void) { int a, b; scanf("%d %d", &a, &b); printf("%d\\n", a + b); }\n'
+
+
+class TestRuntimeRegistry:
+    def test_languages(self):
+        registry = RuntimeRegistry()
+        registry.register(BYTECODE)
+
+        assert registry.get('bytecode') is BYTECODE
+        with raises(ValueError):
+            registry.get(None)
+        assert runtime_registry.get(None).name == 'python'
+        assert runtime_registry.names() == ['python', 'c', 'cpp', 'java', 'go']
+
+    def test_artifact_key(self):
+        key = BYTECODE.artifact_key(b'print(1)')
+
+        assert key == BYTECODE.artifact_key(b'print(1)')
+        assert key != BYTECODE.artifact_key(b'print(2)')
+        # Another toolchain compiles another artifact
+        assert key != BYTECODE._replace(toolchain='3.0').artifact_key(b'print(1)')
+
+
+class TestArtifactCacheAsync:
+    @mark.asyncio
+    async def test_compiled_once(self):
+        cache = ArtifactCache(max_size=8)
+        compiled = []
+
+        async def compile(artifact: bytes, limit: str = None) -> CompileResult:
+            compiled.append(artifact)
+            await sleep(0.01)
+            return CompileResult(artifact, ExecResult(b'', b'', 0, limit))
+
+        results = await gather(*(cache.get('a', lambda: compile(b'aaaa')) for _ in range(3)))
+        assert results[0].artifact == b'aaaa' and compiled == [b'aaaa']
+        assert cache.stats() == {'hits': 0, 'misses': 1, 'coalesced': 2, 'entries': 1, 'bytes': 4}
+
+        # The least recently used artifact is evicted
+        await cache.get('b', lambda: compile(b'bbbb'))
+        await cache.get('a', lambda: compile(b'aaaa'))
+        await cache.get('c', lambda: compile(b'cccc'))
+        assert list(cache.entries) == ['a', 'c']
+        # A killed compiler is not cached
+        await cache.get('d', lambda: compile(b'', 'TIMEOUT'))
+        assert 'd' not in cache.entries
+
+
+class TestCompiledSandboxAsync:
+    @mark.asyncio
+    async def test_subprocess_compiled_once(self):
+        cache = ArtifactCache()
+        sandbox = SubprocessBackend(timeout=5, artifacts=cache)
+        code = b'print(int(input()) * 2)'
+
+        for _ in range(2):
+            async with sandbox.session(code, 'test', 1, BYTECODE) as session:
+                assert session.compile_error is None
+                results = await gather(*(session.run(stdin) for stdin in (b'1\n', b'2\n', b'3\n')))
+            assert [result.stdout for result in results] == [b'2\n', b'4\n', b'6\n']
+        # The resubmission reuses the artifact, the changed code is compiled again
+        assert (cache.misses, cache.hits) == (1, 1)
+        async with sandbox.session(code.replace(b'2', b'3'), 'test', 1, BYTECODE) as session:
+            assert (await session.run(b'1\n')).stdout == b'3\n'
+        assert cache.misses == 2
+
+        async with sandbox.session(b'print(', 'test', 1, BYTECODE) as session:
+            assert b'SyntaxError' in session.compile_error.stderr
+
+    @mark.asyncio
+    @mark.skipif(which('gcc') is None, reason='The local C compiler is not installed')
+    async def test_subprocess_c(self):
+        sandbox = SubprocessBackend(timeout=5, artifacts=ArtifactCache())
+
+        async with sandbox.session(C_SOURCE, 'test', 1, runtime_registry.get('c')) as session:
+            result = await session.run(b'2 3\n')
+
+        assert (result.stdout, result.exit_code) == (b'5\n', 0)
+        assert result.metrics.peak_rss > 0
+
+    @mark.asyncio
+    async def test_container_artifact_copied(self):
+        commands, images = [], set()
+
+        def handler(container_id, cmd, stdin):
+            commands.append(cmd[-1])
+            images.add(backend.containers[container_id])
+            return (b'binary' if cmd[0] == 'cat' else stdin), b'', 0
+
+        backend = FakeContainerBackend(handler)
+        sandbox = ContainerSandboxBackend('runtime', backend, artifacts=ArtifactCache())
+        runtime = runtime_registry.get('c')
+
+        for _ in range(2):
+            async with sandbox.session(C_SOURCE, 'test', 1, runtime) as session:
+                await session.run(b'2 3\n')
+
+        assert images == {runtime.image}
+        # The first check compiles and reads the artifact back, the second one copies it
+        assert commands == [
+            'cat > /tmp/main.c', '-lm', '/tmp/main', './main',
+            'cat > /tmp/main && chmod +x /tmp/main', './main',
+        ]
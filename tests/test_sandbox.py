@@ -0,0 +1,198 @@
+import sys
+from asyncio import sleep
+from os import environ, pathsep
+from pytest import mark, raises
+from utilities.sandbox_scripts import SandboxPool, FakeContainerBackend, SubprocessBackend, \
+    ContainerSandboxBackend, DockerContainerBackend
+from utilities.settings import Settings
+
+# Docker CLI stand-in: `run` writes its arguments to STUB_LOG and prints the container ID,
+# `exec` runs the command locally with `/tmp` moved to the STUB_ROOT directory, `rm` succeeds
+STUB_DOCKER = f"""#!{sys.executable}
+import os, sys
+args = sys.argv[1:]
+if args[0] == 'run':
+    with open(os.environ['STUB_LOG'], 'w') as log:
+        log.write('\\n'.join(args))
+    print('stub_container')
+elif args[0] == 'exec':
+    cmd = [arg.replace('/tmp', os.environ['STUB_ROOT']) for arg in args[3:]]
+    cmd = [sys.executable if arg == 'python' else arg for arg in cmd]
+    os.execvp(cmd[0], cmd)
+"""
+
+
+def stub_docker(tmp_path, monkeypatch, root) -> None:
+    (tmp_path / 'bin').mkdir()
+    docker = tmp_path / 'bin' / 'docker'
+    docker.write_text(STUB_DOCKER)
+    docker.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{tmp_path / 'bin'}{pathsep}{environ.get('PATH', '')}")
+    monkeypatch.setenv('STUB_ROOT', str(root))
+    monkeypatch.setenv('STUB_LOG', str(tmp_path / 'run.log'))
+
+
+class TestSandboxPoolAsync:
+    @mark.asyncio
+    async def test_pool_hit_after_warm(self):
+        backend = FakeContainerBackend()
+        pool = SandboxPool(backend, size=2, refill_rate=0)
+        pool.warm('runner')
+        await sleep(0)
+
+        async with pool.session('runner') as container:
+            result = await container.exec(('cat',), stdin=b'Hello')
+
+        assert result.stdout == b'Hello'
+        assert pool.stats()['hits'] == 1
+        assert pool.stats()['misses'] == 0
+        await pool.close()
+        assert not backend.containers
+
+    @mark.asyncio
+    async def test_docker_container_backend_limits(self, tmp_path, monkeypatch):
+        stub_docker(tmp_path, monkeypatch, tmp_path)
+        backend = DockerContainerBackend()
+
+        await backend.remove(await backend.start('runtime'))
+
+        args = (tmp_path / 'run.log').read_text().split('\n')
+        options = dict(zip(args, args[1:]))
+        assert options['--memory'] == options['--memory-swap'] == Settings.SANDBOX_MEMORY
+        assert options['--pids-limit'] == str(Settings.SANDBOX_PIDS_LIMIT)
+        assert options['--cpus'] == Settings.SANDBOX_CPUS
+        assert options['--network'] == 'none' and '--read-only' in args
+
+    @mark.asyncio
+    async def test_pool_miss_and_replace(self):
+        backend = FakeContainerBackend()
+        pool = SandboxPool(backend, size=1, refill_rate=0)
+
+        async with pool.session('runner') as container:
+            used_id = container.id
+        await sleep(0)
+
+        assert pool.misses == 1
+        # The used container is destroyed and a fresh one is warm
+        assert used_id not in backend.containers
+        assert len(pool.idle['runner']) == 1
+        assert pool.idle['runner'][0].id != used_id
+        await pool.close()
+
+    @mark.asyncio
+    async def test_pool_max_age(self):
+        backend = FakeContainerBackend()
+        pool = SandboxPool(backend, size=1, refill_rate=0, max_age=0)
+        pool.warm('runner')
+        await sleep(0)
+        stale_id = pool.idle['runner'][0].id
+
+        container = await pool.acquire('runner')
+        await pool.release(container)
+        await pool.close()
+
+        assert container.id != stale_id
+        assert pool.expired == 1
+        assert pool.misses == 1
+        assert not backend.containers
+
+
+class TestSandboxBackendsAsync:
+    @mark.asyncio
+    async def test_container_backend_session(self):
+        backend = FakeContainerBackend()
+        sandbox = ContainerSandboxBackend('runtime', backend)
+
+        async with sandbox.session(b'print(input())', 'test', 1) as session:
+            result = await session.run(b'Hello')
+
+        assert result.stdout == b'Hello'
+        assert backend.started == backend.removed == 1
+
+    @mark.asyncio
+    async def test_docker_container_backend_session(self, tmp_path, monkeypatch):
+        root = tmp_path / 'container'
+        root.mkdir()
+        stub_docker(tmp_path, monkeypatch, root)
+        backend = DockerContainerBackend()
+        sandbox = ContainerSandboxBackend('runtime', backend, timeout=5)
+
+        async with sandbox.session(b'print(input()[::-1])', 'test', 1) as session:
+            result = await session.run(b'olleH\n')
+
+        assert (result.stdout, result.exit_code) == (b'Hello\n', 0)
+        assert result.metrics.peak_rss > 0
+        assert (root / 'main.py').read_bytes() == b'print(input()[::-1])'
+        assert not backend.containers
+
+    @mark.asyncio
+    async def test_container_backend_upload_failed(self, tmp_path, monkeypatch):
+        # The submission file can not be written to the missing directory
+        stub_docker(tmp_path, monkeypatch, tmp_path / 'missing')
+        sandbox = ContainerSandboxBackend('runtime', DockerContainerBackend(), timeout=5)
+
+        with raises(RuntimeError):
+            async with sandbox.session(b'print(1)', 'test', 1):
+                pass
+
+    @mark.asyncio
+    async def test_subprocess_backend_run(self):
+        sandbox = SubprocessBackend(timeout=5)
+        code = b'import os\nprint(input()[::-1], \'PATH\' in os.environ)'
+
+        async with sandbox.session(code, 'test', 1) as session:
+            first = await session.run(b'olleH\n')
+            second = await session.run(b'dlroW\n')
+
+        assert first[:4] == (b'Hello False\n', b'', 0, None)
+        assert second.stdout == b'World False\n'
+
+    @mark.asyncio
+    async def test_subprocess_backend_metrics(self):
+        sandbox = SubprocessBackend(timeout=5)
+        code = b'import sys\nmemory = bytearray(32 * 1024 * 1024)\nprint(input())\nsys.stderr.write("!")'
+
+        async with sandbox.session(code, 'test', 1) as session:
+            result = await session.run(b'Hello\n')
+
+        assert (result.stdout, result.stderr, result.exit_code) == (b'Hello\n', b'!', 0)
+        assert result.metrics.output_bytes == 7
+        assert result.metrics.peak_rss > 32 * 1024 * 1024
+        assert result.metrics.cpu_user + result.metrics.cpu_system > 0
+        assert result.metrics.wall_time > 0
+
+    @mark.asyncio
+    async def test_subprocess_backend_limits(self):
+        sandbox = SubprocessBackend(timeout=0.5, memory=64 * 1024 * 1024)
+
+        async with sandbox.session(b'while True: pass', 'test', 1) as session:
+            result = await session.run(b'')
+        assert result.exit_code != 0
+        assert result.limit == 'TIMEOUT'
+
+        async with sandbox.session(b'x = bytearray(256 * 1024 * 1024)', 'test', 1) as session:
+            result = await session.run(b'')
+        assert result.exit_code != 0
+        assert b'MemoryError' in result.stderr
+
+    @mark.asyncio
+    async def test_subprocess_backend_output_limit(self):
+        sandbox = SubprocessBackend(timeout=5, output_limit=1024)
+
+        async with sandbox.session(b'while True: print("x" * 100)', 'test', 1) as session:
+            result = await session.run(b'')
+
+        assert result.limit == 'OUTPUT_LIMIT_EXCEEDED'
+        assert len(result.stdout) == 1024
+        assert result.stdout.startswith(b'x' * 100 + b'\n')
+
+    @mark.asyncio
+    async def test_container_backend_output_limit(self):
+        backend = FakeContainerBackend(lambda container_id, cmd, stdin: (b'x' * 2048, b'', 0))
+        sandbox = ContainerSandboxBackend('runtime', backend, output_limit=1024)
+
+        async with sandbox.session(b'', 'test', 1) as session:
+            result = await session.run(b'')
+
+        assert result.limit == 'OUTPUT_LIMIT_EXCEEDED'
+        assert len(result.stdout) == 1024
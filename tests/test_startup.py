@@ -0,0 +1,55 @@
+import sys
+from os.path import dirname, abspath
+from subprocess import run
+from databases import Database
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from routers import health
+from routers.health import router_health
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+
+class TestStartup:
+    def test_import_is_lazy(self, tmp_path):
+        database_path = tmp_path / 'app.db'
+        code = (
+            "import main, sys; "
+            "print(sorted(name for name in ('docker', 'python_on_whales') if name in sys.modules))"
+        )
+        result = run(
+            [sys.executable, '-c', code], cwd=ROOT, capture_output=True, timeout=60,
+            env={'PATH': '', 'AUTOGRADING_DATABASE_URL': f'sqlite:///{database_path}'}
+        )
+
+        assert result.returncode == 0, result.stderr.decode()
+        # Importing the app neither loads the Docker clients nor touches the database
+        assert result.stdout.decode().strip() == '[]'
+        assert not database_path.exists()
+
+    def test_health_probes(self, tmp_path, monkeypatch):
+        db = Database(f"sqlite:///{tmp_path / 'app.db'}")
+        monkeypatch.setattr(health, 'database', db)
+        app = FastAPI()
+        app.include_router(router_health)
+
+        @app.on_event("startup")
+        async def startup():
+            await db.connect()
+
+        @app.on_event("shutdown")
+        async def shutdown():
+            await db.disconnect()
+
+        with TestClient(app) as client:
+            assert client.get('/health/live').json() == {'status': 'ok'}
+            response = client.get('/health/ready')
+            assert response.status_code == 503
+            assert response.json()['checks'] == {'startup': 'pending', 'database': 'ok', 'sandbox': 'ok'}
+
+            app.state.started = True
+            app.state.sandbox_error = 'RuntimeError: Docker is not running'
+            response = client.get('/health/ready')
+            # The app without the sandbox still serves the reads
+            assert response.status_code == 200
+            assert response.json()['checks']['sandbox'] == 'RuntimeError: Docker is not running'
@@ -1,3 +1,4 @@
+from json import loads
 from pytest import mark
 from httpx import AsyncClient
 from main import app
@@ -13,6 +14,25 @@ class TestTopicsCRUDAsync:
         assert response.json()["topic_id"] == 0
         assert response.json()['tasks_count'] == len(response.json()["tasks"])
 
+    @mark.asyncio
+    async def test_themes_read_page(self):
+        async with AsyncClient(app=app, base_url="https://") as ac:
+            response = await ac.get("/api/topics/0", params={"limit": 1, "fields": "id,title"})
+
+        assert response.status_code == 200
+        assert len(response.json()["tasks"]) == 1
+        assert set(response.json()["tasks"][0]) == {"id", "title"}
+
+    @mark.asyncio
+    async def test_themes_read_stream(self):
+        async with AsyncClient(app=app, base_url="https://") as ac:
+            response = await ac.get("/api/topics/0", params={"stream": True, "descriptions_only": True})
+
+        tasks = [loads(line) for line in response.text.splitlines()]
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert all("input" not in task for task in tasks)
+
 
 class TestTopicsErrorsAsync:
     @mark.asyncio
@@ -22,3 +42,11 @@ class TestTopicsErrorsAsync:
 
         assert response_not_found_theme.status_code == 404
         assert response_not_found_theme.json()["detail"] == "Topic not found by ID"
+
+    @mark.asyncio
+    async def test_themes_read_unknown_fields(self):
+        async with AsyncClient(app=app, base_url="https://") as ac:
+            response = await ac.get("/api/topics/0", params={"fields": "title,secret"})
+
+        assert response.status_code == 422
+        assert response.json()["detail"] == "Unknown task fields requested"
@@ -23,13 +23,21 @@ tags_metadata = [
         "name": "users",
         "description": "User management section"
     },
+    {
+        "name": "metrics",
+        "description": "Check pipeline, cache and sandbox metrics in the Prometheus text format"
+    },
+    {
+        "name": "health",
+        "description": "Liveness and readiness probes for the process supervisor or the load balancer"
+    },
 ]
 
 app_metadata_description = """
 ### 🚀 Fast and asynchronous API for automated grading of code assignments:\n
 1. *FastAPI provides support for OpenAPI 3.0 and Swagger.*\n
 2. *Separate disposable Docker containers to inspect and grade potentially unsafe user input.*\n
-2. *Three working modes: "Python Subprocess", "Python on Whales" and "Python Docker SDK"*\n
+2. *Sandbox backends: "container", "mounted", "process", "sdk", "whale" and a Docker-free "subprocess"*\n
 3. *Fully RESTful (CRUD) API for use with a custom frontend.*\n
 4. *Authentication based on the Bearer JWT.*\n
 5. *Support for asynchronous ORM SQLAlchemy.*\n
@@ -37,4 +45,6 @@ app_metadata_description = """
 * **topics**: CRUD for the tasks topics management.
 * **checks**: validating user input by running securely in a disposable Docker container. 
 * **users**: user management system.
+* **metrics**: Prometheus metrics of the check pipeline.
+* **health**: liveness and readiness probes.
 """
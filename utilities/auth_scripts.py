@@ -1,12 +1,82 @@
+from asyncio import get_event_loop
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Optional
+from time import time
+from typing import Any, Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from schemas.auth import UserInDB, User, TokenData
-from schemas.errors import InactiveUser, NoUserEmail
+from schemas.errors import InactiveUser, NoUserEmail, AuthBusy
 from database.config import database
+from utilities.settings import Settings
+
+
+class TokenCache:
+    """
+    `TokenCache` class stores the users of the validated tokens, so a burst of requests
+    with the same token decodes it and reads the user from the database once.
+    At most `max_entries` tokens are kept, the least recently used token is evicted first.
+    A user is kept for `ttl` seconds, but never longer than its token is valid.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: 'OrderedDict[str, Tuple[float, UserInDB]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[UserInDB]:
+        """
+        `TokenCache.get` public method returns a copy of the token user, None if it is missing or expired.
+        """
+        entry = self.entries.get(token)
+        if entry is not None and entry[0] > time():
+            self.entries.move_to_end(token)
+            self.hits += 1
+            return entry[1].copy()
+        if entry is not None:
+            del self.entries[token]
+        self.misses += 1
+        return None
+
+    def set(self, token: str, user: UserInDB, expires: float) -> None:
+        """
+        `TokenCache.set` public method stores the token user until the `expires` timestamp
+        of the token or the cache TTL, whichever comes first.
+        """
+        if self.max_entries <= 0:
+            return
+        self.entries[token] = (min(expires, time() + self.ttl), user.copy())
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, email: str = None) -> None:
+        """
+        `TokenCache.invalidate` public method forgets every token of the user, or every token without `email`.
+        """
+        tokens = [
+            token for token, (_, user) in self.entries.items() if email is None or user.email == email
+        ]
+        for token in tokens:
+            del self.entries[token]
+        self.invalidations += len(tokens)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        `TokenCache.stats` public method returns the cache counters.
+        """
+        return {
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'invalidations': self.invalidations, 'size': len(self.entries)
+        }
 
 
 class AuthUtils:
@@ -15,10 +85,29 @@ class AuthUtils:
     ACCESS_TOKEN_EXPIRE_MINUTES = 30
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+    token_cache = TokenCache(Settings.AUTH_CACHE_SIZE, Settings.AUTH_CACHE_TTL)
+    # The bcrypt rounds run in a bounded thread pool, so a login storm does not block the event loop
+    hash_executor = ThreadPoolExecutor(max_workers=Settings.AUTH_HASH_THREADS, thread_name_prefix='bcrypt')
+    hash_pending = 0
+
+    @classmethod
+    async def _run_hashing(cls, func: Callable, *args) -> Any:
+        """
+        `AuthUtils._run_hashing` private class method runs a password hashing call in the hashing
+        thread pool. The calls above the pool size wait in its queue, and the calls above
+        the queue limit are rejected with the 503 error.
+        """
+        if cls.hash_pending >= Settings.AUTH_HASH_THREADS + Settings.AUTH_HASH_QUEUE:
+            raise HTTPException(status_code=503, detail=AuthBusy().error, headers={"Retry-After": "1"})
+        cls.hash_pending += 1
+        try:
+            return await get_event_loop().run_in_executor(cls.hash_executor, func, *args)
+        finally:
+            cls.hash_pending -= 1
 
     @classmethod
-    def _verify_password(cls, plain_password, hashed_password):
-        return cls.pwd_context.verify(plain_password, hashed_password)
+    async def _verify_password(cls, plain_password, hashed_password):
+        return await cls._run_hashing(cls.pwd_context.verify, plain_password, hashed_password)
 
     @staticmethod
     async def _get_user(email: str):
@@ -28,8 +117,19 @@ class AuthUtils:
             raise HTTPException(status_code=400, detail=NoUserEmail().error)
         return UserInDB(**user)
 
+    @classmethod
+    def invalidate_user(cls, email: str = None) -> None:
+        """
+        `AuthUtils.invalidate_user` public class method forgets the cached user record,
+        it must be called after the user is modified or deactivated.
+        """
+        cls.token_cache.invalidate(email)
+
     @classmethod
     async def get_current_user(cls, token: str = Depends(oauth2_scheme)):
+        user = cls.token_cache.get(token)
+        if user is not None:
+            return user
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -46,11 +146,15 @@ class AuthUtils:
         user = await cls._get_user(token_data.username)
         if user is None:
             raise credentials_exception
+        # The token is trusted until it expires, so its user can be cached until then
+        expires = payload.get("exp")
+        if expires is not None:
+            cls.token_cache.set(token, user, expires)
         return user
 
     @classmethod
-    def get_password_hash(cls, password):
-        return cls.pwd_context.hash(password)
+    async def get_password_hash(cls, password):
+        return await cls._run_hashing(cls.pwd_context.hash, password)
 
     @classmethod
     async def create_access_token(cls, data: dict, expires_delta: Optional[timedelta] = None):
@@ -68,7 +172,7 @@ class AuthUtils:
         user = await cls._get_user(email)
         if not user:
             return False
-        if not cls._verify_password(password, user.hashed_password):
+        if not await cls._verify_password(password, user.hashed_password):
             return False
         return user
 
@@ -0,0 +1,202 @@
+"""
+The `cache_scripts` module stores the content-addressed cache of the check results.
+A result is stored by the hash of the user input and the fingerprint of the task materials
+and the sandbox runtime, so a changed task never gets the old results.
+"""
+from abc import ABC, abstractmethod
+from asyncio import Future, ensure_future, shield
+from collections import OrderedDict
+from hashlib import sha256
+from time import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from databases import Database
+from schemas.checks import CheckResult
+from database.config import database
+
+
+class ResultStore(ABC):
+    """
+    `ResultStore` is the interface of the result cache tiers.
+    """
+    name: str
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CheckResult]:
+        """
+        `ResultStore.get` public method returns the stored result, None if it is missing or expired.
+        """
+
+    @abstractmethod
+    async def set(self, key: str, result: CheckResult) -> None:
+        """
+        `ResultStore.set` public method stores the result.
+        """
+
+
+class MemoryResultStore(ResultStore):
+    """
+    `MemoryResultStore` keeps at most `max_entries` results for `ttl` seconds
+    in the app process memory, the least recently used result is evicted first.
+    """
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: 'OrderedDict[str, Tuple[float, CheckResult]]' = OrderedDict()
+
+    async def get(self, key: str) -> Optional[CheckResult]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time() - entry[0] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1].copy(deep=True)
+
+    async def set(self, key: str, result: CheckResult) -> None:
+        self.entries[key] = (time(), result.copy(deep=True))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class DatabaseResultStore(ResultStore):
+    """
+    `DatabaseResultStore` keeps at most `max_entries` results for `ttl` seconds
+    in the `check_results` table of the app database,
+    so the results survive restarts and are shared between the app workers.
+    The expired and the oldest results above `max_entries` are deleted every `sweep_every` writes,
+    the table may exceed the bound until then.
+    """
+    name = 'database'
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600, db: Database = database):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db = db
+        self.sweep_every = max(max_entries // 100, 1)
+        self._written = 0
+
+    async def sweep(self) -> None:
+        """
+        `DatabaseResultStore.sweep` public method deletes the expired results and the oldest ones above the bound.
+        """
+        await self.db.execute(
+            "DELETE FROM check_results WHERE created <= :expired OR digest NOT IN "
+            "(SELECT digest FROM check_results ORDER BY created DESC LIMIT :limit)",
+            values={"expired": time() - self.ttl, "limit": self.max_entries}
+        )
+
+    async def get(self, key: str) -> Optional[CheckResult]:
+        row = await self.db.fetch_one(
+            "SELECT result FROM check_results WHERE digest = :key AND created > :expired",
+            values={"key": key, "expired": time() - self.ttl}
+        )
+        return CheckResult.parse_raw(row['result']) if row else None
+
+    async def set(self, key: str, result: CheckResult) -> None:
+        # The concurrent writes of the same result replace each other
+        await self.db.execute(
+            "INSERT INTO check_results (digest, result, created) VALUES (:key, :result, :created) "
+            "ON CONFLICT (digest) DO UPDATE SET result = excluded.result, created = excluded.created",
+            values={"key": key, "result": result.json(), "created": time()}
+        )
+        self._written += 1
+        if self._written % self.sweep_every == 0:
+            await self.sweep()
+
+
+class ResultCache:
+    """
+    `ResultCache` class looks up the check results in the `stores` tiers in order,
+    a result found in a slower tier is copied to the faster ones.
+    Attributes `hits` and `misses` count the lookups, the hits are counted by the tier names.
+    """
+
+    def __init__(self, stores: List[ResultStore]):
+        self.stores = stores
+        self.hits: Dict[str, int] = {store.name: 0 for store in stores}
+        self.misses = 0
+
+    @staticmethod
+    def key(code: bytes, fingerprint: str, fail_fast: bool = False) -> str:
+        """
+        `ResultCache.key` public static method returns the cache key of the user input
+        checked against the task materials and runtime with the `fingerprint`.
+        """
+        digest = sha256(fingerprint.encode('utf-8'))
+        digest.update(b'fail_fast' if fail_fast else b'all')
+        digest.update(code)
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[CheckResult]:
+        """
+        `ResultCache.get` public method returns the cached result, None on a miss.
+        """
+        for number, store in enumerate(self.stores):
+            result = await store.get(key)
+            if result is not None:
+                self.hits[store.name] += 1
+                for faster in self.stores[:number]:
+                    await self._set(faster, key, result)
+                return result
+        self.misses += 1
+        return None
+
+    @staticmethod
+    async def _set(store: ResultStore, key: str, result: CheckResult) -> None:
+        # The result is returned to the client even if it is not cached
+        try:
+            await store.set(key, result)
+        except Exception as e:
+            print(f"Failed to cache the check result in the {store.name} store.", e)
+
+    async def set(self, key: str, result: CheckResult) -> None:
+        """
+        `ResultCache.set` public method stores the result in every tier, a failed tier is skipped.
+        """
+        for store in self.stores:
+            await self._set(store, key, result)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        `ResultCache.stats` public method returns the cache counters.
+        """
+        return {**{f'hits_{name}': hits for name, hits in self.hits.items()}, 'misses': self.misses}
+
+
+class SingleFlight:
+    """
+    `SingleFlight` class coalesces the concurrent identical checks:
+    the checks with the same key started while one is running await its result.
+    Attribute `executions` counts the checks run, `saved` counts the checks which were not.
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[str, Future] = {}
+        self.executions = 0
+        self.saved = 0
+
+    async def run(self, key: str, check: Callable[[], Awaitable[CheckResult]]) -> CheckResult:
+        """
+        `SingleFlight.run` public method returns the result of the running check with the key,
+        or runs the `check` coroutine function. The check keeps running if the caller is cancelled,
+        the other callers still wait for it. Its exception is raised to every caller.
+        """
+        execution = self.in_flight.get(key)
+        if execution is not None:
+            self.saved += 1
+            return (await shield(execution)).copy(deep=True)
+        self.executions += 1
+        execution = ensure_future(check())
+        self.in_flight[key] = execution
+        execution.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await shield(execution)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        `SingleFlight.stats` public method returns the counters and the number of running checks.
+        """
+        return {'executions': self.executions, 'saved': self.saved, 'in_flight': len(self.in_flight)}
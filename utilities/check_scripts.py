@@ -0,0 +1,207 @@
+"""
+The `check_scripts` module stores the user's answer check pipeline,
+it is shared by the check route and the check queue workers.
+"""
+from collections import OrderedDict
+from hashlib import sha256
+from json import dumps
+from re import error as PatternError
+from time import perf_counter
+from typing import Tuple
+from schemas.checks import CheckResult
+from utilities.cache_scripts import ResultCache, MemoryResultStore, DatabaseResultStore, SingleFlight
+from utilities.comparator_scripts import ComparatorUtils
+from utilities.docker_scripts import ImageSandboxBackend, MountedSandboxBackend
+from utilities.repository_scripts import task_repository
+from utilities.grading_scripts import GradingUtils, ExpectedAnswer
+from utilities.metrics_scripts import RunStats, check_stage_seconds, checks_total, checks_in_flight
+from utilities.runtime_scripts import runtime_registry
+from utilities.sandbox_scripts import SandboxBackend, SubprocessBackend, ContainerSandboxBackend, \
+    DockerContainerBackend, SandboxPool
+from utilities.settings import Settings
+
+
+def create_sandbox_backend(name: str) -> SandboxBackend:
+    """
+    `create_sandbox_backend` function returns the configured sandbox backend by its name.
+    """
+    if name == 'container':
+        backend = DockerContainerBackend()
+        pool = SandboxPool(
+            backend, size=Settings.SANDBOX_POOL_SIZE, refill_rate=Settings.SANDBOX_POOL_REFILL_RATE,
+            max_age=Settings.SANDBOX_POOL_MAX_AGE
+        ) if Settings.SANDBOX_POOL else None
+        return ContainerSandboxBackend(
+            Settings.RUNTIME_IMAGE, backend, pool=pool,
+            timeout=Settings.CHECK_TIMEOUT, output_limit=Settings.OUTPUT_LIMIT,
+            compile_timeout=Settings.COMPILE_TIMEOUT, artifact_limit=Settings.ARTIFACT_MAX_SIZE
+        )
+    elif name == 'mounted':
+        return MountedSandboxBackend()
+    elif name in ('process', 'sdk', 'whale'):
+        return ImageSandboxBackend(name)
+    elif name == 'subprocess':
+        return SubprocessBackend(
+            cpu_time=Settings.SUBPROCESS_CPU_TIME, memory=Settings.SUBPROCESS_MEMORY,
+            file_size=Settings.SUBPROCESS_FILE_SIZE, timeout=Settings.CHECK_TIMEOUT,
+            output_limit=Settings.OUTPUT_LIMIT, workspace=Settings.SANDBOX_WORKSPACE,
+            compile_timeout=Settings.COMPILE_TIMEOUT
+        )
+    raise ValueError(
+        "You need to specify the sandbox backend: 'container', 'mounted', "
+        "'process', 'sdk', 'whale', 'subprocess'"
+    )
+
+
+def create_result_cache() -> ResultCache or None:
+    """
+    `create_result_cache` function returns the result cache configured in the settings,
+    None if it is disabled.
+    """
+    if not Settings.RESULT_CACHE:
+        return None
+    stores = [MemoryResultStore(Settings.RESULT_CACHE_SIZE, Settings.RESULT_CACHE_TTL)]
+    if Settings.RESULT_CACHE_BACKEND == 'database':
+        stores.append(DatabaseResultStore(Settings.RESULT_CACHE_DATABASE_SIZE, Settings.RESULT_CACHE_TTL))
+    return ResultCache(stores)
+
+
+class CheckUtils:
+    """
+    `CheckUtils` class stores the user's answer check pipeline.
+    Class attribute `backend` stores the sandbox backend selected in the settings.
+    Class attribute `expected_answers` stores the prepared test cases by the topic and task IDs,
+    at most `Settings.MATERIALS_CACHE_SIZE` of the recently checked tasks.
+    Class attribute `result_cache` stores the results of the checked user inputs.
+    Class attribute `in_flight` shares one check between the concurrent identical ones.
+    Class attribute `run_stats` aggregates the resources used by the sandbox runs.
+    Class attribute `sandbox_running` counts the checks using the sandbox right now,
+    both the checks of the check route and of the queue workers.
+    Class attribute `runtime` describes the sandbox, the cached results depend on it.
+    """
+    backend = create_sandbox_backend(Settings.SANDBOX_BACKEND)
+    result_cache = create_result_cache()
+    in_flight = SingleFlight()
+    run_stats = RunStats()
+    sandbox_running = 0
+    runtime = dumps([
+        Settings.SANDBOX_BACKEND, Settings.RUNTIME_IMAGE, Settings.CHECK_TIMEOUT, Settings.OUTPUT_LIMIT,
+        Settings.SUBPROCESS_CPU_TIME, Settings.SUBPROCESS_MEMORY, Settings.SUBPROCESS_FILE_SIZE
+    ])
+    expected_answers: 'OrderedDict[Tuple[int, int], ExpectedAnswer]' = OrderedDict()
+
+    @staticmethod
+    async def get_topic_name(topic_id: int) -> str:
+        """
+        `CheckUtils.get_topic_name` static method returns the topic directory name,
+        it raises IndexError if there is no such topic.
+        """
+        return (await task_repository.get_topic(topic_id)).get('path')
+
+    @classmethod
+    async def get_expected_answer(cls: 'CheckUtils', topic_id: int, task_id: int) -> ExpectedAnswer:
+        """
+        `CheckUtils.get_expected_answer` class method returns the task comparator, language and test cases.
+        They are built from the task once and rebuilt after the task version changed.
+        It raises FileNotFoundError if there is no such task, and ValueError if the task
+        description has a wrong comparator or language, or the comparator can not read the outputs.
+        """
+        key = (topic_id, task_id)
+        version = await task_repository.get_task_version(topic_id, task_id)
+        expected = cls.expected_answers.get(key)
+        if expected is not None and expected.version == version:
+            cls.expected_answers.move_to_end(key)
+            return expected
+        description, inputs, outputs = await task_repository.get_task(topic_id, task_id)
+        comparator = ComparatorUtils.create(description.get('comparator'))
+        runtime = runtime_registry.get(description.get('language'))
+        cases = GradingUtils.build_cases(inputs, outputs, paired=Settings.MULTI_CASE_GRADING)
+        fingerprint = sha256(dumps(description.get('comparator')).encode('utf-8'))
+        fingerprint.update(cls.runtime.encode('utf-8'))
+        fingerprint.update(dumps(runtime).encode('utf-8'))
+        for stdin, output in cases:
+            fingerprint.update(sha256(stdin).digest() + sha256(output).digest())
+        try:
+            prepared = GradingUtils.prepare_cases(cases, comparator)
+        except PatternError as e:
+            # The regex comparator outputs are the patterns
+            raise ValueError(f'Invalid output pattern: {e}') from e
+        expected = ExpectedAnswer(comparator, prepared, version, fingerprint.hexdigest(), runtime)
+        if Settings.MATERIALS_CACHE_SIZE > 0:
+            cls.expected_answers[key] = expected
+            cls.expected_answers.move_to_end(key)
+            while len(cls.expected_answers) > Settings.MATERIALS_CACHE_SIZE:
+                cls.expected_answers.popitem(last=False)
+        return expected
+
+    @classmethod
+    async def check_user_answer(
+            cls: 'CheckUtils', topic_id: int, task_id: int, code: bytes, fail_fast: bool = False
+    ) -> CheckResult:
+        """
+        `CheckUtils.check_user_answer` class method runs user input in the sandbox
+        and compares its output with the expected one.
+        It raises IndexError if there is no such topic, FileNotFoundError if there is no such task,
+        ValueError if the task comparator or language is invalid
+        and RuntimeError if the sandbox failed to run the user input.
+        """
+        checks_in_flight.inc()
+        try:
+            with check_stage_seconds.time(stage='topic_index'):
+                topic_name = await cls.get_topic_name(topic_id)
+            # Get the prepared test cases
+            with check_stage_seconds.time(stage='expected_output'):
+                expected = await cls.get_expected_answer(topic_id, task_id)
+            # The same user input was already checked against the same task materials
+            key = ResultCache.key(code, expected.fingerprint, fail_fast)
+            result = await cls.result_cache.get(key) if cls.result_cache is not None else None
+            if result is None:
+                # The same user input may be running right now
+                result = await cls.in_flight.run(
+                    key, lambda: cls._run_check(key, topic_name, task_id, code, expected, fail_fast)
+                )
+        except RuntimeError:
+            checks_total.inc(status='SANDBOX_FAILURE')
+            raise
+        finally:
+            checks_in_flight.dec()
+        checks_total.inc(status=result.status)
+        return result
+
+    @classmethod
+    async def _run_check(
+            cls: 'CheckUtils', key: str, topic_name: str, task_id: int, code: bytes,
+            expected: ExpectedAnswer, fail_fast: bool
+    ) -> CheckResult:
+        """
+        `CheckUtils._run_check` private class method runs the user input in the sandbox
+        and caches the result.
+        """
+        # Prepare user input once and run every test case in the same sandbox session
+        started = perf_counter()
+        cls.sandbox_running += 1
+        try:
+            async with cls.backend.session(code, topic_name, task_id, expected.runtime) as session:
+                check_stage_seconds.observe(perf_counter() - started, stage='prepare')
+                if session.compile_error is not None:
+                    # User input failed to compile, there is nothing to run
+                    result = GradingUtils.compile_error_result(expected.cases, session.compile_error)
+                    results = []
+                else:
+                    results = await GradingUtils.grade(
+                        session.run, expected.cases, expected.comparator,
+                        concurrency=Settings.GRADING_CONCURRENCY, fail_fast=fail_fast
+                    )
+                    result = GradingUtils.check_result(results)
+                started = perf_counter()
+        finally:
+            cls.sandbox_running -= 1
+        check_stage_seconds.observe(perf_counter() - started, stage='cleanup')
+        cls.run_stats.add([case.metrics for case in results if case.metrics is not None])
+        # A failed or timed out run or compilation may be caused by the sandbox load, it is not cached
+        cacheable = all(case.status not in ('ERROR', 'TIMEOUT') for case in results) and (
+            session.compile_error is None or session.compile_error.limit is None
+        )
+        if cls.result_cache is not None and cacheable:
+            await cls.result_cache.set(key, result)
+        return result
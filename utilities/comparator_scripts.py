@@ -0,0 +1,255 @@
+"""
+The `comparator_scripts` module stores the comparators of the user's output with the expected one.
+A task selects its comparator in the description JSON, e.g. `"comparator": "lines"`
+or `"comparator": {"name": "float", "abs_tol": 0.001}`.
+Every comparator prepares the expected output once and then walks the user's output lazily,
+so the comparison stops at the first mismatch.
+"""
+from abc import ABC, abstractmethod
+from itertools import zip_longest
+from math import isclose
+from re import compile as compile_regex, IGNORECASE
+from typing import Any, Dict, Iterator, Optional, Tuple, Type
+
+# Whitespace stripped around the outputs
+WHITESPACE = b' \t\n\r\x0b\x0c'
+TOKEN = compile_regex(rb'\S+')
+
+
+def iter_lines(output: bytes) -> Iterator[memoryview]:
+    """
+    `iter_lines` function yields the output lines without line breaks, the lines are not copied.
+    """
+    view = memoryview(output)
+    start = 0
+    while start < len(output):
+        end = output.find(b'\n', start)
+        if end == -1:
+            end = len(output)
+        yield view[start:end - 1] if end > start and output[end - 1] == 13 else view[start:end]
+        start = end + 1
+
+
+def iter_tokens(output: bytes) -> Iterator[bytes]:
+    """
+    `iter_tokens` function yields the whitespace-separated output tokens.
+    """
+    return (match.group() for match in TOKEN.finditer(output))
+
+
+def is_blank(line: memoryview) -> bool:
+    return not bytes(line).strip()
+
+
+class Comparator(ABC):
+    """
+    `Comparator` is the interface of the output comparators.
+    Class attribute `name` is the comparator name in the task description.
+    """
+    name: str
+
+    def __init__(self, **options):
+        if options:
+            raise TypeError(f'Unknown {self.name} comparator options: {", ".join(options)}')
+
+    @abstractmethod
+    def prepare(self, expected: bytes) -> Any:
+        """
+        `Comparator.prepare` public method returns the expected output prepared for comparing.
+        """
+
+    @abstractmethod
+    def compare(self, expected: Any, output: bytes) -> bool:
+        """
+        `Comparator.compare` public method compares the prepared expected output with the user's one.
+        """
+
+
+class ComparatorUtils:
+    """
+    `ComparatorUtils` class stores the comparators registry.
+    Class attribute `comparators` stores the comparator classes by their names.
+    """
+    comparators: Dict[str, Type[Comparator]] = {}
+    default = 'default'
+
+    @classmethod
+    def register(cls: 'ComparatorUtils', comparator: Type[Comparator]) -> Type[Comparator]:
+        """
+        `ComparatorUtils.register` public class method is a decorator adding the comparator to the registry.
+        """
+        cls.comparators[comparator.name] = comparator
+        return comparator
+
+    @classmethod
+    def create(cls: 'ComparatorUtils', spec: Optional[str or Dict[str, Any]] = None) -> Comparator:
+        """
+        `ComparatorUtils.create` public class method returns the comparator from the task description,
+        a name or a dict with the name and the options. No spec means the default comparator.
+        It raises ValueError if there is no such comparator or it has wrong options.
+        """
+        if spec is None:
+            spec = cls.default
+        options = dict(spec) if isinstance(spec, dict) else {'name': spec}
+        name = options.pop('name', cls.default)
+        try:
+            return cls.comparators[name](**options)
+        except KeyError as e:
+            raise ValueError(
+                f'No such comparator like "{name}", use one of: {", ".join(cls.comparators)}'
+            ) from e
+        except TypeError as e:
+            raise ValueError(str(e)) from e
+
+
+@ComparatorUtils.register
+class DefaultComparator(Comparator):
+    """
+    `DefaultComparator` compares the outputs with the surrounding whitespace stripped
+    and the line breaks removed.
+    """
+    name = 'default'
+
+    def prepare(self, expected: bytes) -> bytes:
+        return expected.strip(WHITESPACE).replace(b'\n', b'')
+
+    def compare(self, expected: bytes, output: bytes) -> bool:
+        start, end = 0, len(output)
+        while start < end and output[start] in WHITESPACE:
+            start += 1
+        while end > start and output[end - 1] in WHITESPACE:
+            end -= 1
+        view = memoryview(output)
+        position = 0
+        while start < end:
+            line_end = output.find(b'\n', start, end)
+            if line_end == -1:
+                line_end = end
+            chunk = view[start:line_end]
+            if chunk != expected[position:position + len(chunk)]:
+                return False
+            position += len(chunk)
+            start = line_end + 1
+        return position == len(expected)
+
+
+@ComparatorUtils.register
+class ExactComparator(Comparator):
+    """
+    `ExactComparator` compares the outputs byte by byte, ignoring only the trailing line breaks.
+    """
+    name = 'exact'
+
+    def prepare(self, expected: bytes) -> bytes:
+        return expected.rstrip(b'\r\n')
+
+    def compare(self, expected: bytes, output: bytes) -> bool:
+        end = len(output)
+        while end and output[end - 1] in b'\r\n':
+            end -= 1
+        return end == len(expected) and memoryview(output)[:end] == expected
+
+
+@ComparatorUtils.register
+class WhitespaceComparator(Comparator):
+    """
+    `WhitespaceComparator` compares the whitespace-separated tokens of the outputs.
+    """
+    name = 'whitespace'
+
+    def prepare(self, expected: bytes) -> Tuple[bytes, ...]:
+        return tuple(iter_tokens(expected))
+
+    def compare(self, expected: Tuple[bytes, ...], output: bytes) -> bool:
+        return all(
+            token == expected_token
+            for expected_token, token in zip_longest(expected, iter_tokens(output))
+        )
+
+
+@ComparatorUtils.register
+class LinesComparator(Comparator):
+    """
+    `LinesComparator` compares the outputs line by line, ignoring the trailing whitespace
+    of every line and the trailing blank lines.
+    """
+    name = 'lines'
+
+    def prepare(self, expected: bytes) -> Tuple[bytes, ...]:
+        lines = [bytes(line).rstrip() for line in iter_lines(expected)]
+        while lines and not lines[-1]:
+            lines.pop()
+        return tuple(lines)
+
+    def match(self, expected: Any, line: memoryview) -> bool:
+        return bytes(line).rstrip() == expected
+
+    def compare(self, expected: Tuple[Any, ...], output: bytes) -> bool:
+        lines = iter_lines(output)
+        for expected_line, line in zip_longest(expected, lines):
+            if line is None:
+                return False
+            if expected_line is None:
+                return is_blank(line) and all(is_blank(line) for line in lines)
+            if not self.match(expected_line, line):
+                return False
+        return True
+
+
+@ComparatorUtils.register
+class RegexComparator(LinesComparator):
+    """
+    `RegexComparator` matches every output line with the regular expression
+    on the same line of the expected output.
+    """
+    name = 'regex'
+
+    def __init__(self, ignore_case: bool = False, **options):
+        super().__init__(**options)
+        self.flags = IGNORECASE if ignore_case else 0
+
+    def prepare(self, expected: bytes) -> Tuple[Any, ...]:
+        return tuple(compile_regex(line, self.flags) for line in super().prepare(expected))
+
+    def match(self, expected: Any, line: memoryview) -> bool:
+        return expected.fullmatch(bytes(line).rstrip()) is not None
+
+
+@ComparatorUtils.register
+class FloatComparator(Comparator):
+    """
+    `FloatComparator` compares the whitespace-separated tokens of the outputs,
+    the numbers are equal within the relative or absolute tolerance.
+    """
+    name = 'float'
+
+    def __init__(self, rel_tol: float = 1e-9, abs_tol: float = 1e-6, **options):
+        super().__init__(**options)
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+
+    @staticmethod
+    def _number(token: bytes) -> Optional[float]:
+        try:
+            return float(token)
+        except ValueError:
+            return None
+
+    def prepare(self, expected: bytes) -> Tuple[Tuple[bytes, Optional[float]], ...]:
+        return tuple((token, self._number(token)) for token in iter_tokens(expected))
+
+    def compare(self, expected: Tuple[Tuple[bytes, Optional[float]], ...], output: bytes) -> bool:
+        for expected_token, token in zip_longest(expected, iter_tokens(output)):
+            if expected_token is None or token is None:
+                return False
+            expected_token, expected_number = expected_token
+            if expected_number is None:
+                if token != expected_token:
+                    return False
+                continue
+            number = self._number(token)
+            if number is None or not isclose(
+                    number, expected_number, rel_tol=self.rel_tol, abs_tol=self.abs_tol
+            ):
+                return False
+        return True
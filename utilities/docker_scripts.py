@@ -1,199 +1,659 @@
 """
-The `docker_scripts` module stores utilities for creating and maintaining disposable containers. 
+The `docker_scripts` module stores utilities for creating and maintaining disposable containers.
+The Docker SDK and Python on Whales are imported on the first use,
+so importing the app neither needs Docker nor pays for these packages.
 """
-from typing import Tuple, Optional
-from subprocess import Popen, PIPE
-from asyncio import create_subprocess_shell
-from asyncio.subprocess import PIPE
-from random import randint
-from docker import from_env
-from docker.api import build
-from docker.models.images import Image
-from docker.errors import DockerException, ContainerError, NotFound, ImageNotFound, APIError, BuildError
-from python_on_whales import docker as whale
+from io import BytesIO
+from tarfile import BLOCKSIZE, TarInfo, USTAR_FORMAT
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from asyncio import create_subprocess_exec, ensure_future, get_event_loop, sleep, CancelledError, Lock, Task
+from asyncio.subprocess import PIPE, DEVNULL
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from threading import Timer
+from time import perf_counter
+from uuid import uuid4
+from utilities.file_scripts import FileUtils
+from utilities.repository_scripts import task_repository, text_values
+from utilities.sandbox_scripts import ExecResult, ExecMetrics, SandboxBackend, SandboxSession, \
+    BoundedBuffer, run_bounded, attach_usage, LAUNCHER, TIMEOUT, OUTPUT_LIMIT_EXCEEDED
+from utilities.metrics_scripts import check_stage_seconds
+from utilities.runtime_scripts import Runtime, runtime_registry
+from utilities.settings import Settings
+
+if TYPE_CHECKING:
+    from docker import DockerClient
+    from docker.models.images import Image
+
+
+class ArtifactReaper:
+    """
+    `ArtifactReaper` removes the Docker images and containers left by the checks in batches,
+    the checks hand over their exact IDs instead of removing them one by one.
+    Every `interval` seconds the pending IDs are removed with one Docker CLI call per `batch_size` IDs,
+    and the check artifacts older than `max_age` seconds never handed over,
+    e.g. left by a killed app worker, are pruned by their label.
+    When `max_pending` IDs are waiting, the check handing over the next one removes them at once.
+    """
+    commands = {'container': ('container', 'rm', '--force'), 'image': ('image', 'rm', '--force')}
+
+    def __init__(
+            self, interval: float = 30.0, batch_size: int = 50, max_pending: int = 200, max_age: float = 600.0
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.pending: Dict[str, Set[str]] = {kind: set() for kind in self.commands}
+        self.counters = {'reclaimed_containers': 0, 'reclaimed_images': 0, 'pruned': 0, 'failures': 0}
+        self._lock: Optional[Lock] = None
+        self._task: Optional[Task] = None
+
+    def discard(self, kind: str, artifact_id: str) -> None:
+        """
+        `ArtifactReaper.discard` public method hands over the container or image for the removal,
+        it may be called from the Docker threads.
+        """
+        self.pending[kind].add(artifact_id)
+
+    async def release(self, kind: str, artifact_id: str) -> None:
+        """
+        `ArtifactReaper.release` public method hands over the container or image for the removal,
+        and removes every pending artifact if there are `max_pending` of them.
+        """
+        self.discard(kind, artifact_id)
+        if sum(len(ids) for ids in self.pending.values()) >= self.max_pending:
+            await self.collect()
+
+    @staticmethod
+    async def _docker(*args: str) -> Tuple[int, str, str]:
+        try:
+            process = await create_subprocess_exec('docker', *args, stdout=PIPE, stderr=PIPE)
+        except FileNotFoundError as e:
+            raise RuntimeError("The Docker CLI is not installed.") from e
+        stdout, stderr = await process.communicate()
+        return process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+
+    async def _remove(self, kind: str, ids: List[str]) -> None:
+        code, _, stderr = await self._docker(*self.commands[kind], *ids)
+        # The artifacts removed already are not errors
+        errors = [line for line in stderr.splitlines() if line.strip() and 'No such' not in line]
+        if code != 0 and errors:
+            raise RuntimeError(f"Failed to remove the check {kind}s: {errors[0]}")
+
+    async def _prune(self, kind: str) -> int:
+        code, stdout, stderr = await self._docker(
+            kind, 'prune', '--force', '--filter', 'label=type=check', '--filter', f'until={int(self.max_age)}s',
+            *(('--all',) if kind == 'image' else ())
+        )
+        if code != 0:
+            raise RuntimeError(f"Failed to prune the check {kind}s: {stderr.strip()}")
+        return sum(
+            1 for line in stdout.splitlines()
+            if line.strip() and not line.startswith(('Deleted ', 'Total reclaimed', 'untagged:'))
+        )
+
+    async def collect(self) -> Dict[str, int]:
+        """
+        `ArtifactReaper.collect` public method removes the pending containers and images
+        and returns the numbers removed, the artifacts failed to remove are retried on the next call.
+        """
+        if self._lock is None:
+            self._lock = Lock()
+        reclaimed = {kind: 0 for kind in self.commands}
+        async with self._lock:
+            # The containers go first, the images used by them can not be removed
+            for kind, pending in self.pending.items():
+                while pending:
+                    ids = [pending.pop() for _ in range(min(self.batch_size, len(pending)))]
+                    try:
+                        await self._remove(kind, ids)
+                    except RuntimeError as e:
+                        pending.update(ids)
+                        self.counters['failures'] += 1
+                        print(e)
+                        break
+                    reclaimed[kind] += len(ids)
+                    self.counters[f'reclaimed_{kind}s'] += len(ids)
+        return reclaimed
+
+    async def prune(self) -> int:
+        """
+        `ArtifactReaper.prune` public method removes the stopped check containers and the unused
+        check images older than `max_age` seconds, and returns the number of them.
+        """
+        pruned = 0
+        for kind in self.commands:
+            try:
+                pruned += await self._prune(kind)
+            except RuntimeError as e:
+                self.counters['failures'] += 1
+                print(e)
+        self.counters['pruned'] += pruned
+        return pruned
+
+    async def _run(self) -> None:
+        while True:
+            await sleep(self.interval)
+            reclaimed = await self.collect()
+            pruned = await self.prune()
+            if pruned or any(reclaimed.values()):
+                print(f"Reclaimed {reclaimed['container']} containers, {reclaimed['image']} images, "
+                      f"pruned {pruned} leftovers.")
+
+    def start(self) -> None:
+        """
+        `ArtifactReaper.start` public method starts the periodic removal, it is called on the app startup.
+        """
+        if self._task is None:
+            self._task = ensure_future(self._run())
+
+    async def close(self) -> None:
+        """
+        `ArtifactReaper.close` public method stops the periodic removal and removes the pending artifacts,
+        it is called on the app shutdown.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except CancelledError:
+                pass
+            self._task = None
+        await self.collect()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending_containers': len(self.pending['container']), 'pending_images': len(self.pending['image']),
+            **self.counters
+        }
 
 
 class DockerUtils:
     """
     `DockerUtils` is a collection of utilities for creating and maintaining disposable containers.
-    Class attribute `client` stores the client Docker application.
+    Class attribute `runner_images` stores the prebuilt task images with the task version,
+    `task_contexts` stores the task input build context members with the task version,
+    `check_images` stores the tags of the disposable check images in use,
+    `reaper` removes the check images and containers after use.
+    The images are built from a small in-memory tar context, never from the project directory.
+    The Docker client is created on the first use, so the app starts without Docker.
+    Class attribute `executor` is a bounded thread pool for the blocking Docker SDK calls,
+    they never run on the event loop.
     """
-    try:
-        client = from_env()
-    except DockerException as e:
-        raise DockerException("Error accessing the Docker API. Is Docker running?") from e
+    _client = None
+    runner_images: Dict[Tuple[str, int], Tuple[Any, 'Image']] = {}
+    task_contexts: Dict[Tuple[str, int], Tuple[Any, bytes]] = {}
+    check_images: Set[str] = set()
+    _runner_locks: Dict[Tuple[str, int], Lock] = {}
+    reaper = ArtifactReaper(
+        Settings.REAPER_INTERVAL, Settings.REAPER_BATCH_SIZE, Settings.REAPER_MAX_PENDING, Settings.REAPER_MAX_AGE
+    )
+    _topic_ids: Dict[str, int] = {}
+    executor = ThreadPoolExecutor(max_workers=Settings.DOCKER_THREADS, thread_name_prefix='docker')
+    # Shell command feeding the test case input from the environment to user input
+    input_command = ('sh', '-c', 'printf %s "$CHECK_INPUT" | python -u /main.py')
+
+    @classmethod
+    def get_client(cls: 'DockerUtils') -> 'DockerClient':
+        """
+        `DockerUtils.get_client` public class method returns the client Docker application.
+        """
+        if cls._client is None:
+            from docker import from_env
+            from docker.errors import DockerException
+            try:
+                cls._client = from_env()
+            except DockerException as e:
+                raise RuntimeError("Error accessing the Docker API. Is Docker running?") from e
+        return cls._client
+
+    @classmethod
+    async def _run_blocking(cls: 'DockerUtils', func: Callable, *args, **kwargs) -> Any:
+        """
+        `DockerUtils._run_blocking` private class method runs a blocking call
+        in the Docker thread pool and returns its result.
+        """
+        return await get_event_loop().run_in_executor(cls.executor, partial(func, *args, **kwargs))
+
+    @classmethod
+    def _build(cls: 'DockerUtils', **image_config) -> 'Image' or None:
+        """
+        `DockerUtils._build` private class method is a blocking image build,
+        it is run in the Docker thread pool.
+        """
+        from docker.errors import APIError, BuildError
+        try:
+            return cls.get_client().images.build(**image_config)[0]
+        except (BuildError, APIError) as e:
+            print("Failed to build the Docker image.", e)
+            return None
+
+    @staticmethod
+    def _tar_member(name: str, data: bytes) -> bytes:
+        """
+        `DockerUtils._tar_member` private static method returns a tar archive member with the file data,
+        the members are joined into a build context as they are.
+        """
+        info = TarInfo(name)
+        info.size = len(data)
+        return info.tobuf(USTAR_FORMAT, 'utf-8', 'strict') + data + b'\0' * (-len(data) % BLOCKSIZE)
+
+    @classmethod
+    def _build_context(cls: 'DockerUtils', dockerfile: str, *members: bytes) -> BytesIO:
+        """
+        `DockerUtils._build_context` private class method returns the in-memory tar build context
+        with the Dockerfile and the archive members.
+        """
+        # The archive ends with two zero blocks
+        return BytesIO(b''.join((
+            cls._tar_member('Dockerfile', dockerfile.encode('utf-8')), *members, b'\0' * (2 * BLOCKSIZE)
+        )))
+
+    @classmethod
+    async def _topic_id(cls: 'DockerUtils', topic_name: str) -> int:
+        """
+        `DockerUtils._topic_id` private class method returns the topic ID by its directory name,
+        it raises IndexError if there is no such topic.
+        """
+        if topic_name not in cls._topic_ids:
+            cls._topic_ids = {topic.get('path'): topic.get('id') for topic in await task_repository.get_topics()}
+        try:
+            return cls._topic_ids[topic_name]
+        except KeyError as e:
+            raise IndexError(f'Topic not found: {topic_name}') from e
+
+    @classmethod
+    async def get_task_context(cls: 'DockerUtils', topic_name: str, task_id: int) -> Tuple[Any, bytes]:
+        """
+        `DockerUtils.get_task_context` public class method returns the task version
+        and the build context member with the task input. The input is read from the task repository
+        once and reread after the task version changed.
+        """
+        key = (topic_name, task_id)
+        topic_id = await cls._topic_id(topic_name)
+        version = await task_repository.get_task_version(topic_id, task_id)
+        context = cls.task_contexts.get(key)
+        if context is None or context[0] != version:
+            _, inputs, _ = await task_repository.get_task(topic_id, task_id)
+            task_input = ''.join(f'{value}\n' for value in text_values(inputs)).encode('utf-8')
+            context = cls.task_contexts[key] = (version, cls._tar_member(f'task_{task_id}.txt', task_input))
+        return context
+
+    @classmethod
+    async def _runner_image_build(
+            cls: 'DockerUtils', topic_name: str, task_id: int, task_context: bytes
+    ) -> 'Image' or None:
+        """
+        `DockerUtils._runner_image_build` private class method returns a reusable
+        task image, the user input is mounted to `/submission/main.py` at run time.
+        """
+        dockerfile = f'''
+            FROM {runtime_registry.get().image}
+            COPY task_{task_id}.txt /
+            CMD cat task_{task_id}.txt | python -u /submission/main.py
+            '''
+        image_config = {
+            'fileobj': cls._build_context(dockerfile, task_context), 'custom_context': True,
+            'forcerm': True, 'network_mode': None,
+            'tag': f'runner_{topic_name.lower()}_{str(task_id)}',
+            'labels': {"type": "runner"}
+        }
+        return await cls._run_blocking(cls._build, **image_config)
 
     @classmethod
-    def _image_build(
-            cls: 'DockerUtils', topic_name: str, task_id: int, temp_name: str, id_random
-    ) -> Tuple[Image, str] or None:
+    async def get_runner_image(cls: 'DockerUtils', topic_name: str, task_id: int) -> 'Image' or None:
+        """
+        `DockerUtils.get_runner_image` public class method returns the prebuilt task image,
+        the image is built on the first call and after every task version change.
+        Concurrent calls for the same task wait for a single build.
+        """
+        key = (topic_name, task_id)
+        version, task_context = await cls.get_task_context(topic_name, task_id)
+        async with cls._runner_locks.setdefault(key, Lock()):
+            runner = cls.runner_images.get(key)
+            if runner is not None and runner[0] == version:
+                return runner[1]
+            with check_stage_seconds.time(stage='image_build'):
+                image = await cls._runner_image_build(topic_name, task_id, task_context)
+            if image is not None:
+                cls.runner_images[key] = (version, image)
+                # The previous task image is untagged by the rebuild
+                if runner is not None and runner[1].id != image.id:
+                    await cls.reaper.release('image', runner[1].id)
+        return image
+
+    @classmethod
+    async def prebuild_runner_images(cls: 'DockerUtils', topic_index: List[dict]) -> None:
+        """
+        `DockerUtils.prebuild_runner_images` public class method builds
+        the images for every task in the topic index, it is called on the app startup.
+        """
+        for topic in topic_index:
+            # The task IDs are not reused after a task is deleted, so they may have gaps
+            try:
+                task_ids = [
+                    description.get('id')
+                    async for description, _, _ in task_repository.iter_tasks(topic.get('id'), values=False)
+                ]
+            except (IndexError, FileNotFoundError):
+                # The topic or its task was deleted while it was listed
+                continue
+            for task_id in task_ids:
+                try:
+                    await cls.get_runner_image(topic.get("path"), task_id)
+                except FileNotFoundError:
+                    # The task was deleted
+                    continue
+
+    @classmethod
+    async def _image_build(
+            cls: 'DockerUtils', topic_name: str, task_id: int, code: bytes, id_random
+    ) -> 'Image' or None:
         """
         `DockerUtils._docker_image_build` private class method
-        returns an image for the check container.
+        returns an image for the check container, user input is copied to `/main.py`.
         """
-        user_input_path = f"./temp/{temp_name}"
+        _, task_context = await cls.get_task_context(topic_name, task_id)
         dockerfile = f'''
-            FROM python:3.9-alpine
-            COPY {user_input_path} ./materials/{topic_name}/input/task_{task_id}.txt /
-            CMD cat task_{task_id}.txt | python -u {temp_name}
+            FROM {runtime_registry.get().image}
+            COPY task_{task_id}.txt /
+            COPY main.py /main.py
+            CMD python -u /main.py
             '''
         image_config = {
-            'path': '.', 'dockerfile': dockerfile, 'forcerm': True, 'network_mode': None,
+            'fileobj': cls._build_context(dockerfile, task_context, cls._tar_member('main.py', code)),
+            'custom_context': True, 'forcerm': True, 'network_mode': None,
             'tag': f'{topic_name.lower()}_{str(task_id)}_{str(id_random)}',
             'labels': {"type": "check"}
         }
+        return await cls._run_blocking(cls._build, **image_config)
+
+    @staticmethod
+    def _read_bounded(chunks: Iterable[bytes], buffer: BoundedBuffer) -> bool:
+        """
+        `DockerUtils._read_bounded` private static method reads the output chunks into the buffer
+        until the output limit, it returns False if the output exceeded the limit.
+        """
         try:
-            image = cls.client.images.build(**image_config)[0]
-        except BuildError as e:
-            print("Failed to build the Docker image.", e)
-            return None
-        else:
-            return image, user_input_path
+            for chunk in chunks:
+                if not buffer.write(chunk):
+                    return False
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+        return True
+
+    @staticmethod
+    async def _container_kill(name: str) -> None:
+        """
+        `DockerUtils._container_kill` private static method kills the container by its name,
+        a container run with `--rm` is removed afterwards.
+        """
+        try:
+            process = await create_subprocess_exec('docker', 'kill', name, stdout=DEVNULL, stderr=DEVNULL)
+        except FileNotFoundError:
+            return
+        await process.wait()
+
+    @classmethod
+    async def _container_run_cli(
+            cls: 'DockerUtils', name: str, cmd: Iterable[str], stdin: bytes
+    ) -> ExecResult:
+        """
+        `DockerUtils._container_run_cli` private class method runs the container with the Docker CLI
+        and reads its bounded output, the container is killed on the output or time limit.
+        The command is run by the launcher reporting its CPU time and peak RSS.
+        """
+        try:
+            container = await create_subprocess_exec(*cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        except FileNotFoundError as e:
+            raise RuntimeError("The Docker CLI is not installed.") from e
+
+        async def kill() -> None:
+            await cls._container_kill(name)
+            container.kill()
+
+        return attach_usage(
+            await run_bounded(container, stdin, Settings.OUTPUT_LIMIT, Settings.CHECK_TIMEOUT, kill)
+        )
 
     @classmethod
     async def _container_run_sdk(
-            cls: 'DockerUtils', image: Image, topic_name: str, task_id: int, id_random: int
-    ) -> str:
+            cls: 'DockerUtils', image: 'Image', name: str, stdin: bytes
+    ) -> ExecResult:
         """
         `DockerUtils._container_run_sdk` private class method requires a Docker-image
         and returns the result of executing user input in the container.
         """
-        answer = ""
         container_config = {
-            'detach': True, 'auto_remove': True,
-            'stderr': True, 'read_only': True,
-            'device_read_iops': 0, 'device_write_iops': 0,
-            'name': f'task_{topic_name}_{task_id}_{id_random}'
+            'command': cls.input_command, 'environment': {'CHECK_INPUT': stdin.decode('utf-8')},
+            'detach': True, 'read_only': True, 'network_disabled': True,
+            'device_read_iops': 0, 'device_write_iops': 0, 'name': name, 'labels': {"type": "check"}
         }
+        container_ids = []
+
+        def run() -> ExecResult:
+            from docker.errors import ContainerError, NotFound, ImageNotFound, APIError
+            from requests.exceptions import ReadTimeout, ConnectionError as RequestsConnectionError
+            started = perf_counter()
+            try:
+                container = cls.get_client().containers.run(image, **container_config)
+            except ContainerError as e:
+                raise RuntimeError("Failed to run container:") from e
+            except ImageNotFound as e:
+                raise RuntimeError("Failed to find image:") from e
+            except NotFound as e:
+                raise RuntimeError("File not found in the container:") from e
+            except APIError as e:
+                raise RuntimeError("Unhandled Docker API error:") from e
+            container_ids.append(container.id)
+            limit = None
+            stdout, stderr = BoundedBuffer(Settings.OUTPUT_LIMIT), BoundedBuffer(Settings.OUTPUT_LIMIT)
+            try:
+                exit_code = container.wait(timeout=Settings.CHECK_TIMEOUT).get('StatusCode', 1)
+            except (ReadTimeout, RequestsConnectionError):
+                container.kill()
+                exit_code, limit = -9, TIMEOUT
+            # The logs are streamed, only the output below the limit is read
+            within_limit = cls._read_bounded(
+                container.logs(stdout=True, stderr=False, stream=True), stdout
+            ) & cls._read_bounded(container.logs(stdout=False, stderr=True, stream=True), stderr)
+            if not within_limit and limit is None:
+                limit = OUTPUT_LIMIT_EXCEEDED
+            metrics = ExecMetrics(perf_counter() - started, stdout.size + stderr.size)
+            return ExecResult(stdout.getvalue(), stderr.getvalue(), exit_code, limit, metrics)
+
         try:
-            container = cls.client.containers.run(image, **container_config)
-        except ContainerError as e:
-            raise DockerException("Failed to run container:") from e
-        except ImageNotFound as e:
-            raise DockerException("Failed to find image:") from e
-        except NotFound as e:
-            raise DockerException("File not found in the container:") from e
-        except APIError as e:
-            raise DockerException("Unhandled Docker API error:") from e
-        else:
-            for line in container.logs(stream=True):
-                answer += line.decode('utf-8').strip()
+            return await cls._run_blocking(run)
         finally:
-            return answer.strip()
+            # The stopped container is removed by the reaper
+            for container_id in container_ids:
+                await cls.reaper.release('container', container_id)
 
     @classmethod
-    async def _container_run_process(
-            cls: 'DockerUtils', image: Image, topic_name: str, task_id: int, id_random: int
-    ) -> str:
+    async def _container_run_process_async(
+            cls: 'DockerUtils', image: 'Image', name: str, stdin: bytes
+    ) -> ExecResult:
         """
-        `DockerUtils._container_run_process` private class method requires a Docker-image
+        `DockerUtils._container_run_process_async` private class method requires a Docker-image
         and returns the result of executing user input in the container.
         """
-        cmd = f'docker run --rm --read-only --name task_{topic_name.lower()}_{task_id}_{id_random} {image.id}'
-        try:
-            container = Popen(cmd, stdout=PIPE, stderr=PIPE)
-        except ContainerError as e:
-            raise DockerException("Failed to run container:") from e
-        except ImageNotFound as e:
-            raise DockerException("Failed to find image:") from e
-        except NotFound as e:
-            raise DockerException("File not found in the container:") from e
-        except APIError as e:
-            raise DockerException("Unhandled Docker API error:") from e
-        else:
-            container.wait()
-            answer = b"".join(container.stdout.readlines())
-            return answer.decode("utf-8").strip()
+        cmd = ('docker', 'run', '--rm', '--interactive', '--read-only', '--network', 'none',
+               '--label', 'type=check', '--name', name, image.id, 'python', '-c', LAUNCHER, '-u', '/main.py')
+        return await cls._container_run_cli(name, cmd, stdin)
 
     @classmethod
-    async def _container_run_process_async(
-            cls: 'DockerUtils', image: Image, topic_name: str, task_id: int, id_random: int
-    ) -> str:
+    async def _container_run_mounted_async(
+            cls: 'DockerUtils', image: 'Image', name: str, user_input_path: str, stdin: bytes
+    ) -> ExecResult:
         """
-        `DockerUtils._container_run_process_async` private class method requires a Docker-image
-        and returns the result of executing user input in the container.
+        `DockerUtils._container_run_mounted_async` private class method requires a prebuilt
+        task image, mounts the user input read-only into the container and returns the result.
         """
-        cmd = f'docker run --rm --read-only --name task_{topic_name.lower()}_{task_id}_{id_random} {image.id}'
-        try:
-            container = await create_subprocess_shell(cmd, stdout=PIPE, stderr=PIPE)
-        except ContainerError as e:
-            raise DockerException("Failed to run container:") from e
-        except ImageNotFound as e:
-            raise DockerException("Failed to find image:") from e
-        except NotFound as e:
-            raise DockerException("File not found in the container:") from e
-        except APIError as e:
-            raise DockerException("Unhandled Docker API error:") from e
-        else:
-            answer, stderr = await container.communicate()
-            return answer.decode("utf-8").strip()
+        cmd = (
+            'docker', 'run', '--rm', '--interactive', '--read-only', '--network', 'none',
+            '--label', 'type=check', '-v', f'{user_input_path}:/submission/main.py:ro',
+            '--name', name, image.id, 'python', '-c', LAUNCHER, '-u', '/submission/main.py'
+        )
+        return await cls._container_run_cli(name, cmd, stdin)
 
     @classmethod
     async def _container_run_whale(
-            cls: 'DockerUtils', image: Image, topic_name: str, task_id: int, id_random: int
-    ) -> str:
+            cls: 'DockerUtils', image: 'Image', name: str, stdin: bytes
+    ) -> ExecResult:
         """
         `DockerUtils._container_run` private class method requires a Docker-image
         and returns the result of executing user input in the container.
         """
         config = {
-            "image": image.id,
-            "name": f'task_{topic_name.lower()}_{task_id}_{id_random}',
+            "image": image.id, "command": list(cls.input_command), "name": name,
+            "envs": {'CHECK_INPUT': stdin.decode('utf-8')},
+            "remove": True, "read_only": True, "networks": ["none"], "stream": True,
+            "labels": {"type": "check"},
         }
-        try:
-            with whale.run(**config, detach=True) as container:
-                output = container.logs()
-        except ContainerError as e:
-            raise DockerException("Failed to run container:") from e
-        else:
-            whale.image.remove(image.id, force=True)
-            return output.strip()
 
-    @classmethod
-    async def docker_check_user_answer(
-            cls: 'DockerUtils', topic_name: str, task_id: int, temp_name: str
-    ) -> Optional[Tuple[str, int]]:
-        """
-        `DockerUtils._check_user_answer` class method is a public interface method,
-        returns the result of executing user input in the Docker container.
-        """
-        id_random = randint(0, 100)
-        image, user_input_path = cls._image_build(
-            topic_name, task_id, temp_name, id_random
-        )
+        def run() -> ExecResult:
+            from python_on_whales import docker as whale
+            from python_on_whales.exceptions import DockerException as WhaleException
+            limits = []
+            buffers = {
+                'stdout': BoundedBuffer(Settings.OUTPUT_LIMIT), 'stderr': BoundedBuffer(Settings.OUTPUT_LIMIT)
+            }
 
-        return (
-            await cls._container_run_process_async(image, topic_name, task_id, id_random), id_random
-        ) if image else None
-        # return (await cls._container_run_process(image, topic_name, task_id, id_random), id_random) if image else None
-        # return (await cls._container_run_sdk(image, topic_name, task_id, id_random), id_random) if image else None
-        # return (await cls._container_run_whale(image, topic_name, task_id, id_random), id_random) if image else None
+            def kill(limit: str) -> None:
+                limits.append(limit)
+                try:
+                    whale.kill(name)
+                except WhaleException:
+                    pass
 
-    @classmethod
-    async def image_remove(
-            cls: 'DockerUtils', topic_name: str, task_id: int, mode: str
-    ) -> None:
-        async def sdk():
-            tag = f"{topic_name.lower()}_{str(task_id)}"
-            return cls.client.images.remove(tag, force=True)
-
-        async def process():
-            Popen(f'docker image prune -a --force --filter "label=type=check"')
-
-        modes = {
-            'sdk': sdk, 'process': process, 'whale': None
+            started = perf_counter()
+            timer = Timer(Settings.CHECK_TIMEOUT, kill, args=(TIMEOUT,))
+            timer.start()
+            exit_code = 0
+            try:
+                for source, chunk in whale.run(**config):
+                    if not buffers[source].write(chunk):
+                        kill(OUTPUT_LIMIT_EXCEEDED)
+                        break
+            except WhaleException as e:
+                exit_code = e.return_code
+            finally:
+                timer.cancel()
+            metrics = ExecMetrics(
+                perf_counter() - started, buffers['stdout'].size + buffers['stderr'].size
+            )
+            return ExecResult(
+                buffers['stdout'].getvalue(), buffers['stderr'].getvalue(),
+                -9 if limits else exit_code, limits[0] if limits else None, metrics
+            )
+
+        return await cls._run_blocking(run)
+
+
+def python_only(backend: str, runtime: Optional[Runtime]) -> None:
+    """
+    `python_only` function raises RuntimeError if the task language is not Python,
+    the task images of the Docker backends run Python only.
+    """
+    if runtime is not None and runtime.name != runtime_registry.default:
+        raise RuntimeError(f"The {backend} sandbox runs Python tasks only, use the container sandbox.")
+
+
+class ImageSandboxBackend(SandboxBackend):
+    """
+    `ImageSandboxBackend` builds a disposable image with user input for every check
+    and runs every test case in a new container from it.
+    The container is run with the Docker CLI (`process` mode),
+    the Python Docker SDK (`sdk` mode) or Python on Whales (`whale` mode).
+    """
+
+    def __init__(self, mode: str = 'process'):
+        runners = {
+            'process': DockerUtils._container_run_process_async,
+            'sdk': DockerUtils._container_run_sdk,
+            'whale': DockerUtils._container_run_whale,
         }
         try:
-            await modes[mode]()
-        except TypeError:
-            pass
+            self.run = runners[mode]
         except KeyError as e:
-            raise ValueError("You need to specify the mode: 'whale', 'sdk', 'processing'") from e
+            raise ValueError("You need to specify the mode: 'whale', 'sdk', 'process'") from e
+        self.name = mode
 
-    @staticmethod
-    def fix_docker_bug() -> None:
-        """
-        `DockerUtils.fix_docker_bug` staticmethod making it possible
-        to dynamically define dockerfiles with the BytesIO.
-        """
-        build.process_dockerfile = lambda file, path: ('Dockerfile', file)
+    async def start(self) -> None:
+        DockerUtils.reaper.start()
+
+    async def close(self) -> None:
+        await DockerUtils.reaper.close()
+
+    @asynccontextmanager
+    async def session(
+            self, code: bytes, topic_name: str, task_id: int, runtime: Runtime = None
+    ) -> AsyncIterator[SandboxSession]:
+        python_only(self.name, runtime)
+        id_random = uuid4().hex[:12]
+        tag = f'{topic_name.lower()}_{task_id}_{id_random}'
+        with check_stage_seconds.time(stage='image_build'):
+            image = await DockerUtils._image_build(topic_name, task_id, code, id_random)
+        if image is None:
+            raise RuntimeError("Failed to build the Docker image.")
+        DockerUtils.check_images.add(tag)
+        try:
+            yield SandboxSession(lambda stdin: self.run(
+                image, f'task_{topic_name.lower()}_{task_id}_{uuid4().hex[:12]}', stdin
+            ))
+        finally:
+            DockerUtils.check_images.discard(tag)
+            # The image is removed by the reaper with the images of other checks
+            await DockerUtils.reaper.release('image', image.id)
+
+    def stats(self) -> Dict[str, int]:
+        return {'images': len(DockerUtils.check_images)}
+
+
+class MountedSandboxBackend(SandboxBackend):
+    """
+    `MountedSandboxBackend` runs the prebuilt task images, they are built in the background
+    after the app startup or on the first check, and after the task change.
+    User input is bind-mounted into them read-only from a file in the sandbox workspace.
+    """
+    name = 'mounted'
+
+    def __init__(self):
+        self._prebuild: Optional[Task] = None
+
+    async def _prebuild_images(self) -> None:
+        try:
+            await DockerUtils.prebuild_runner_images(await task_repository.get_topics())
+        except (RuntimeError, OSError) as e:
+            print("Failed to prebuild the task images.", e)
+
+    async def start(self) -> None:
+        DockerUtils.reaper.start()
+        # The images are built in the background, a check of a task not built yet builds its image
+        self._prebuild = ensure_future(self._prebuild_images())
+
+    async def close(self) -> None:
+        if self._prebuild is not None:
+            self._prebuild.cancel()
+        await DockerUtils.reaper.close()
+
+    @asynccontextmanager
+    async def session(
+            self, code: bytes, topic_name: str, task_id: int, runtime: Runtime = None
+    ) -> AsyncIterator[SandboxSession]:
+        python_only(self.name, runtime)
+        with check_stage_seconds.time(stage='temp_file'):
+            user_input_path = await FileUtils.get_user_answer_temp(code=code)
+        try:
+            image = await DockerUtils.get_runner_image(topic_name, task_id)
+            if image is None:
+                raise RuntimeError("Failed to build the Docker image.")
+            yield SandboxSession(lambda stdin: DockerUtils._container_run_mounted_async(
+                image, f'task_{topic_name.lower()}_{task_id}_{uuid4().hex[:12]}', user_input_path, stdin
+            ))
+        finally:
+            await FileUtils.remove_user_answer_file(user_input_path)
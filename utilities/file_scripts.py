@@ -2,16 +2,116 @@
 `file_scripts` module stores tasks I/O utilities.
 """
 import aiofiles
-from aiofiles.os import remove, mkdir
+from aiofiles.os import remove, makedirs
+from asyncio import Semaphore, gather, get_event_loop, sleep
+from collections import OrderedDict
+from copy import deepcopy
+from functools import partial
+from os import scandir, stat, unlink
+from shutil import rmtree
+from time import time
 from os.path import abspath, join, normpath, isfile
 from json import loads, dumps
-from typing import List, Iterable
+from itertools import islice
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Iterable, Callable, Tuple
+from utilities.settings import Settings
+
+
+class MaterialsCache:
+    """
+    `MaterialsCache` class stores the parsed materials files in memory by their paths.
+    At most `max_entries` files are kept, the least recently used file is evicted first.
+    Every cached file is checked by its modification time and size on access,
+    so the files edited out of the app are read again.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[str, Tuple[Tuple[int, int], Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def stamp(path: str) -> Tuple[int, int]:
+        """
+        `MaterialsCache.stamp` public static method returns the file version,
+        it raises FileNotFoundError if there is no such file.
+        """
+        file_stat = stat(path)
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    async def load(
+            self, path: str, loader: Callable[[str], Awaitable[Any]], copy: bool = True
+    ) -> Any:
+        """
+        `MaterialsCache.load` public method returns a copy of the file content,
+        the file is read with `loader` if it is not cached or was changed.
+        Without `copy` the cached content itself is returned, it must not be changed.
+        """
+        stamp = self.stamp(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return deepcopy(entry[1]) if copy else entry[1]
+        self.misses += 1
+        content = await loader(path)
+        if self.max_entries > 0:
+            self.entries[path] = (stamp, content)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return deepcopy(content) if copy else content
+
+    def invalidate(self, path: str = None) -> None:
+        """
+        `MaterialsCache.invalidate` public method forgets the file, or every file without `path`.
+        """
+        if path is None:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+        elif self.entries.pop(path, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        `MaterialsCache.stats` public method returns the cache counters.
+        """
+        return {
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'invalidations': self.invalidations, 'size': len(self.entries)
+        }
 
 
 class FileUtils:
     """
     `FileUtils` class stores utilities for saving user input files and file paths.
+    Class attribute `change_listeners` stores callbacks notified about every
+    written or removed task file, they are called with the file title and path.
+    Class attribute `materials_cache` stores the parsed topic index and task files.
     """
+    change_listeners: List[Callable[[str, str], None]] = []
+    materials_cache = MaterialsCache(Settings.MATERIALS_CACHE_SIZE)
+
+    @classmethod
+    def add_change_listener(cls: 'FileUtils', listener: Callable[[str, str], None]) -> None:
+        """
+        `FileUtils.add_change_listener` public class method subscribes a callback
+        to the task files changes, e.g. to invalidate the data built from them.
+        """
+        if listener not in cls.change_listeners:
+            cls.change_listeners.append(listener)
+
+    @classmethod
+    def _notify_change(cls: 'FileUtils', title: str, path: str) -> None:
+        """
+        `FileUtils._notify_change` private class method calls every change listener.
+        """
+        for listener in cls.change_listeners:
+            listener(title, path)
 
     @classmethod
     async def _get_filepath(
@@ -26,7 +126,10 @@ class FileUtils:
         """
         topic_path = None
         if topic_id is not None:
-            topic_index = await cls.open_file('topic_index')
+            # The index is only read here, the cached one is not copied
+            topic_index = await cls.materials_cache.load(
+                await cls._get_filepath('topic_index'), cls._read_file, copy=False
+            )
             topic_path = topic_index[topic_id].get("path")
 
         filesystem = {
@@ -59,14 +162,41 @@ class FileUtils:
     async def _write_user_answer_temp(code: bytes) -> str:
         """
         `FileUtils._write_user_answer_temp` private static method
-        returns the user input's temp file name.
+        returns the path to the user input's temp file in the sandbox workspace.
         It takes one parameter: code, type: bytes.
         """
         async with aiofiles.tempfile.NamedTemporaryFile(
-                'wb', delete=False, dir='./temp/'
+                'wb', delete=False, dir=Settings.SANDBOX_WORKSPACE, prefix='check_'
         ) as f:
             await f.write(code)
-            return f.name.split('temp')[1]
+            return normpath(abspath(f.name))
+
+    @staticmethod
+    async def _read_file(path: str) -> dict or bytes:
+        """
+        `FileUtils._read_file` private static method returns the parsed JSON file or the text file bytes.
+        """
+        async with aiofiles.open(path, encoding='utf-8', mode='r') as f:
+            content = await f.read()
+            content = content.encode('utf-8')
+            if '.json' in f.name:
+                return loads(content)
+            elif '.txt' in f.name:
+                return content
+            else:
+                raise ValueError('Wrong file extension.')
+
+    @staticmethod
+    async def _read_file_values(path: str) -> List[bytes]:
+        """
+        `FileUtils._read_file_values` private static method returns the text file values.
+        """
+        async with aiofiles.open(path, encoding='utf-8', mode='r') as f:
+            if f.name.endswith('.txt'):
+                content = await f.read()
+                return content.encode('utf-8').split(b'\n')
+            else:
+                raise ValueError('Wrong file extension.')
 
     @classmethod
     async def open_file(
@@ -83,15 +213,7 @@ class FileUtils:
         """
         path = await cls._get_filepath(title, topic_id, task_id)
         try:
-            async with aiofiles.open(path, encoding='utf-8', mode='r') as f:
-                content = await f.read()
-                content = content.encode('utf-8')
-                if '.json' in f.name:
-                    return loads(content)
-                elif '.txt' in f.name:
-                    return content
-                else:
-                    raise ValueError('Wrong file extension.')
+            return await cls.materials_cache.load(path, cls._read_file)
         except FileNotFoundError as e:
             raise FileNotFoundError(
                 f'File not found: title={title}, topic_id={topic_id}, task_id={task_id}'
@@ -111,12 +233,74 @@ class FileUtils:
         3. `task_id` means an id of the task in a topic and a part of the file name.
         """
         path = await cls._get_filepath(title, topic_id, task_id)
-        async with aiofiles.open(path, encoding='utf-8', mode='r') as f:
-            if f.name.endswith('.txt'):
-                content = await f.read()
-                return content.encode('utf-8').split(b'\n')
-            else:
-                raise ValueError('Wrong file extension.')
+        return await cls.materials_cache.load(path, cls._read_file_values)
+
+    @classmethod
+    async def get_file_stamps(
+            cls: 'FileUtils', titles: Iterable[str], topic_id: int = None, task_id: int = None
+    ) -> Dict[str, Tuple[int, int]]:
+        """
+        `FileUtils.get_file_stamps` public class method returns the versions of the files
+        by their paths, the data built from the files is outdated when they change.
+        It raises FileNotFoundError if there is no such file.
+        """
+        paths = [await cls._get_filepath(title, topic_id, task_id) for title in titles]
+        return {path: MaterialsCache.stamp(path) for path in paths}
+
+    @classmethod
+    async def open_task_files(
+            cls: 'FileUtils', topic_id: int, task_id: int, values: bool = True
+    ) -> Tuple[dict, List[bytes] or None, List[bytes] or None]:
+        """
+        `FileUtils.open_task_files` public class method reads the task description,
+        input and output values at once.
+        Without `values` only the description is read, the values are None.
+        """
+        if not values:
+            return await cls.open_file('task_info', topic_id, task_id), None, None
+        return tuple(await gather(
+            cls.open_file('task_info', topic_id, task_id),
+            cls.open_file_values('task_input', topic_id, task_id),
+            cls.open_file_values('task_output', topic_id, task_id),
+        ))
+
+    @classmethod
+    async def open_topic_files(
+            cls: 'FileUtils', topic_id: int, tasks_count: int, values: bool = True,
+            concurrency: int = Settings.MATERIALS_CONCURRENCY
+    ) -> List[Tuple[dict, List[bytes] or None, List[bytes] or None]]:
+        """
+        `FileUtils.open_topic_files` public class method reads the files of every topic task
+        with `FileUtils.open_task_files`, at most `concurrency` tasks are read at once.
+        The files are returned in the task ID order.
+        """
+        semaphore = Semaphore(max(concurrency, 1))
+
+        async def open_task(task_id: int):
+            async with semaphore:
+                return await cls.open_task_files(topic_id, task_id, values)
+
+        return list(await gather(*(open_task(task_id) for task_id in range(1, tasks_count + 1))))
+
+    @classmethod
+    async def iter_topic_files(
+            cls: 'FileUtils', topic_id: int, task_ids: Iterable[int], values: bool = True,
+            concurrency: int = Settings.MATERIALS_CONCURRENCY
+    ) -> AsyncIterator[Tuple[dict, List[bytes] or None, List[bytes] or None]]:
+        """
+        `FileUtils.iter_topic_files` public class method yields the files of the given tasks
+        in order, reading the next `concurrency` tasks at once.
+        Only the tasks being read and yielded are held in memory.
+        """
+        task_ids = iter(task_ids)
+        while True:
+            batch = list(islice(task_ids, max(concurrency, 1)))
+            if not batch:
+                break
+            for task_files in await gather(
+                    *(cls.open_task_files(topic_id, task_id, values) for task_id in batch)
+            ):
+                yield task_files
 
     @classmethod
     async def save_file(
@@ -141,6 +325,7 @@ class FileUtils:
             else:
                 raise ValueError('Wrong file extension.')
             await f.write(content)
+        cls._notify_change(title, path)
 
     @classmethod
     async def save_file_values(
@@ -163,6 +348,7 @@ class FileUtils:
             else:
                 for value in content:
                     await f.writelines(f'{value}\n')
+        cls._notify_change(title, path)
 
     @classmethod
     async def remove_file(
@@ -181,27 +367,80 @@ class FileUtils:
             await remove(path)
         except OSError as e:
             raise FileNotFoundError(f'File path can not be removed: {path}') from e
+        cls._notify_change(title, path)
 
     @classmethod
     async def get_user_answer_temp(
             cls: 'FileUtils', code: bytes,
     ) -> str:
         """
-        `FileUtils.save_user_input` public class method saves user input on a disk.
-        It returns the name of a file uploaded by the user, and a random number.
+        `FileUtils.get_user_answer_temp` public class method saves user input in the sandbox workspace
+        for the sandboxes running a file. It returns the path to the file.
         It takes one parameter (excluding cls): code, type: bytes.
         """
         try:
             return await cls._write_user_answer_temp(code)
         except FileNotFoundError:
             try:
-                await mkdir("./temp")
+                await makedirs(Settings.SANDBOX_WORKSPACE, exist_ok=True)
             except Exception as e:
                 raise FileNotFoundError("Something went wrong until the input saving") from e
             else:
                 return await cls._write_user_answer_temp(code)
 
     @staticmethod
-    async def remove_user_answer_file(temp_name: str) -> None:
-        user_input_path = f"./temp/{temp_name}"
-        await remove(user_input_path) if isfile(user_input_path) else None
+    async def remove_user_answer_file(path: str) -> None:
+        await remove(path) if isfile(path) else None
+
+    @staticmethod
+    def _reap_workspace(workspace: str, max_age: float) -> int:
+        """
+        `FileUtils._reap_workspace` private static method is a blocking workspace cleanup,
+        it is run in a thread.
+        """
+        reaped = 0
+        deadline = time() - max_age
+        try:
+            entries = list(scandir(workspace))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if not entry.name.startswith('check_') or entry.stat(follow_symlinks=False).st_mtime > deadline:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    rmtree(entry.path)
+                else:
+                    unlink(entry.path)
+            except OSError:
+                # Removed by its check meanwhile
+                continue
+            reaped += 1
+        return reaped
+
+    @classmethod
+    async def reap_user_answer_files(
+            cls: 'FileUtils', workspace: str = None, max_age: float = None
+    ) -> int:
+        """
+        `FileUtils.reap_user_answer_files` public class method removes the orphaned user input files
+        and directories older than `max_age` seconds from the sandbox workspace,
+        e.g. left by a killed app worker. It returns the number of the entries removed.
+        """
+        return await get_event_loop().run_in_executor(None, partial(
+            cls._reap_workspace, workspace or Settings.SANDBOX_WORKSPACE,
+            Settings.WORKSPACE_MAX_AGE if max_age is None else max_age
+        ))
+
+    @classmethod
+    async def run_workspace_reaper(cls: 'FileUtils', interval: float = None) -> None:
+        """
+        `FileUtils.run_workspace_reaper` public class method reaps the sandbox workspace
+        every `interval` seconds until it is cancelled, it is started on the app startup.
+        """
+        while True:
+            await cls.reap_user_answer_files()
+            await sleep(Settings.WORKSPACE_REAP_INTERVAL if interval is None else interval)
+
+
+FileUtils.add_change_listener(lambda title, path: FileUtils.materials_cache.invalidate(path))
@@ -0,0 +1,184 @@
+"""
+The `grading_scripts` module stores utilities for grading user input against the task test cases.
+"""
+from asyncio import Event, Semaphore, gather
+from time import perf_counter
+from typing import Any, Awaitable, Callable, List, NamedTuple, Tuple
+from schemas.checks import CaseResult, CheckResult, RunMetrics
+from utilities.comparator_scripts import Comparator
+from utilities.metrics_scripts import check_stage_seconds
+from utilities.runtime_scripts import Runtime
+from utilities.sandbox_scripts import ExecResult, TIMEOUT, OUTPUT_LIMIT_EXCEEDED
+
+# A test case is a pair of the stdin and the expected stdout
+GradingCase = Tuple[bytes, bytes]
+# Check status of user input failed to compile
+COMPILATION_ERROR = 'COMPILATION_ERROR'
+
+
+class PreparedCase(NamedTuple):
+    """
+    `PreparedCase` is a test case with the expected stdout prepared by the comparator
+    and the expected answer as it is displayed to the user.
+    """
+    stdin: bytes
+    expected: Any
+    answer: str
+
+
+class ExpectedAnswer(NamedTuple):
+    """
+    `ExpectedAnswer` is the task artifact built once from the task: the task comparator,
+    the prepared test cases, the version of the task it was built from,
+    the fingerprint of its content and the runtime of the task language.
+    """
+    comparator: Comparator
+    cases: List[PreparedCase]
+    version: Any
+    fingerprint: str
+    runtime: Runtime = None
+
+
+class GradingUtils:
+    """
+    `GradingUtils` is a collection of utilities for running
+    the task test cases concurrently in one sandbox session.
+    """
+
+    @staticmethod
+    def normalize_answer(answer: bytes or str) -> str:
+        """
+        `GradingUtils.normalize_answer` static method returns
+        the program output as it is compared with the expected one.
+        """
+        if isinstance(answer, bytes):
+            answer = answer.decode('utf-8', errors='replace')
+        return answer.strip().replace('\n', '')
+
+    @staticmethod
+    def build_cases(
+            inputs: List[bytes], outputs: List[bytes], paired: bool = True
+    ) -> List[GradingCase]:
+        """
+        `GradingUtils.build_cases` static method pairs the task input and output values.
+        Every value is a separate test case if `paired` is set and there are as many inputs
+        as outputs, otherwise the whole input is a single case expecting the whole output.
+        """
+        inputs, outputs = list(inputs), list(outputs)
+        # Values are saved with a trailing newline, it is not a separate value
+        if inputs and inputs[-1] == b'':
+            inputs.pop()
+        if outputs and outputs[-1] == b'':
+            outputs.pop()
+        if paired and inputs and len(inputs) == len(outputs):
+            return [(value + b'\n', expected) for value, expected in zip(inputs, outputs)]
+        return [(b'\n'.join(inputs) + b'\n' if inputs else b'', b'\n'.join(outputs))]
+
+    @classmethod
+    def prepare_cases(
+            cls: 'GradingUtils', cases: List[GradingCase], comparator: Comparator
+    ) -> List[PreparedCase]:
+        """
+        `GradingUtils.prepare_cases` class method prepares the expected stdout of every test case,
+        it is done once per task and not on every check.
+        """
+        return [
+            PreparedCase(stdin, comparator.prepare(expected), cls.normalize_answer(expected))
+            for stdin, expected in cases
+        ]
+
+    @classmethod
+    async def grade(
+            cls: 'GradingUtils', run: Callable[[bytes], Awaitable[ExecResult]],
+            cases: List[PreparedCase], comparator: Comparator,
+            concurrency: int = 4, fail_fast: bool = False
+    ) -> List[CaseResult]:
+        """
+        `GradingUtils.grade` class method runs every test case with the `run` callback,
+        which executes the user input with the given stdin in an already prepared sandbox,
+        and compares its stdout with the `comparator`.
+        At most `concurrency` cases run at once. If `fail_fast` is set,
+        the cases not started before the first failure are skipped.
+        """
+        semaphore = Semaphore(concurrency)
+        failed = Event()
+
+        async def grade_case(number: int, case: PreparedCase) -> CaseResult:
+            async with semaphore:
+                if fail_fast and failed.is_set():
+                    return CaseResult(case=number, status='SKIPPED', answer=case.answer,
+                                      your_result='', time=0.0)
+                started = perf_counter()
+                result = await run(case.stdin)
+                elapsed = perf_counter() - started
+            check_stage_seconds.observe(elapsed, stage='run')
+            with check_stage_seconds.time(stage='compare'):
+                correct = result.limit is None and comparator.compare(case.expected, result.stdout)
+            if correct:
+                status = 'OK'
+            else:
+                status = result.limit or ('ERROR' if result.exit_code else 'WRONG')
+                failed.set()
+            metrics = RunMetrics(**result.metrics._asdict()) if result.metrics is not None else None
+            return CaseResult(case=number, status=status, answer=case.answer,
+                              your_result=cls.normalize_answer(result.stdout), time=round(elapsed, 6),
+                              metrics=metrics)
+
+        return list(await gather(*(
+            grade_case(number, case) for number, case in enumerate(cases, start=1)
+        )))
+
+    @staticmethod
+    def total_metrics(metrics: List[RunMetrics]) -> RunMetrics or None:
+        """
+        `GradingUtils.total_metrics` static method sums up the test case metrics,
+        the peak memory is the largest one. CPU time and peak memory are omitted
+        if any test case misses them.
+        """
+        if not metrics:
+            return None
+
+        def total(values: list, aggregate=sum):
+            return None if any(value is None for value in values) else aggregate(values)
+
+        return RunMetrics(
+            wall_time=sum(item.wall_time for item in metrics),
+            cpu_user=total([item.cpu_user for item in metrics]),
+            cpu_system=total([item.cpu_system for item in metrics]),
+            peak_rss=total([item.peak_rss for item in metrics], max),
+            output_bytes=sum(item.output_bytes for item in metrics),
+        )
+
+    @staticmethod
+    def compile_error_result(cases: List[PreparedCase], compile_error: ExecResult) -> CheckResult:
+        """
+        `GradingUtils.compile_error_result` static method returns the result of user input
+        failed to compile, the compiler messages are the user's result and no test case is passed.
+        """
+        message = compile_error.stderr or compile_error.stdout
+        return CheckResult(
+            status=COMPILATION_ERROR if compile_error.limit is None else compile_error.limit,
+            answer='\n'.join(case.answer for case in cases),
+            your_result=message.decode('utf-8', errors='replace').strip(),
+            passed=0, total=len(cases), cases=None
+        )
+
+    @classmethod
+    def check_result(cls: 'GradingUtils', cases: List[CaseResult]) -> CheckResult:
+        """
+        `GradingUtils.check_result` class method summarizes the test case results.
+        The check status is the limit of the first case killed by a limit, if there is one.
+        """
+        passed = sum(case.status == 'OK' for case in cases)
+        limits = [case.status for case in cases if case.status in (TIMEOUT, OUTPUT_LIMIT_EXCEEDED)]
+        if passed == len(cases):
+            status = 'OK'
+        else:
+            status = limits[0] if limits else 'WRONG'
+        return CheckResult(
+            status=status,
+            answer='\n'.join(case.answer for case in cases),
+            your_result='\n'.join(case.your_result for case in cases),
+            passed=passed, total=len(cases), cases=cases,
+            metrics=cls.total_metrics([case.metrics for case in cases if case.metrics is not None])
+        )
@@ -0,0 +1,262 @@
+"""
+The `limit_scripts` module stores the per-user rate limiter, the sandbox capacity limit
+and the upload size limit.
+Every user has a token bucket per scope, e.g. the check submissions and the reads:
+a bucket holds at most `capacity` requests and is refilled at the limit rate.
+The buckets are stored in the app process memory or in a SQLite file shared by the app workers.
+"""
+from abc import ABC, abstractmethod
+from asyncio import Lock
+from collections import OrderedDict
+from time import time
+from typing import Dict, NamedTuple, Optional, Tuple
+import aiosqlite
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.security import OAuth2PasswordBearer
+from schemas.auth import User
+from schemas.errors import SandboxBusy, SubmissionTooLarge
+from utilities.auth_scripts import AuthUtils, get_current_active_user
+from utilities.metrics_scripts import checks_total
+from utilities.settings import Settings
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Limit(NamedTuple):
+    """
+    `Limit` is a token bucket size and its refill rate in requests per second.
+    """
+    capacity: float
+    rate: float
+    description: str
+
+    @classmethod
+    def parse(cls, limit: str) -> 'Limit':
+        """
+        `Limit.parse` public class method returns the limit from its text, e.g. "2/minute".
+        """
+        try:
+            count, period = (part.strip() for part in limit.split('/'))
+            return cls(float(count), float(count) / PERIODS[period], f'{int(count)} per 1 {period}')
+        except (KeyError, ValueError) as e:
+            raise ValueError(f'Wrong rate limit "{limit}", use e.g. "2/minute"') from e
+
+
+class RateLimited(Exception):
+    """
+    `RateLimited` is raised when the user's bucket is empty,
+    `retry_after` is the number of seconds until the next request is allowed.
+    """
+
+    def __init__(self, scope: str, limit: Limit, retry_after: float):
+        super().__init__(f'Rate limit exceeded: {limit.description}')
+        self.scope = scope
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def refill(state: Optional[Tuple[float, float]], limit: Limit, now: float) -> Tuple[float, float]:
+    """
+    `refill` function takes a request from the bucket `state` of the tokens left and the update time.
+    It returns the new tokens left and the seconds to wait, zero if the request is allowed.
+    """
+    tokens, updated = state if state is not None else (limit.capacity, now)
+    tokens = min(limit.capacity, tokens + max(now - updated, 0) * limit.rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / limit.rate
+
+
+class BucketStore(ABC):
+    """
+    `BucketStore` is the interface of the token bucket storages.
+    """
+    name: str
+
+    @abstractmethod
+    async def take(self, key: str, limit: Limit) -> float:
+        """
+        `BucketStore.take` public method takes a request from the bucket with the key
+        and returns the seconds to wait, zero if the request is allowed.
+        """
+
+    async def close(self) -> None:
+        """
+        `BucketStore.close` public method releases the storage, it is called on the app shutdown.
+        """
+
+
+class MemoryBucketStore(BucketStore):
+    """
+    `MemoryBucketStore` keeps at most `max_entries` buckets in the app process memory,
+    so every app worker enforces the limits on its own.
+    """
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+    async def take(self, key: str, limit: Limit) -> float:
+        tokens, retry_after = refill(self.buckets.get(key), limit, time())
+        self.buckets[key] = (tokens, time())
+        self.buckets.move_to_end(key)
+        # The evicted bucket is full again after its period anyway
+        while len(self.buckets) > self.max_entries:
+            self.buckets.popitem(last=False)
+        return retry_after
+
+
+class SQLiteBucketStore(BucketStore):
+    """
+    `SQLiteBucketStore` keeps the buckets in the SQLite file at `path`, so the app workers
+    on the same host share them. The file may be on a tmpfs, e.g. `/dev/shm`.
+    Every request takes the bucket in an immediate transaction, the concurrent workers wait for it.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._connection: Optional[aiosqlite.Connection] = None
+        self._lock: Optional[Lock] = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        if self._connection is None:
+            connection = await aiosqlite.connect(self.path, timeout=self.timeout, isolation_level=None)
+            await connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            self._connection = connection
+        return self._connection
+
+    async def take(self, key: str, limit: Limit) -> float:
+        # The lock is created in the running event loop, one connection runs one transaction at a time
+        if self._lock is None:
+            self._lock = Lock()
+        async with self._lock:
+            connection = await self._connect()
+            await connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = await connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,))
+                state = await cursor.fetchone()
+                now = time()
+                tokens, retry_after = refill(tuple(state) if state else None, limit, now)
+                await connection.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now)
+                )
+            except Exception:
+                await connection.execute("ROLLBACK")
+                raise
+            await connection.execute("COMMIT")
+        return retry_after
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+class RateLimiter:
+    """
+    `RateLimiter` class takes the requests from the users' buckets in the `store`,
+    `limits` stores the limit of every scope.
+    """
+
+    def __init__(self, store: BucketStore, limits: Dict[str, Limit]):
+        self.store = store
+        self.limits = limits
+
+    async def hit(self, scope: str, key: str) -> None:
+        """
+        `RateLimiter.hit` public method counts the request of the user with the key in the scope,
+        it raises RateLimited if the user's bucket is empty.
+        """
+        limit = self.limits[scope]
+        retry_after = await self.store.take(f'{scope}:{key}', limit)
+        if retry_after > 0:
+            raise RateLimited(scope, limit, retry_after)
+
+
+def create_rate_limiter() -> RateLimiter:
+    """
+    `create_rate_limiter` function returns the rate limiter configured in the settings.
+    """
+    if Settings.RATE_LIMIT_BACKEND == 'sqlite':
+        store = SQLiteBucketStore(Settings.RATE_LIMIT_SQLITE_PATH)
+    elif Settings.RATE_LIMIT_BACKEND == 'memory':
+        store = MemoryBucketStore()
+    else:
+        raise ValueError("You need to specify the rate limit backend: 'memory', 'sqlite'")
+    return RateLimiter(store, {
+        'check': Limit.parse(Settings.CHECK_RATE_LIMIT), 'read': Limit.parse(Settings.READ_RATE_LIMIT)
+    })
+
+
+rate_limiter = create_rate_limiter()
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+
+# FastAPI Dependencies
+async def limit_checks(current_user: User = Depends(get_current_active_user)) -> User:
+    await rate_limiter.hit('check', f'user:{current_user.id}')
+    return current_user
+
+
+async def limit_reads(request: Request, token: Optional[str] = Depends(optional_oauth2_scheme)) -> None:
+    # The reads are public, the anonymous users are limited by their address
+    key = f'address:{request.client.host if request.client else None}'
+    if token is not None:
+        try:
+            key = f'user:{(await AuthUtils.get_current_user(token)).id}'
+        except HTTPException:
+            pass
+    await rate_limiter.hit('read', key)
+
+
+def limit_sandbox(running: int) -> None:
+    """
+    `limit_sandbox` function sheds the check before the sandbox is saturated,
+    it raises the 503 error if `running` checks already use the whole sandbox capacity.
+    """
+    if running >= Settings.SANDBOX_CAPACITY:
+        checks_total.inc(status='SANDBOX_BUSY')
+        raise HTTPException(
+            status_code=503, detail=SandboxBusy().error,
+            headers={"Retry-After": str(max(int(Settings.CHECK_TIMEOUT), 1))}
+        )
+
+
+class UploadSizeLimit:
+    """
+    `UploadSizeLimit` is an ASGI middleware limiting the request bodies of the paths
+    starting with `prefix` to `max_size` bytes. The body is counted while it is received,
+    so an oversized upload is rejected with the 413 error before it is buffered.
+    """
+
+    def __init__(self, app, max_size: int, prefix: str):
+        self.app = app
+        self.max_size = max_size
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http' or not scope['path'].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        # The declared size is rejected without reading the body
+        length = dict(scope['headers']).get(b'content-length', b'')
+        if length.isdigit() and int(length) > self.max_size:
+            response = JSONResponse({"detail": SubmissionTooLarge().error}, status_code=413)
+            return await response(scope, receive, send)
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail=SubmissionTooLarge().error)
+            return message
+
+        await self.app(scope, receive_limited, send)
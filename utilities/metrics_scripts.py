@@ -0,0 +1,240 @@
+"""
+The `metrics_scripts` module stores the server-side statistics of the sandbox runs
+and a lightweight in-process metrics registry rendered in the Prometheus text format.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+from schemas.checks import RunMetrics
+
+# Label values of a sample and the sample value
+Sample = Tuple[Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """
+    `Metric` is a base of the registry metrics, its values are stored by the label values.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        if not self.labels:
+            self.values[()] = 0
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f'Metric {self.name} needs the labels: {", ".join(self.labels)}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """
+        `Metric.samples` public method yields the sample names, labels and values.
+        """
+        for key, value in self.values.items():
+            yield self.name, dict(zip(self.labels, key)), value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(
+            f'{name}{_format_labels(labels)} {value}' for name, labels, value in self.samples()
+        )
+        return lines
+
+
+class Counter(Metric):
+    """
+    `Counter` is a metric which only goes up, e.g. the number of checks by status.
+    """
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    `Gauge` is a metric which goes up and down, e.g. the number of checks in flight.
+    """
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    `Histogram` counts the observed values, e.g. durations, in the cumulative `buckets`.
+    """
+    kind = 'histogram'
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(
+            self, name: str, documentation: str, labels: Sequence[str] = (),
+            buckets: Sequence[float] = default_buckets
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[Tuple[str, ...], List[int]] = {}
+        self.sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[key] = self.sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        `Histogram.time` public method is a context manager observing the duration of its block.
+        """
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for key, counts in self.counts.items():
+            labels = dict(zip(self.labels, key))
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                total += count
+                yield f'{self.name}_bucket', {**labels, 'le': '+Inf' if bound == float('inf') else str(bound)}, total
+            yield f'{self.name}_sum', labels, self.sums[key]
+            yield f'{self.name}_count', labels, total
+
+
+class CallbackGauge(Metric):
+    """
+    `CallbackGauge` is a gauge read from the `callback` on every scrape,
+    the callback returns the samples, e.g. the counters of a cache.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], List[Sample]]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for labels, value in self.callback():
+            yield self.name, labels, value
+
+
+class MetricsRegistry:
+    """
+    `MetricsRegistry` class stores the app metrics and renders them in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        `MetricsRegistry.register` public method adds the metric, the metric names are unique.
+        """
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+            self, name: str, documentation: str, labels: Sequence[str] = (),
+            buckets: Sequence[float] = Histogram.default_buckets
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def callback(self, name: str, documentation: str, callback: Callable[[], List[Sample]]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, callback))
+
+    def render(self) -> str:
+        """
+        `MetricsRegistry.render` public method returns every metric in the Prometheus text format.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class RunStats:
+    """
+    `RunStats` class aggregates the metrics of every test case run in the sandbox:
+    the number of runs, the total wall-clock and CPU seconds and output bytes,
+    and the largest wall-clock time and peak memory.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.wall_time = 0.0
+        self.cpu_user = 0.0
+        self.cpu_system = 0.0
+        self.output_bytes = 0
+        self.max_wall_time = 0.0
+        self.max_peak_rss = 0
+
+    def add(self, metrics: List[RunMetrics]) -> None:
+        """
+        `RunStats.add` public method counts the metrics of the check test cases.
+        """
+        for item in metrics:
+            self.runs += 1
+            self.wall_time += item.wall_time
+            self.cpu_user += item.cpu_user or 0.0
+            self.cpu_system += item.cpu_system or 0.0
+            self.output_bytes += item.output_bytes
+            self.max_wall_time = max(self.max_wall_time, item.wall_time)
+            self.max_peak_rss = max(self.max_peak_rss, item.peak_rss or 0)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        `RunStats.stats` public method returns the aggregated metrics and the averages per run.
+        """
+        runs = self.runs or 1
+        return {
+            'runs': self.runs, 'wall_time': self.wall_time, 'cpu_user': self.cpu_user,
+            'cpu_system': self.cpu_system, 'output_bytes': self.output_bytes,
+            'max_wall_time': self.max_wall_time, 'max_peak_rss': self.max_peak_rss,
+            'avg_wall_time': self.wall_time / runs, 'avg_cpu_time': (self.cpu_user + self.cpu_system) / runs,
+        }
+
+
+# The app metrics registry
+registry = MetricsRegistry()
+check_stage_seconds = registry.histogram(
+    'autograding_check_stage_seconds', 'Duration of the check pipeline stages.', ('stage',)
+)
+checks_total = registry.counter('autograding_checks_total', 'Checks by their result status.', ('status',))
+checks_in_flight = registry.gauge('autograding_checks_in_flight', 'Checks being run right now.')
+http_request_seconds = registry.histogram(
+    'autograding_http_request_seconds', 'HTTP request latency by router.', ('router', 'method', 'code')
+)
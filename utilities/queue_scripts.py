@@ -0,0 +1,335 @@
+"""
+The `queue_scripts` module stores the asynchronous check job queue and its workers.
+"""
+from abc import ABC, abstractmethod
+from asyncio import CancelledError, Event, Queue, QueueFull, ensure_future, gather, sleep, wait_for, Task, \
+    TimeoutError
+from collections import OrderedDict
+from time import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+from databases import Database
+from schemas.checks import CheckResult, CheckJob
+from database.config import database
+from database.models import check_jobs
+
+
+class CheckQueueFull(Exception):
+    """
+    `CheckQueueFull` is raised when the queue depth limit is reached.
+    """
+
+
+class Job:
+    """
+    `Job` class stores a queued check: the user input, its status and result.
+    Status is one of `queued`, `running`, `done` and `failed`.
+    """
+
+    def __init__(
+            self, topic_id: int, task_id: int, code: bytes, owner: str,
+            fail_fast: bool = False, job_id: str = None, status: str = 'queued',
+            result: CheckResult = None, error: str = None, created: float = None
+    ):
+        self.id = job_id or uuid4().hex
+        self.topic_id = topic_id
+        self.task_id = task_id
+        self.code = code
+        self.owner = owner
+        self.fail_fast = fail_fast
+        self.status = status
+        self.result = result
+        self.error = error
+        self.created = created or time()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_schema(self) -> CheckJob:
+        return CheckJob(
+            job_id=self.id, status=self.status, topic_id=self.topic_id,
+            task_id=self.task_id, result=self.result, error=self.error
+        )
+
+
+class JobQueueBackend(ABC):
+    """
+    `JobQueueBackend` is an interface for storing the check jobs.
+    A finished job keeps its result only, the user input is dropped.
+    """
+
+    async def start(self) -> None:
+        """
+        `JobQueueBackend.start` prepares the storage, it is called on the app startup.
+        """
+
+    @abstractmethod
+    async def put(self, job: Job) -> None:
+        """
+        `JobQueueBackend.put` enqueues the job, it raises `CheckQueueFull` if the queue is full.
+        """
+
+    @abstractmethod
+    async def get(self) -> Job:
+        """
+        `JobQueueBackend.get` waits for the next queued job and marks it as running.
+        """
+
+    @abstractmethod
+    async def save(self, job: Job) -> None:
+        """
+        `JobQueueBackend.save` stores the job status and result.
+        """
+
+    @abstractmethod
+    async def load(self, job_id: str) -> Optional[Job]:
+        """
+        `JobQueueBackend.load` returns the job by ID.
+        """
+
+    @abstractmethod
+    async def depth(self) -> int:
+        """
+        `JobQueueBackend.depth` returns the number of queued jobs.
+        """
+
+
+class MemoryJobQueue(JobQueueBackend):
+    """
+    `MemoryJobQueue` is an in-process asyncio queue backend.
+    It keeps at most `max_jobs` finished jobs for polling, the oldest are forgotten first.
+    """
+
+    def __init__(self, max_depth: int = 100, max_jobs: int = 10000):
+        self.max_depth = max_depth
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, Job] = OrderedDict()
+        self._queue = None
+
+    @property
+    def queue(self) -> Queue:
+        # The queue is created lazily to bind it to the running event loop
+        if self._queue is None:
+            self._queue = Queue(maxsize=self.max_depth)
+        return self._queue
+
+    async def put(self, job: Job) -> None:
+        try:
+            self.queue.put_nowait(job.id)
+        except QueueFull as e:
+            raise CheckQueueFull("The check queue is full.") from e
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            oldest = next(iter(self.jobs))
+            if not self.jobs[oldest].finished:
+                break
+            del self.jobs[oldest]
+
+    async def get(self) -> Job:
+        while True:
+            job = self.jobs.get(await self.queue.get())
+            if job is not None:
+                job.status = 'running'
+                return job
+
+    async def save(self, job: Job) -> None:
+        if job.finished:
+            job.code = None
+        self.jobs[job.id] = job
+
+    async def load(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def depth(self) -> int:
+        return self.queue.qsize()
+
+
+class DatabaseJobQueue(JobQueueBackend):
+    """
+    `DatabaseJobQueue` is a persistent backend storing the jobs in the `check_jobs` table
+    of the app database, so the jobs survive restarts and are shared between the app workers.
+    Idle workers poll the table every `poll_interval` seconds.
+    At most `max_jobs` finished jobs are kept for polling, the oldest are deleted first.
+    The jobs running for `stale_after` seconds on the app startup were left by a killed app worker,
+    they are failed, so their clients stop polling.
+    """
+
+    def __init__(
+            self, max_depth: int = 100, poll_interval: float = 0.5, max_jobs: int = 10000,
+            stale_after: float = 600.0, db: Database = database
+    ):
+        self.max_depth = max_depth
+        self.poll_interval = poll_interval
+        self.max_jobs = max_jobs
+        self.stale_after = stale_after
+        self.db = db
+        # The finished jobs are deleted every `sweep_every` finished jobs
+        self.sweep_every = max(max_jobs // 100, 1)
+        self._finished = 0
+
+    async def start(self) -> None:
+        await self.db.execute(
+            "UPDATE check_jobs SET status = 'failed', error = :error, code = NULL "
+            "WHERE status = 'running' AND (started IS NULL OR started < :stale)",
+            values={"error": "The check was interrupted, please submit it again.", "stale": time() - self.stale_after}
+        )
+        await self.sweep()
+
+    async def sweep(self) -> None:
+        """
+        `DatabaseJobQueue.sweep` public method deletes the finished jobs above `max_jobs`.
+        """
+        await self.db.execute(
+            "DELETE FROM check_jobs WHERE status IN ('done', 'failed') AND id NOT IN ("
+            "SELECT id FROM check_jobs WHERE status IN ('done', 'failed') ORDER BY created DESC LIMIT :max_jobs)",
+            values={"max_jobs": self.max_jobs}
+        )
+
+    @staticmethod
+    def _from_row(row) -> Job:
+        row = dict(row)
+        return Job(
+            job_id=row['id'], topic_id=row['topic_id'], task_id=row['task_id'],
+            code=row['code'], owner=row['owner'], fail_fast=row['fail_fast'],
+            status=row['status'], error=row['error'], created=row['created'],
+            result=CheckResult.parse_raw(row['result']) if row['result'] else None
+        )
+
+    async def put(self, job: Job) -> None:
+        if await self.depth() >= self.max_depth:
+            raise CheckQueueFull("The check queue is full.")
+        await self.db.execute(check_jobs.insert().values(
+            id=job.id, topic_id=job.topic_id, task_id=job.task_id, code=job.code,
+            owner=job.owner, fail_fast=job.fail_fast, status=job.status, created=job.created
+        ))
+
+    async def get(self) -> Job:
+        query = "SELECT id FROM check_jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+        claim = "UPDATE check_jobs SET status = 'running', worker = :worker, started = :started " \
+                "WHERE id = :id AND status = 'queued'"
+        while True:
+            row = await self.db.fetch_one(query)
+            if row is not None:
+                # Claim the job, another app worker may have taken it already
+                worker = uuid4().hex
+                await self.db.execute(claim, values={"id": row['id'], "worker": worker, "started": time()})
+                claimed = await self.db.fetch_one(
+                    "SELECT * FROM check_jobs WHERE id = :id AND worker = :worker",
+                    values={"id": row['id'], "worker": worker}
+                )
+                if claimed is not None:
+                    return self._from_row(claimed)
+            else:
+                await sleep(self.poll_interval)
+
+    async def save(self, job: Job) -> None:
+        values = {'status': job.status, 'error': job.error, 'result': job.result.json() if job.result else None}
+        if job.finished:
+            job.code = values['code'] = None
+        await self.db.execute(check_jobs.update().where(check_jobs.c.id == job.id).values(**values))
+        if job.finished:
+            self._finished += 1
+            if self._finished % self.sweep_every == 0:
+                await self.sweep()
+
+    async def load(self, job_id: str) -> Optional[Job]:
+        row = await self.db.fetch_one(
+            "SELECT * FROM check_jobs WHERE id = :id", values={"id": job_id}
+        )
+        return self._from_row(row) if row else None
+
+    async def depth(self) -> int:
+        return await self.db.fetch_val("SELECT COUNT(*) FROM check_jobs WHERE status = 'queued'")
+
+
+class CheckQueue:
+    """
+    `CheckQueue` class drains the job queue backend with a pool of `workers`,
+    every job is processed with the `handler` coroutine returning the check result.
+    The handler exceptions are translated to the job error with `describe_error`.
+    """
+
+    def __init__(
+            self, backend: JobQueueBackend, handler: Callable[[Job], Awaitable[CheckResult]],
+            workers: int = 4, poll_interval: float = 0.5,
+            describe_error: Callable[[Exception], str] = str
+    ):
+        self.backend = backend
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.describe_error = describe_error
+        self._tasks: List[Task] = []
+        self._finished: Dict[str, Event] = {}
+
+    async def _process(self, job: Job) -> None:
+        try:
+            await self.backend.save(job)
+            try:
+                job.result = await self.handler(job)
+                job.status = 'done'
+            except CancelledError:
+                raise
+            except Exception as e:
+                job.error = self.describe_error(e)
+                job.status = 'failed'
+            await self.backend.save(job)
+        finally:
+            finished = self._finished.pop(job.id, None)
+            if finished is not None:
+                finished.set()
+
+    async def _work(self) -> None:
+        while True:
+            # A failed backend call is retried after `poll_interval` seconds, the worker keeps running
+            try:
+                await self._process(await self.backend.get())
+            except CancelledError:
+                raise
+            except Exception as e:
+                print("Failed to process the check job.", e)
+                await sleep(self.poll_interval)
+
+    def start(self) -> None:
+        """
+        `CheckQueue.start` public method starts the workers, it is called on the app startup.
+        """
+        if not self._tasks:
+            self._tasks = [ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """
+        `CheckQueue.stop` public method cancels the workers, it is called on the app shutdown.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job: Job) -> Job:
+        """
+        `CheckQueue.submit` public method enqueues the job,
+        it raises `CheckQueueFull` if the queue depth limit is reached.
+        """
+        await self.backend.put(job)
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """
+        `CheckQueue.wait` public method returns the job after it is finished
+        or after `timeout` seconds, whatever comes first.
+        Jobs processed by another app worker are polled every `poll_interval` seconds.
+        """
+        job = await self.backend.load(job_id)
+        deadline = time() + timeout
+        while job is not None and not job.finished and time() < deadline:
+            finished = self._finished.setdefault(job_id, Event())
+            try:
+                await wait_for(finished.wait(), min(self.poll_interval, max(deadline - time(), 0)))
+            except TimeoutError:
+                pass
+            job = await self.backend.load(job_id)
+        if job is not None and job.finished:
+            self._finished.pop(job_id, None)
+        return job
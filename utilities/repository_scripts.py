@@ -0,0 +1,556 @@
+"""
+The `repository_scripts` module stores the task repositories, the storages of the topics and tasks.
+`FileTaskRepository` keeps them in the `materials` directory,
+`DatabaseTaskRepository` keeps them in the indexed tables of the app database,
+the `materials` directory layout is its import and export format:
+`python -m utilities.repository_scripts import` copies `./materials` to the app database,
+`python -m utilities.repository_scripts export` copies the app database to an empty `./materials`.
+Every repository raises IndexError if there is no such topic
+and FileNotFoundError if there is no such task.
+"""
+from abc import ABC, abstractmethod
+from asyncio import Lock, run, sleep
+from itertools import zip_longest
+from json import dumps, loads
+from os import listdir, makedirs
+from os.path import isfile, join
+from re import fullmatch
+from sys import argv
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from databases import Database
+from database.config import database, create_schema
+from database.models import topics, tasks, test_cases
+from utilities.file_scripts import FileUtils
+from utilities.settings import Settings
+
+# The task description, input and output values, the values are None if they were not read
+TaskFiles = Tuple[dict, Optional[List[bytes]], Optional[List[bytes]]]
+
+
+class TaskRepository(ABC):
+    """
+    `TaskRepository` is the interface of the topics and tasks storages.
+    A task is its description with the `id`, `topic_id`, `title`, `description`
+    and optional `comparator` and `language` keys, its input and output values and its solution code.
+    """
+    name: str
+
+    async def start(self) -> None:
+        """
+        `TaskRepository.start` public method prepares the storage, it is called on the app startup.
+        """
+
+    @abstractmethod
+    async def get_topics(self) -> List[dict]:
+        """
+        `TaskRepository.get_topics` public method returns the topic index,
+        the topics with their `id`, `name`, `path` and tasks `count`.
+        """
+
+    @abstractmethod
+    async def get_topic(self, topic_id: int) -> dict:
+        """
+        `TaskRepository.get_topic` public method returns the topic from the topic index.
+        """
+
+    @abstractmethod
+    async def create_topic(self, name: str, path: str) -> int:
+        """
+        `TaskRepository.create_topic` public method adds an empty topic and returns its ID.
+        """
+
+    @abstractmethod
+    async def get_task(self, topic_id: int, task_id: int, values: bool = True) -> TaskFiles:
+        """
+        `TaskRepository.get_task` public method returns the task description, input and output values.
+        Without `values` only the description is read.
+        """
+
+    @abstractmethod
+    def iter_tasks(
+            self, topic_id: int, offset: int = 0, limit: Optional[int] = None, values: bool = True
+    ) -> AsyncIterator[TaskFiles]:
+        """
+        `TaskRepository.iter_tasks` public method yields a page of the topic tasks in the ID order,
+        `limit` tasks after the first `offset` ones. Only a few tasks are held in memory at once.
+        """
+
+    @abstractmethod
+    async def get_task_code(self, topic_id: int, task_id: int) -> bytes:
+        """
+        `TaskRepository.get_task_code` public method returns the task solution code.
+        """
+
+    @abstractmethod
+    async def get_task_version(self, topic_id: int, task_id: int) -> Any:
+        """
+        `TaskRepository.get_task_version` public method returns the task version,
+        the data built from the task is outdated when the version changes.
+        """
+
+    @abstractmethod
+    async def create_task(
+            self, topic_id: int, info: dict, inputs: Iterable[str], outputs: Iterable[str], code: bytes
+    ) -> int:
+        """
+        `TaskRepository.create_task` public method adds the task with the next free ID and returns the ID,
+        the concurrent calls never get the same ID. `info` is the task description without the IDs.
+        """
+
+    @abstractmethod
+    async def update_task(
+            self, topic_id: int, task_id: int, info: Optional[dict] = None,
+            inputs: Optional[Iterable[str]] = None, outputs: Optional[Iterable[str]] = None,
+            code: Optional[bytes] = None
+    ) -> None:
+        """
+        `TaskRepository.update_task` public method replaces the given parts of the task,
+        the `info` keys replace the same task description keys.
+        """
+
+    @abstractmethod
+    async def delete_task(self, topic_id: int, task_id: int) -> None:
+        """
+        `TaskRepository.delete_task` public method removes the task.
+        """
+
+
+class FileTaskRepository(TaskRepository):
+    """
+    `FileTaskRepository` keeps the topic index in `materials/topics.json` and the tasks
+    in the `materials/<topic>/{description,input,output,code}/task_<ID>.*` files.
+    The topic `next_id` is the ID of the next task, the IDs of the deleted tasks are not reused.
+    The task IDs are allocated under a lock, so they are unique only within one app worker.
+    """
+    name = 'files'
+    task_files = ('task_info', 'task_input', 'task_output')
+
+    def __init__(self):
+        self._lock: Optional[Lock] = None
+
+    @property
+    def lock(self) -> Lock:
+        # The lock is created in the running event loop
+        if self._lock is None:
+            self._lock = Lock()
+        return self._lock
+
+    @staticmethod
+    async def _read_index() -> List[dict]:
+        try:
+            return await FileUtils.open_file('topic_index')
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _index_topic(topic_index: List[dict], topic_id: int) -> dict:
+        if not 0 <= topic_id < len(topic_index):
+            raise IndexError(f'Topic not found: topic_id={topic_id}')
+        return topic_index[topic_id]
+
+    @staticmethod
+    def _task_ids(topic: dict) -> List[int]:
+        # The IDs of the existing tasks are the names of their description files
+        try:
+            names = listdir(join('materials', topic.get('path'), 'description'))
+        except FileNotFoundError:
+            return []
+        matches = (fullmatch(r'task_(\d+)\.json', name) for name in names)
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    async def get_topics(self) -> List[dict]:
+        # The topic ID is its position in the index
+        return [{**topic, 'id': topic_id} for topic_id, topic in enumerate(await self._read_index())]
+
+    async def get_topic(self, topic_id: int) -> dict:
+        return self._index_topic(await self._read_index(), topic_id)
+
+    async def create_topic(self, name: str, path: str) -> int:
+        async with self.lock:
+            topic_index = await self._read_index()
+            for directory in ('description', 'input', 'output', 'code'):
+                makedirs(join('materials', path, directory), exist_ok=True)
+            topic_index.append({'id': len(topic_index), 'name': name, 'path': path, 'count': 0, 'next_id': 1})
+            await FileUtils.save_file('topic_index', content=topic_index)
+        return len(topic_index) - 1
+
+    async def get_task(self, topic_id: int, task_id: int, values: bool = True) -> TaskFiles:
+        return await FileUtils.open_task_files(topic_id, task_id, values)
+
+    async def iter_tasks(
+            self, topic_id: int, offset: int = 0, limit: Optional[int] = None, values: bool = True
+    ) -> AsyncIterator[TaskFiles]:
+        task_ids = self._task_ids(await self.get_topic(topic_id))
+        page = task_ids[offset:] if limit is None else task_ids[offset:offset + limit]
+        async for task_files in FileUtils.iter_topic_files(topic_id, page, values):
+            yield task_files
+
+    async def get_task_code(self, topic_id: int, task_id: int) -> bytes:
+        return await FileUtils.open_file('task_code', topic_id, task_id)
+
+    async def get_task_version(self, topic_id: int, task_id: int) -> Dict[str, Tuple[int, int]]:
+        return await FileUtils.get_file_stamps(self.task_files, topic_id, task_id)
+
+    async def create_task(
+            self, topic_id: int, info: dict, inputs: Iterable[str], outputs: Iterable[str], code: bytes
+    ) -> int:
+        async with self.lock:
+            topic_index = await self._read_index()
+            topic = self._index_topic(topic_index, topic_id)
+            # The indexes written before `next_id` continue after the last existing task
+            task_id = topic.get('next_id') or max(self._task_ids(topic), default=0) + 1
+            saving_config = {'topic_id': topic_id, 'task_id': task_id}
+            await FileUtils.save_file(
+                'task_info', content={'id': task_id, 'topic_id': topic_id, **info}, **saving_config
+            )
+            await FileUtils.save_file_values('task_input', content=inputs, **saving_config)
+            await FileUtils.save_file_values('task_output', content=outputs, **saving_config)
+            await FileUtils.save_file('task_code', content=code, **saving_config)
+            # Update the topic tasks count and the next task ID
+            topic['count'] = topic.get('count', 0) + 1
+            topic['next_id'] = task_id + 1
+            await FileUtils.save_file('topic_index', content=topic_index)
+        return task_id
+
+    async def update_task(
+            self, topic_id: int, task_id: int, info: Optional[dict] = None,
+            inputs: Optional[Iterable[str]] = None, outputs: Optional[Iterable[str]] = None,
+            code: Optional[bytes] = None
+    ) -> None:
+        saving_config = {'topic_id': topic_id, 'task_id': task_id}
+        # Only the existing task is updated
+        description = await FileUtils.open_file('task_info', **saving_config)
+        if info:
+            await FileUtils.save_file('task_info', content={**description, **info}, **saving_config)
+        if inputs is not None:
+            await FileUtils.save_file_values('task_input', content=inputs, **saving_config)
+        if outputs is not None:
+            await FileUtils.save_file_values('task_output', content=outputs, **saving_config)
+        if code is not None:
+            await FileUtils.save_file('task_code', content=code, **saving_config)
+
+    async def delete_task(self, topic_id: int, task_id: int) -> None:
+        async with self.lock:
+            for title in ('task_info', 'task_input', 'task_output', 'task_code'):
+                await FileUtils.remove_file(title, topic_id=topic_id, task_id=task_id)
+            topic_index = await self._read_index()
+            # Update the topic tasks count
+            topic_index[topic_id]['count'] -= 1
+            await FileUtils.save_file('topic_index', content=topic_index)
+
+
+class DatabaseTaskRepository(TaskRepository):
+    """
+    `DatabaseTaskRepository` keeps the topics, tasks and test cases in the `topics`, `tasks`
+    and `test_cases` tables, a test case row is a pair of the task input and output values.
+    The task ID is allocated from the topic row in the task insert transaction,
+    so the IDs are unique across the app workers and never reused.
+    The pages of tasks are read `batch_size` tasks at a time.
+    The `materials` directory is imported on the first start with the empty tables.
+    """
+    name = 'database'
+    task_columns = "topic_id, id, title, description, comparator, language"
+
+    def __init__(self, db: Database = database, batch_size: int = Settings.MATERIALS_CONCURRENCY):
+        self.db = db
+        self.batch_size = max(batch_size, 1)
+
+    async def start(self) -> None:
+        if not isfile(join('materials', 'topics.json')):
+            return
+        for attempt in range(3):
+            try:
+                # The app workers start at once, the import is checked and done in one transaction
+                async with self.db.transaction():
+                    if await self.db.fetch_val("SELECT COUNT(*) FROM topics") == 0:
+                        await copy_tasks(FileTaskRepository(), self)
+                return
+            except Exception:
+                # Another worker imports the materials, its topic paths or locks conflict with this import
+                if await self.db.fetch_val("SELECT COUNT(*) FROM topics") > 0:
+                    return
+                if attempt == 2:
+                    raise
+                await sleep(0.1)
+
+    @staticmethod
+    def _topic(row) -> dict:
+        return {'id': row['id'], 'name': row['name'], 'path': row['path'], 'count': row['count']}
+
+    @staticmethod
+    def _description(row) -> dict:
+        description = {
+            'id': row['id'], 'topic_id': row['topic_id'],
+            'title': row['title'], 'description': loads(row['description']),
+        }
+        if row['comparator'] is not None:
+            description['comparator'] = loads(row['comparator'])
+        if row['language'] is not None:
+            description['language'] = row['language']
+        return description
+
+    @staticmethod
+    def _values(rows, column: str) -> List[bytes]:
+        return [row[column].encode('utf-8') for row in rows if row[column] is not None]
+
+    async def _missing(self, topic_id: int, task_id: int) -> None:
+        """
+        `DatabaseTaskRepository._missing` private method raises the error of the task not found.
+        """
+        await self.get_topic(topic_id)
+        raise FileNotFoundError(f'Task not found: topic_id={topic_id}, task_id={task_id}')
+
+    async def get_topics(self) -> List[dict]:
+        rows = await self.db.fetch_all(
+            "SELECT topics.id, topics.name, topics.path, COUNT(tasks.id) AS count FROM topics "
+            "LEFT JOIN tasks ON tasks.topic_id = topics.id "
+            "GROUP BY topics.id, topics.name, topics.path ORDER BY topics.id"
+        )
+        return [self._topic(row) for row in rows]
+
+    async def get_topic(self, topic_id: int) -> dict:
+        row = await self.db.fetch_one(
+            "SELECT id, name, path, (SELECT COUNT(*) FROM tasks WHERE topic_id = :topic_id) AS count "
+            "FROM topics WHERE id = :topic_id",
+            values={"topic_id": topic_id}
+        )
+        if row is None:
+            raise IndexError(f'Topic not found: topic_id={topic_id}')
+        return self._topic(row)
+
+    async def create_topic(self, name: str, path: str) -> int:
+        async with self.db.transaction():
+            topic_id = await self.db.fetch_val("SELECT COALESCE(MAX(id) + 1, 0) FROM topics")
+            await self.db.execute(topics.insert().values(id=topic_id, name=name, path=path, next_task_id=1))
+        return topic_id
+
+    async def get_task(self, topic_id: int, task_id: int, values: bool = True) -> TaskFiles:
+        task_key = {"topic_id": topic_id, "task_id": task_id}
+        row = await self.db.fetch_one(
+            f"SELECT {self.task_columns} FROM tasks WHERE topic_id = :topic_id AND id = :task_id",
+            values=task_key
+        )
+        if row is None:
+            await self._missing(topic_id, task_id)
+        if not values:
+            return self._description(row), None, None
+        rows = await self.db.fetch_all(
+            "SELECT input, output FROM test_cases WHERE topic_id = :topic_id AND task_id = :task_id "
+            "ORDER BY number",
+            values=task_key
+        )
+        return self._description(row), self._values(rows, 'input'), self._values(rows, 'output')
+
+    async def _read_cases(self, topic_id: int, first_id: int, last_id: int) -> Dict[int, list]:
+        """
+        `DatabaseTaskRepository._read_cases` private method returns the test case rows
+        of the tasks with the IDs from `first_id` to `last_id` by the task IDs.
+        """
+        rows = await self.db.fetch_all(
+            "SELECT task_id, input, output FROM test_cases "
+            "WHERE topic_id = :topic_id AND task_id BETWEEN :first_id AND :last_id ORDER BY task_id, number",
+            values={"topic_id": topic_id, "first_id": first_id, "last_id": last_id}
+        )
+        cases: Dict[int, list] = {}
+        for row in rows:
+            cases.setdefault(row['task_id'], []).append(row)
+        return cases
+
+    async def iter_tasks(
+            self, topic_id: int, offset: int = 0, limit: Optional[int] = None, values: bool = True
+    ) -> AsyncIterator[TaskFiles]:
+        last_id, remaining = 0, limit
+        while remaining is None or remaining > 0:
+            size = self.batch_size if remaining is None else min(self.batch_size, remaining)
+            # The offset is skipped once, the next batches start after the last task read
+            rows = await self.db.fetch_all(
+                f"SELECT {self.task_columns} FROM tasks WHERE topic_id = :topic_id AND id > :last_id "
+                "ORDER BY id LIMIT :size OFFSET :offset",
+                values={"topic_id": topic_id, "last_id": last_id, "size": size, "offset": offset}
+            )
+            if not rows:
+                break
+            cases = await self._read_cases(topic_id, rows[0]['id'], rows[-1]['id']) if values else {}
+            for row in rows:
+                if values:
+                    task_cases = cases.get(row['id'], [])
+                    yield self._description(row), self._values(task_cases, 'input'), \
+                        self._values(task_cases, 'output')
+                else:
+                    yield self._description(row), None, None
+            if len(rows) < size:
+                break
+            last_id, offset = rows[-1]['id'], 0
+            if remaining is not None:
+                remaining -= len(rows)
+
+    async def get_task_code(self, topic_id: int, task_id: int) -> bytes:
+        row = await self.db.fetch_one(
+            "SELECT code FROM tasks WHERE topic_id = :topic_id AND id = :task_id",
+            values={"topic_id": topic_id, "task_id": task_id}
+        )
+        if row is None:
+            await self._missing(topic_id, task_id)
+        return row['code'] or b''
+
+    async def get_task_version(self, topic_id: int, task_id: int) -> int:
+        version = await self.db.fetch_val(
+            "SELECT version FROM tasks WHERE topic_id = :topic_id AND id = :task_id",
+            values={"topic_id": topic_id, "task_id": task_id}
+        )
+        if version is None:
+            await self._missing(topic_id, task_id)
+        return version
+
+    async def _save_cases(
+            self, topic_id: int, task_id: int, inputs: Iterable[str], outputs: Iterable[str]
+    ) -> None:
+        """
+        `DatabaseTaskRepository._save_cases` private method replaces the task test case rows,
+        the input and output values are paired by their positions.
+        """
+        await self.db.execute(
+            "DELETE FROM test_cases WHERE topic_id = :topic_id AND task_id = :task_id",
+            values={"topic_id": topic_id, "task_id": task_id}
+        )
+        rows = [
+            {'topic_id': topic_id, 'task_id': task_id, 'number': number, 'input': value, 'output': expected}
+            for number, (value, expected) in enumerate(zip_longest(inputs, outputs))
+        ]
+        if rows:
+            await self.db.execute_many(test_cases.insert(), rows)
+
+    async def create_task(
+            self, topic_id: int, info: dict, inputs: Iterable[str], outputs: Iterable[str], code: bytes
+    ) -> int:
+        async with self.db.transaction():
+            # The topic row stays locked by the update until the task is inserted
+            await self.db.execute(
+                "UPDATE topics SET next_task_id = next_task_id + 1 WHERE id = :topic_id",
+                values={"topic_id": topic_id}
+            )
+            task_id = await self.db.fetch_val(
+                "SELECT next_task_id - 1 FROM topics WHERE id = :topic_id", values={"topic_id": topic_id}
+            )
+            if task_id is None:
+                raise IndexError(f'Topic not found: topic_id={topic_id}')
+            comparator = info.get('comparator')
+            await self.db.execute(tasks.insert().values(
+                topic_id=topic_id, id=task_id, title=info.get('title'),
+                description=dumps(info.get('description'), ensure_ascii=False),
+                comparator=dumps(comparator) if comparator is not None else None,
+                language=info.get('language'),
+                code=code, version=1
+            ))
+            await self._save_cases(topic_id, task_id, inputs, outputs)
+        return task_id
+
+    async def update_task(
+            self, topic_id: int, task_id: int, info: Optional[dict] = None,
+            inputs: Optional[Iterable[str]] = None, outputs: Optional[Iterable[str]] = None,
+            code: Optional[bytes] = None
+    ) -> None:
+        info = info or {}
+        changes = {key: info[key] for key in ('title', 'language') if key in info}
+        changes.update({
+            key: dumps(info[key], ensure_ascii=False) for key in ('description', 'comparator') if key in info
+        })
+        if code is not None:
+            changes['code'] = code
+        async with self.db.transaction():
+            if await self.db.fetch_val(
+                    "SELECT COUNT(*) FROM tasks WHERE topic_id = :topic_id AND id = :task_id",
+                    values={"topic_id": topic_id, "task_id": task_id}
+            ) == 0:
+                await self._missing(topic_id, task_id)
+            await self.db.execute(
+                tasks.update().where((tasks.c.topic_id == topic_id) & (tasks.c.id == task_id))
+                .values(version=tasks.c.version + 1, **changes)
+            )
+            if inputs is not None or outputs is not None:
+                _, current_inputs, current_outputs = await self.get_task(topic_id, task_id)
+                await self._save_cases(
+                    topic_id, task_id,
+                    inputs if inputs is not None else text_values(current_inputs),
+                    outputs if outputs is not None else text_values(current_outputs)
+                )
+
+    async def delete_task(self, topic_id: int, task_id: int) -> None:
+        task_key = {"topic_id": topic_id, "task_id": task_id}
+        async with self.db.transaction():
+            if await self.db.fetch_val(
+                    "SELECT COUNT(*) FROM tasks WHERE topic_id = :topic_id AND id = :task_id", values=task_key
+            ) == 0:
+                await self._missing(topic_id, task_id)
+            await self.db.execute(
+                "DELETE FROM test_cases WHERE topic_id = :topic_id AND task_id = :task_id", values=task_key
+            )
+            await self.db.execute("DELETE FROM tasks WHERE topic_id = :topic_id AND id = :task_id", values=task_key)
+
+
+def text_values(values: List[bytes]) -> List[str]:
+    """
+    `text_values` function returns the task values as they are saved,
+    the empty value after the trailing newline of a values file is not a value.
+    """
+    values = [value.decode('utf-8') for value in values]
+    if values and values[-1] == '':
+        values.pop()
+    return values
+
+
+async def copy_tasks(source: TaskRepository, target: TaskRepository) -> int:
+    """
+    `copy_tasks` function copies every topic and task from the `source` repository to the `target` one
+    and returns the number of the tasks copied. The tasks get the next free IDs of the target topics,
+    so the IDs are kept if the target is empty and there are no gaps after the deleted tasks.
+    """
+    copied = 0
+    for topic in await source.get_topics():
+        topic_id = await target.create_topic(topic.get('name'), topic.get('path'))
+        async for description, inputs, outputs in source.iter_tasks(topic.get('id')):
+            try:
+                code = await source.get_task_code(topic.get('id'), description.get('id'))
+            except FileNotFoundError:
+                code = b''
+            info = {key: value for key, value in description.items() if key not in ('id', 'topic_id')}
+            await target.create_task(topic_id, info, text_values(inputs), text_values(outputs), code)
+            copied += 1
+    return copied
+
+
+def create_task_repository(name: str) -> TaskRepository:
+    """
+    `create_task_repository` function returns the task repository by its name from the settings.
+    """
+    repositories = {'files': FileTaskRepository, 'database': DatabaseTaskRepository}
+    try:
+        return repositories[name]()
+    except KeyError as e:
+        raise ValueError(f"You need to specify the task repository: {', '.join(repositories)}") from e
+
+
+# The app task repository selected in the settings
+task_repository = create_task_repository(Settings.TASK_REPOSITORY)
+
+
+async def main(command: str) -> None:
+    """
+    `main` function imports the `./materials` directory to the app database or exports it back.
+    """
+    files, tables = FileTaskRepository(), DatabaseTaskRepository()
+    copying = {'import': (files, tables), 'export': (tables, files)}
+    if command not in copying:
+        raise ValueError("You need to specify the command: 'import', 'export'")
+    await database.connect()
+    try:
+        await create_schema()
+        async with database.transaction():
+            copied = await copy_tasks(*copying[command])
+    finally:
+        await database.disconnect()
+    print(f"{copied} tasks copied.")
+
+
+if __name__ == '__main__':
+    run(main(argv[1] if len(argv) > 1 else ''))
@@ -0,0 +1,186 @@
+"""
+The `runtime_scripts` module stores the language runtimes of the tasks and the cache of the compiled user input.
+A runtime is the sandbox image, the source file user input is saved to, the compile step and the run step,
+both steps are run in the sandbox working directory.
+The compiled artifacts are stored by the hash of the source and the toolchain,
+so a submission is compiled once for all its test cases and once for all its resubmissions.
+"""
+from asyncio import Future, ensure_future, shield
+from collections import OrderedDict
+from hashlib import sha256
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from utilities.metrics_scripts import check_stage_seconds
+from utilities.settings import Settings
+
+if TYPE_CHECKING:
+    from utilities.sandbox_scripts import ExecResult
+
+
+class Runtime(NamedTuple):
+    """
+    `Runtime` is a task language: the sandbox `image`, the `source` file name of user input,
+    the `run` command and the optional `compile` command writing the `artifact` file.
+    `toolchain` is the compiler version the artifacts depend on, the image name by default,
+    pin it with the image digest if the image tag moves. `launcher` is set if the image has Python
+    to run the launcher reporting the CPU time and peak RSS.
+    """
+    name: str
+    image: str
+    source: str
+    run: Tuple[str, ...]
+    compile: Optional[Tuple[str, ...]] = None
+    artifact: Optional[str] = None
+    toolchain: str = ''
+    launcher: bool = False
+
+    def artifact_key(self, code: bytes) -> str:
+        """
+        `Runtime.artifact_key` public method returns the content address of the artifact compiled from the code.
+        """
+        key = sha256('\0'.join((self.name, self.toolchain or self.image, *(self.compile or ()))).encode('utf-8'))
+        key.update(b'\0' + sha256(code).digest())
+        return key.hexdigest()
+
+
+class CompileResult(NamedTuple):
+    """
+    `CompileResult` is the compiled `artifact`, None if the compilation failed, and the compiler run result.
+    """
+    artifact: Optional[bytes]
+    result: 'ExecResult'
+
+
+class RuntimeRegistry:
+    """
+    `RuntimeRegistry` class stores the runtimes by their language names,
+    `default` is the language of the tasks without one.
+    """
+
+    def __init__(self, default: str = 'python'):
+        self.default = default
+        self.runtimes: Dict[str, Runtime] = {}
+
+    def register(self, runtime: Runtime) -> Runtime:
+        """
+        `RuntimeRegistry.register` public method adds the runtime or replaces the one with the same name.
+        """
+        self.runtimes[runtime.name] = runtime
+        return runtime
+
+    def get(self, language: Optional[str] = None) -> Runtime:
+        """
+        `RuntimeRegistry.get` public method returns the runtime of the language, the default one for None.
+        It raises ValueError if there is no such language.
+        """
+        try:
+            return self.runtimes[language or self.default]
+        except KeyError as e:
+            raise ValueError(f'Unknown language "{language}", use one of: {", ".join(self.runtimes)}') from e
+
+    def names(self) -> List[str]:
+        return list(self.runtimes)
+
+
+class ArtifactCache:
+    """
+    `ArtifactCache` class stores the compile results by the artifact key, at most `max_size` bytes
+    of the artifacts and the compiler output, the least recently used ones are evicted first.
+    The compilation errors are stored as well, the compilations killed by a limit are not.
+    The concurrent compilations of the same key run once.
+    """
+
+    def __init__(self, max_size: int = 256 * 1024 * 1024):
+        self.max_size = max_size
+        self.entries: 'OrderedDict[str, CompileResult]' = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._compiling: Dict[str, Future] = {}
+
+    @staticmethod
+    def _entry_size(compiled: CompileResult) -> int:
+        return len(compiled.artifact or b'') + len(compiled.result.stdout) + len(compiled.result.stderr)
+
+    def _store(self, key: str, compiled: CompileResult) -> None:
+        size = self._entry_size(compiled)
+        if size > self.max_size:
+            return
+        self.entries[key] = compiled
+        self.size += size
+        while self.size > self.max_size:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= self._entry_size(evicted)
+
+    async def _compile(self, key: str, compile: Callable[[], Awaitable[CompileResult]]) -> CompileResult:
+        try:
+            with check_stage_seconds.time(stage='compile'):
+                compiled = await compile()
+            # A killed compiler may be caused by the sandbox load
+            if compiled.result.limit is None:
+                self._store(key, compiled)
+            return compiled
+        finally:
+            self._compiling.pop(key, None)
+
+    async def get(self, key: str, compile: Callable[[], Awaitable[CompileResult]]) -> CompileResult:
+        """
+        `ArtifactCache.get` public method returns the compile result of the key,
+        the `compile` coroutine is called if it is neither cached nor compiling right now.
+        """
+        compiled = self.entries.get(key)
+        if compiled is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return compiled
+        compiling = self._compiling.get(key)
+        if compiling is None:
+            self.misses += 1
+            compiling = self._compiling[key] = ensure_future(self._compile(key, compile))
+        else:
+            self.coalesced += 1
+        # A cancelled check does not cancel the compilation awaited by the others
+        return await shield(compiling)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        `ArtifactCache.stats` public method returns the cache counters.
+        """
+        return {
+            'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+            'entries': len(self.entries), 'bytes': self.size,
+        }
+
+
+def create_runtime_registry() -> RuntimeRegistry:
+    """
+    `create_runtime_registry` function returns the registry of the languages configured in the settings.
+    """
+    registry = RuntimeRegistry()
+    registry.register(Runtime(
+        'python', Settings.RUNTIME_IMAGE, 'main.py', ('python', '-I', '-u', 'main.py'), launcher=True
+    ))
+    registry.register(Runtime(
+        'c', Settings.C_RUNTIME_IMAGE, 'main.c', ('./main',),
+        ('gcc', '-O2', '-std=c11', '-o', 'main', 'main.c', '-lm'), 'main'
+    ))
+    registry.register(Runtime(
+        'cpp', Settings.C_RUNTIME_IMAGE, 'main.cpp', ('./main',),
+        ('g++', '-O2', '-std=c++17', '-o', 'main', 'main.cpp'), 'main'
+    ))
+    registry.register(Runtime(
+        'java', Settings.JAVA_RUNTIME_IMAGE, 'Main.java', ('java', '-jar', 'main.jar'),
+        ('sh', '-c', 'javac -d classes Main.java && jar --create --file main.jar --main-class Main -C classes .'),
+        'main.jar'
+    ))
+    # The Go build cache is written to the sandbox working directory
+    registry.register(Runtime(
+        'go', Settings.GO_RUNTIME_IMAGE, 'main.go', ('./main',),
+        ('env', 'GOCACHE=/tmp/.cache', 'GOPATH=/tmp/.go', 'CGO_ENABLED=0', 'go', 'build', '-o', 'main', 'main.go'),
+        'main'
+    ))
+    return registry
+
+
+runtime_registry = create_runtime_registry()
+artifact_cache = ArtifactCache(Settings.ARTIFACT_CACHE_SIZE)
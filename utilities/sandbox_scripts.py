@@ -0,0 +1,755 @@
+"""
+The `sandbox_scripts` module stores the sandbox backends running user input
+and the pool of warm, disposable sandbox containers.
+User input of a compiled language is compiled once in the sandbox, the artifact is shared
+by the test cases and the resubmissions of the same code through the artifact cache.
+"""
+import sys
+from abc import ABC, abstractmethod
+from asyncio import create_subprocess_exec, ensure_future, sleep, wait, gather, Event, Task, \
+    CancelledError, FIRST_COMPLETED
+from asyncio.subprocess import PIPE, Process
+from collections import deque
+from contextlib import asynccontextmanager
+from itertools import count
+from os import chmod, defpath, environ, killpg, getpgid, makedirs
+from os.path import join
+from signal import SIGKILL
+from tempfile import TemporaryDirectory
+from time import monotonic, perf_counter
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Set
+from utilities.runtime_scripts import ArtifactCache, CompileResult, Runtime, artifact_cache, runtime_registry
+from utilities.settings import Settings
+
+try:
+    import resource
+except ImportError:  # Windows has no resource limits
+    resource = None
+
+# Run limit statuses, they are the test case statuses as well
+TIMEOUT = 'TIMEOUT'
+OUTPUT_LIMIT_EXCEEDED = 'OUTPUT_LIMIT_EXCEEDED'
+# Bytes read from the sandbox output at once
+CHUNK_SIZE = 64 * 1024
+
+
+# Marker of the resource usage line the launcher appends to stderr
+USAGE_MARKER = b'__autograding_usage__'
+# Python launcher running the command given in its arguments with the same interpreter,
+# it reports the command's CPU time and peak RSS from `wait4` and exits the same way
+LAUNCHER = f"""
+import os, signal, sys
+pid = os.fork()
+if pid == 0:
+    os.execv(sys.executable, [sys.executable] + sys.argv[1:])
+_, status, usage = os.wait4(pid, 0)
+os.write(2, b'\\n{USAGE_MARKER.decode()} %f %f %d\\n' % (usage.ru_utime, usage.ru_stime, usage.ru_maxrss))
+if os.WIFSIGNALED(status):
+    signal.signal(os.WTERMSIG(status), signal.SIG_DFL)
+    os.kill(os.getpid(), os.WTERMSIG(status))
+os._exit(os.WEXITSTATUS(status))
+"""
+# Launcher running the command given in its arguments, e.g. a compiled program of another language
+COMMAND_LAUNCHER = LAUNCHER.replace(
+    'os.execv(sys.executable, [sys.executable] + sys.argv[1:])', 'os.execvp(sys.argv[1], sys.argv[1:])'
+)
+
+
+class ExecMetrics(NamedTuple):
+    """
+    `ExecMetrics` is the resource usage of a command executed in a sandbox:
+    wall-clock seconds, output bytes read, user and system CPU seconds and peak RSS bytes.
+    CPU time and peak RSS are None if the sandbox does not report them.
+    """
+    wall_time: float
+    output_bytes: int
+    cpu_user: Optional[float] = None
+    cpu_system: Optional[float] = None
+    peak_rss: Optional[int] = None
+
+
+class ExecResult(NamedTuple):
+    """
+    `ExecResult` is the result of a command executed in a sandbox: stdout, stderr, the exit code,
+    the limit the command was killed by, `TIMEOUT` or `OUTPUT_LIMIT_EXCEEDED`,
+    and the resource usage metrics.
+    """
+    stdout: bytes
+    stderr: bytes
+    exit_code: int
+    limit: Optional[str] = None
+    metrics: Optional[ExecMetrics] = None
+
+
+def attach_usage(result: ExecResult) -> ExecResult:
+    """
+    `attach_usage` function moves the usage line of the launcher from stderr to the result metrics.
+    The result is returned as it is if there is no usage line, e.g. the launcher was killed.
+    """
+    position = result.stderr.rfind(b'\n' + USAGE_MARKER + b' ')
+    if position == -1:
+        return result
+    try:
+        cpu_user, cpu_system, peak_rss = result.stderr[position:].split()[1:4]
+        metrics = (result.metrics or ExecMetrics(0.0, 0))._replace(
+            cpu_user=float(cpu_user), cpu_system=float(cpu_system),
+            # Linux reports the peak RSS in kilobytes
+            peak_rss=int(peak_rss) * 1024
+        )
+    except ValueError:
+        return result
+    stderr = result.stderr[:position]
+    if result.metrics is not None:
+        metrics = metrics._replace(
+            output_bytes=result.metrics.output_bytes - (len(result.stderr) - len(stderr))
+        )
+    return result._replace(stderr=stderr, metrics=metrics)
+
+
+class BoundedBuffer:
+    """
+    `BoundedBuffer` collects the output chunks in a buffer preallocated for `limit` bytes,
+    the chunks above the limit are dropped and mark the buffer as overflown.
+    """
+
+    def __init__(self, limit: int):
+        self.data = bytearray(limit)
+        self.size = 0
+        self.overflown = False
+
+    def write(self, chunk: bytes) -> bool:
+        """
+        `BoundedBuffer.write` public method appends the chunk, it returns False on overflow.
+        """
+        room = len(self.data) - self.size
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.overflown = True
+        self.data[self.size:self.size + len(chunk)] = chunk
+        self.size += len(chunk)
+        return not self.overflown
+
+    def getvalue(self) -> bytes:
+        return bytes(memoryview(self.data)[:self.size])
+
+
+async def run_bounded(
+        process: Process, stdin: bytes, output_limit: int, timeout: float,
+        kill: Callable[[], Awaitable[None]] = None
+) -> ExecResult:
+    """
+    `run_bounded` function feeds stdin to the process and reads its stdout and stderr in chunks,
+    at most `output_limit` bytes of each are kept. The process is killed with `kill`
+    (by default with SIGKILL) when its output exceeds the limit or it runs for `timeout` seconds.
+    The result metrics have the wall-clock time and the output size.
+    """
+    started = perf_counter()
+    stdout, stderr = BoundedBuffer(output_limit), BoundedBuffer(output_limit)
+    exceeded = Event()
+
+    async def feed() -> None:
+        try:
+            process.stdin.write(stdin)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            process.stdin.close()
+
+    async def pump(stream, buffer: BoundedBuffer) -> None:
+        while True:
+            chunk = await stream.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            if not buffer.write(chunk):
+                exceeded.set()
+                return
+
+    reading = ensure_future(gather(feed(), pump(process.stdout, stdout), pump(process.stderr, stderr)))
+    exceeding = ensure_future(exceeded.wait())
+    try:
+        await wait({reading, exceeding}, timeout=timeout, return_when=FIRST_COMPLETED)
+    finally:
+        exceeding.cancel()
+    limit = None
+    if exceeded.is_set():
+        limit = OUTPUT_LIMIT_EXCEEDED
+    elif not reading.done():
+        limit = TIMEOUT
+    if limit is not None:
+        try:
+            if kill is not None:
+                await kill()
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+        reading.cancel()
+        try:
+            await reading
+        except (CancelledError, Exception):
+            pass
+    else:
+        await reading
+    await process.wait()
+    metrics = ExecMetrics(perf_counter() - started, stdout.size + stderr.size)
+    return ExecResult(stdout.getvalue(), stderr.getvalue(), process.returncode, limit, metrics)
+
+
+class SandboxSession:
+    """
+    `SandboxSession` is user input prepared in a sandbox,
+    its `run` coroutine executes the user input with the given stdin.
+    `compile_error` is the compiler run result if user input failed to compile, there is nothing to run then.
+    """
+
+    def __init__(self, run: Callable[[bytes], Awaitable[ExecResult]], compile_error: Optional[ExecResult] = None):
+        self.run = run
+        self.compile_error = compile_error
+
+
+class SandboxBackend(ABC):
+    """
+    `SandboxBackend` is an interface for running user input in a sandbox.
+    A session prepares the user input once, then every test case is run in it.
+    """
+    name = ''
+
+    async def start(self) -> None:
+        """
+        `SandboxBackend.start` prepares the backend, it is called on the app startup.
+        """
+
+    async def close(self) -> None:
+        """
+        `SandboxBackend.close` releases the backend resources, it is called on the app shutdown.
+        """
+
+    def stats(self) -> Dict[str, int]:
+        """
+        `SandboxBackend.stats` returns the backend counters, e.g. the containers left running.
+        """
+        return {}
+
+    @abstractmethod
+    def session(
+            self, code: bytes, topic_name: str, task_id: int, runtime: Runtime = None
+    ) -> AsyncIterator[SandboxSession]:
+        """
+        `SandboxBackend.session` returns an async context manager with the user input
+        prepared for the task language `runtime`, Python by default.
+        It raises RuntimeError if the sandbox is unavailable.
+        """
+
+
+class SubprocessBackend(SandboxBackend):
+    """
+    `SubprocessBackend` runs user input in a local isolated `python -I` subprocess
+    for trusted users and CI, no Docker daemon is needed.
+    Every run has a private temp working directory in the `workspace` directory
+    (the system temp directory by default), an empty environment,
+    `cpu_time` seconds of CPU, `memory` bytes of address space,
+    `file_size` bytes per written file, `timeout` seconds of wall-clock time
+    and `output_limit` bytes of stdout and stderr.
+    User input is run by the launcher reporting its CPU time and peak RSS.
+    The local `toolchain` stands in for the runtime images, it maps the command names
+    of the compile and run steps to the local executables, `python` is the Python running the app.
+    The compilers are run for at most `compile_timeout` seconds and their artifacts are kept in `artifacts`.
+    """
+    name = 'subprocess'
+
+    def __init__(
+            self, cpu_time: int = 5, memory: int = 256 * 1024 * 1024,
+            file_size: int = 1024 * 1024, timeout: float = 10.0, python: str = sys.executable,
+            output_limit: int = 1024 * 1024, workspace: str = None, toolchain: Dict[str, str] = None,
+            artifacts: ArtifactCache = None, compile_timeout: float = 30.0
+    ):
+        if resource is None:
+            raise RuntimeError("The subprocess sandbox needs the resource limits of a Unix system.")
+        self.cpu_time = cpu_time
+        self.memory = memory
+        self.file_size = file_size
+        self.timeout = timeout
+        self.python = python
+        self.output_limit = output_limit
+        self.workspace = workspace
+        self.toolchain = {'python': python, **(toolchain or {})}
+        self.artifacts = artifacts if artifacts is not None else artifact_cache
+        self.compile_timeout = compile_timeout
+
+    async def start(self) -> None:
+        if self.workspace is not None:
+            makedirs(self.workspace, exist_ok=True)
+
+    def _set_limits(self) -> None:
+        # Called in the child process right before the user input is executed
+        resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time))
+        resource.setrlimit(resource.RLIMIT_AS, (self.memory, self.memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (self.file_size, self.file_size))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    @staticmethod
+    def _set_compile_limits() -> None:
+        # The compiler is trusted, it is only limited by the compile timeout
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    def _command(self, cmd: Sequence[str]) -> List[str]:
+        return [self.toolchain.get(cmd[0], cmd[0]), *cmd[1:]]
+
+    async def _exec(
+            self, workdir: str, cmd: Sequence[str], stdin: bytes, timeout: float,
+            limits: Callable[[], None], env: Dict[str, str]
+    ) -> ExecResult:
+        process = await create_subprocess_exec(
+            *cmd, cwd=workdir, env=env, stdin=PIPE, stdout=PIPE, stderr=PIPE,
+            preexec_fn=limits, start_new_session=True
+        )
+
+        async def kill() -> None:
+            # Kill the whole process group, the user input may have started children
+            killpg(getpgid(process.pid), SIGKILL)
+
+        return await run_bounded(process, stdin, self.output_limit, timeout, kill)
+
+    async def _run(self, workdir: str, runtime: Runtime, stdin: bytes) -> ExecResult:
+        return attach_usage(await self._exec(
+            workdir, (self.python, '-I', '-c', COMMAND_LAUNCHER, *self._command(runtime.run)), stdin,
+            self.timeout, self._set_limits, {}
+        ))
+
+    async def _compile(self, workdir: str, runtime: Runtime, code: bytes) -> CompileResult:
+        with open(join(workdir, runtime.source), mode='wb') as f:
+            f.write(code)
+        # The compilers are found in the app PATH
+        result = await self._exec(
+            workdir, self._command(runtime.compile), b'', self.compile_timeout,
+            self._set_compile_limits, {'PATH': environ.get('PATH', defpath)}
+        )
+        if result.exit_code != 0 or result.limit is not None:
+            return CompileResult(None, result)
+        try:
+            with open(join(workdir, runtime.artifact), mode='rb') as f:
+                return CompileResult(f.read(), result)
+        except FileNotFoundError as e:
+            raise RuntimeError(f"The {runtime.name} compiler wrote no {runtime.artifact}.") from e
+
+    @asynccontextmanager
+    async def session(
+            self, code: bytes, topic_name: str, task_id: int, runtime: Runtime = None
+    ) -> AsyncIterator[SandboxSession]:
+        runtime = runtime or runtime_registry.get()
+        with TemporaryDirectory(prefix='check_', dir=self.workspace) as workdir:
+            compiled = None
+            if runtime.compile is None:
+                with open(join(workdir, runtime.source), mode='wb') as f:
+                    f.write(code)
+            else:
+                compiled = await self.artifacts.get(
+                    runtime.artifact_key(code), lambda: self._compile(workdir, runtime, code)
+                )
+                if compiled.artifact is not None:
+                    with open(join(workdir, runtime.artifact), mode='wb') as f:
+                        f.write(compiled.artifact)
+                    chmod(join(workdir, runtime.artifact), 0o755)
+            yield SandboxSession(
+                lambda stdin: self._run(workdir, runtime, stdin),
+                compiled.result if compiled is not None and compiled.artifact is None else None
+            )
+
+
+class ContainerBackend(ABC):
+    """
+    `ContainerBackend` is an interface for starting, executing in and removing containers.
+    """
+
+    @abstractmethod
+    async def start(self, image: str) -> str:
+        """
+        `ContainerBackend.start` starts an idle container and returns its ID.
+        """
+
+    @abstractmethod
+    async def exec(
+            self, container_id: str, cmd: Sequence[str], stdin: bytes = b'',
+            output_limit: int = 1024 * 1024, timeout: float = None
+    ) -> ExecResult:
+        """
+        `ContainerBackend.exec` runs a command in the container and returns its result.
+        The command is killed when its output exceeds `output_limit` bytes
+        or it runs for `timeout` seconds.
+        """
+
+    @abstractmethod
+    async def remove(self, container_id: str) -> None:
+        """
+        `ContainerBackend.remove` stops and removes the container.
+        """
+
+
+class DockerContainerBackend(ContainerBackend):
+    """
+    `DockerContainerBackend` manages network-less, read-only containers with the Docker CLI.
+    Only `/tmp` is writable, it is a tmpfs for the submission file and the compiler output.
+    The memory, the processes and the CPUs of a container are capped, the swap is disabled.
+    Attribute `containers` stores the IDs of the containers started and not removed yet.
+    """
+    run_options = (
+        '--network', 'none', '--read-only', '--tmpfs', f'/tmp:rw,exec,size={Settings.SANDBOX_TMPFS_SIZE}',
+        '--memory', Settings.SANDBOX_MEMORY, '--memory-swap', Settings.SANDBOX_MEMORY,
+        '--pids-limit', str(Settings.SANDBOX_PIDS_LIMIT), '--cpus', Settings.SANDBOX_CPUS,
+        '--label', 'type=sandbox',
+    )
+
+    def __init__(self):
+        self.containers: Set[str] = set()
+
+    @staticmethod
+    async def _docker(
+            *args: str, stdin: bytes = b'', output_limit: int = 1024 * 1024, timeout: float = None
+    ) -> ExecResult:
+        try:
+            process = await create_subprocess_exec(
+                'docker', *args, stdin=PIPE, stdout=PIPE, stderr=PIPE
+            )
+        except FileNotFoundError as e:
+            raise RuntimeError("The Docker CLI is not installed.") from e
+        return await run_bounded(process, stdin, output_limit, timeout)
+
+    async def start(self, image: str) -> str:
+        result = await self._docker(
+            'run', '--detach', *self.run_options, image, 'tail', '-f', '/dev/null'
+        )
+        if result.exit_code != 0:
+            raise RuntimeError(f"Failed to start the sandbox container: {result.stderr.decode('utf-8')}")
+        container_id = result.stdout.decode('utf-8').strip()
+        self.containers.add(container_id)
+        return container_id
+
+    async def exec(
+            self, container_id: str, cmd: Sequence[str], stdin: bytes = b'',
+            output_limit: int = 1024 * 1024, timeout: float = None
+    ) -> ExecResult:
+        # A killed Docker CLI closes the command pipes, the command left running
+        # is removed with the single-use container after the check
+        return await self._docker(
+            'exec', '--interactive', container_id, *cmd,
+            stdin=stdin, output_limit=output_limit, timeout=timeout
+        )
+
+    async def remove(self, container_id: str) -> None:
+        await self._docker('rm', '--force', container_id)
+        self.containers.discard(container_id)
+
+
+class FakeContainerBackend(ContainerBackend):
+    """
+    `FakeContainerBackend` is an in-memory backend for testing the pool without a Docker daemon.
+    Attribute `handler` is called with the container ID, command and stdin for every `exec`,
+    by default it echoes stdin back. Its output is cut to the output limit.
+    """
+
+    def __init__(self, handler: Callable[[str, Sequence[str], bytes], Sequence] = None):
+        self.handler = handler or (lambda container_id, cmd, stdin: (stdin, b'', 0))
+        self.containers: Dict[str, str] = {}
+        self.started = 0
+        self.removed = 0
+        self._ids = count(1)
+
+    async def start(self, image: str) -> str:
+        container_id = f'fake_{next(self._ids)}'
+        self.containers[container_id] = image
+        self.started += 1
+        return container_id
+
+    async def exec(
+            self, container_id: str, cmd: Sequence[str], stdin: bytes = b'',
+            output_limit: int = 1024 * 1024, timeout: float = None
+    ) -> ExecResult:
+        if container_id not in self.containers:
+            raise RuntimeError(f"No such container: {container_id}")
+        stdout, stderr, exit_code = self.handler(container_id, cmd, stdin)
+        if len(stdout) > output_limit or len(stderr) > output_limit:
+            stdout, stderr = stdout[:output_limit], stderr[:output_limit]
+            return ExecResult(stdout, stderr, -9, OUTPUT_LIMIT_EXCEEDED, ExecMetrics(0.0, len(stdout + stderr)))
+        return ExecResult(stdout, stderr, exit_code, metrics=ExecMetrics(0.0, len(stdout + stderr)))
+
+    async def remove(self, container_id: str) -> None:
+        if self.containers.pop(container_id, None) is not None:
+            self.removed += 1
+
+
+class PooledContainer:
+    """
+    `PooledContainer` is a warm container handed out by the `SandboxPool` for a single check.
+    """
+
+    def __init__(self, backend: ContainerBackend, container_id: str, image: str):
+        self.backend = backend
+        self.id = container_id
+        self.image = image
+        self.created = monotonic()
+
+    @property
+    def age(self) -> float:
+        return monotonic() - self.created
+
+    async def exec(
+            self, cmd: Sequence[str], stdin: bytes = b'', output_limit: int = 1024 * 1024,
+            timeout: float = None
+    ) -> ExecResult:
+        return await self.backend.exec(self.id, cmd, stdin, output_limit, timeout)
+
+
+class _PoolSession:
+    """
+    `_PoolSession` is an async context manager releasing the acquired container on exit.
+    """
+
+    def __init__(self, pool: 'SandboxPool', image: str):
+        self.pool = pool
+        self.image = image
+        self.container = None
+
+    async def __aenter__(self) -> PooledContainer:
+        self.container = await self.pool.acquire(self.image)
+        return self.container
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.pool.release(self.container)
+
+
+class DisposableSession:
+    """
+    `DisposableSession` is an async context manager starting a container on enter
+    and removing it on exit, it is used when the pool is disabled.
+    """
+
+    def __init__(self, backend: ContainerBackend, image: str):
+        self.backend = backend
+        self.image = image
+        self.container = None
+
+    async def __aenter__(self) -> PooledContainer:
+        container_id = await self.backend.start(self.image)
+        self.container = PooledContainer(self.backend, container_id, self.image)
+        return self.container
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.backend.remove(self.container.id)
+
+
+class SandboxPool:
+    """
+    `SandboxPool` keeps up to `size` idle containers warm for every runtime image.
+    A container is handed out for one check only, afterwards it is destroyed and replaced,
+    so no state leaks between users. The pool is refilled in the background
+    with at most `refill_rate` containers per second, idle containers older
+    than `max_age` seconds are destroyed instead of being handed out.
+    """
+
+    def __init__(
+            self, backend: ContainerBackend, size: int = 2,
+            refill_rate: float = 5.0, max_age: float = 300.0
+    ):
+        self.backend = backend
+        self.size = size
+        self.refill_rate = refill_rate
+        self.max_age = max_age
+        self.idle: Dict[str, Deque[PooledContainer]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._refills: Dict[str, Task] = {}
+        self._cleanups: List[Task] = []
+
+    async def _start(self, image: str) -> PooledContainer:
+        container_id = await self.backend.start(image)
+        return PooledContainer(self.backend, container_id, image)
+
+    async def _destroy(self, container: PooledContainer) -> None:
+        try:
+            await self.backend.remove(container.id)
+        except Exception as e:
+            print("Failed to remove the sandbox container.", e)
+
+    async def _refill(self, image: str) -> None:
+        idle = self.idle.setdefault(image, deque())
+        try:
+            while len(idle) < self.size:
+                idle.append(await self._start(image))
+                if self.refill_rate > 0:
+                    await sleep(1 / self.refill_rate)
+        except CancelledError:
+            raise
+        except Exception as e:
+            print("Failed to refill the sandbox pool.", e)
+        finally:
+            self._refills.pop(image, None)
+
+    def warm(self, image: str) -> None:
+        """
+        `SandboxPool.warm` public method schedules the pool refill for the image.
+        """
+        refill = self._refills.get(image)
+        if (refill is None or refill.done()) and self.size > 0:
+            self._refills[image] = ensure_future(self._refill(image))
+
+    async def acquire(self, image: str) -> PooledContainer:
+        """
+        `SandboxPool.acquire` public method returns a warm container for the image,
+        or starts a new one when the pool is empty.
+        """
+        idle = self.idle.setdefault(image, deque())
+        container = None
+        while idle:
+            candidate = idle.popleft()
+            if candidate.age < self.max_age:
+                container = candidate
+                break
+            self.expired += 1
+            self._cleanups = [cleanup for cleanup in self._cleanups if not cleanup.done()]
+            self._cleanups.append(ensure_future(self._destroy(candidate)))
+        if container is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            container = await self._start(image)
+        self.warm(image)
+        return container
+
+    async def release(self, container: PooledContainer) -> None:
+        """
+        `SandboxPool.release` public method destroys the used container and refills the pool.
+        """
+        await self._destroy(container)
+        self.warm(container.image)
+
+    def session(self, image: str) -> _PoolSession:
+        """
+        `SandboxPool.session` public method returns an async context manager
+        which acquires a container for the image and releases it on exit.
+        """
+        return _PoolSession(self, image)
+
+    async def close(self) -> None:
+        """
+        `SandboxPool.close` public method stops the refills and removes every idle container.
+        """
+        for refill in list(self._refills.values()):
+            refill.cancel()
+        self._refills.clear()
+        for cleanup in self._cleanups:
+            if not cleanup.done():
+                await cleanup
+        self._cleanups.clear()
+        for idle in self.idle.values():
+            while idle:
+                await self._destroy(idle.popleft())
+
+    def stats(self) -> Dict[str, int]:
+        """
+        `SandboxPool.stats` public method returns the pool counters.
+        """
+        return {
+            'hits': self.hits, 'misses': self.misses, 'expired': self.expired,
+            'idle': sum(len(idle) for idle in self.idle.values()),
+        }
+
+
+class ContainerSandboxBackend(SandboxBackend):
+    """
+    `ContainerSandboxBackend` copies user input into one runtime container per check
+    and runs every test case there with `exec`. Containers are taken from the `pool`
+    of warm containers if it is given, otherwise they are started on demand.
+    `image` is the Python runtime image, the other languages run in their runtime images.
+    A test case is killed after `timeout` seconds or `output_limit` bytes of output,
+    it is run by the launcher reporting its CPU time and peak RSS if the image has Python.
+    User input of a compiled language is compiled in the container for at most `compile_timeout` seconds,
+    the artifact of at most `artifact_limit` bytes is kept in `artifacts` and copied into the next containers.
+    """
+    name = 'container'
+
+    def __init__(
+            self, image: str, backend: ContainerBackend, pool: SandboxPool = None,
+            timeout: float = 10.0, output_limit: int = 1024 * 1024, artifacts: ArtifactCache = None,
+            compile_timeout: float = 30.0, artifact_limit: int = 64 * 1024 * 1024
+    ):
+        self.image = image
+        self.backend = backend
+        self.pool = pool
+        self.timeout = timeout
+        self.output_limit = output_limit
+        self.artifacts = artifacts if artifacts is not None else artifact_cache
+        self.compile_timeout = compile_timeout
+        self.artifact_limit = artifact_limit
+
+    async def start(self) -> None:
+        if self.pool is not None:
+            self.pool.warm(self.image)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+
+    def stats(self) -> Dict[str, int]:
+        stats = {'containers': len(getattr(self.backend, 'containers', ()))}
+        if self.pool is not None:
+            stats.update({f'pool_{name}': value for name, value in self.pool.stats().items()})
+        return stats
+
+    @staticmethod
+    def _in_workdir(cmd: Sequence[str]) -> Sequence[str]:
+        return ('sh', '-c', 'cd /tmp && exec "$@"', 'sh', *cmd)
+
+    @staticmethod
+    async def _upload(container: PooledContainer, name: str, data: bytes, executable: bool = False) -> None:
+        # A failed upload would be graded as a wrong answer, it is the sandbox failure
+        command = f'cat > /tmp/{name} && chmod +x /tmp/{name}' if executable else f'cat > /tmp/{name}'
+        result = await container.exec(('sh', '-c', command), stdin=data)
+        if result.exit_code != 0:
+            raise RuntimeError(f"Failed to copy {name} into the sandbox container: {result.stderr.decode('utf-8')}")
+
+    async def _compile(self, container: PooledContainer, runtime: Runtime, code: bytes) -> CompileResult:
+        await self._upload(container, runtime.source, code)
+        result = await container.exec(
+            self._in_workdir(runtime.compile), b'', self.output_limit, self.compile_timeout
+        )
+        if result.exit_code != 0 or result.limit is not None:
+            return CompileResult(None, result)
+        artifact = await container.exec(('cat', f'/tmp/{runtime.artifact}'), output_limit=self.artifact_limit)
+        if artifact.exit_code != 0 or artifact.limit is not None:
+            raise RuntimeError(f"Failed to read the compiled {runtime.artifact}: {artifact.stderr.decode('utf-8')}")
+        return CompileResult(artifact.stdout, result)
+
+    @asynccontextmanager
+    async def session(
+            self, code: bytes, topic_name: str, task_id: int, runtime: Runtime = None
+    ) -> AsyncIterator[SandboxSession]:
+        runtime = runtime or runtime_registry.get()._replace(image=self.image)
+        if self.pool is not None:
+            manager = self.pool.session(runtime.image)
+        else:
+            manager = DisposableSession(self.backend, runtime.image)
+        async with manager as container:
+            compiled = None
+            if runtime.compile is None:
+                await self._upload(container, runtime.source, code)
+            else:
+                compiled_here = []
+
+                async def compile() -> CompileResult:
+                    compiled_here.append(container.id)
+                    return await self._compile(container, runtime, code)
+
+                compiled = await self.artifacts.get(runtime.artifact_key(code), compile)
+                # The cached artifact is copied instead of compiling user input again
+                if compiled.artifact is not None and not compiled_here:
+                    await self._upload(container, runtime.artifact, compiled.artifact, executable=True)
+            cmd = ('python', '-c', COMMAND_LAUNCHER, *runtime.run) if runtime.launcher else runtime.run
+
+            async def run(stdin: bytes) -> ExecResult:
+                return attach_usage(await container.exec(
+                    self._in_workdir(cmd), stdin, self.output_limit, self.timeout
+                ))
+
+            yield SandboxSession(run, compiled.result if compiled is not None and compiled.artifact is None else None)